@@ -0,0 +1,513 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+import pytoml as toml
+
+from dndme.content_path import default_content_path, get_pack_dirs
+from dndme.schemas import SchemaError, validate_encounter, validate_monster
+from dndme.variants import VariantError, flatten, resolve_chain
+
+MAGIC = b"DNDMEBDL"
+VERSION = 5
+KEY_SIZE = 64
+
+bundle_filename = "content.bundle"
+
+# magic, format version, monster count, header offset, header length
+preamble = struct.Struct(f"<{len(MAGIC)}sIIQQ")
+
+# monster key (utf-8, NUL padded), record offset, record length
+table_entry = struct.Struct(f"<{KEY_SIZE}sQQ")
+
+
+class BundleError(Exception):
+    pass
+
+
+def hash_file(filename):
+    with open(filename, "rb") as fin:
+        return hashlib.sha256(fin.read()).hexdigest()
+
+
+def get_source_files(pack_dir):
+    """
+    Find the files that make up a content pack, relative to the pack dir.
+    """
+    monsters = sorted(glob.glob(f"{pack_dir}/monsters/*.toml"))
+    encounters = sorted(glob.glob(f"{pack_dir}/encounters/*.toml"))
+    images = sorted(
+        x
+        for x in glob.glob(f"{pack_dir}/images/**/*.*", recursive=True)
+        if os.path.isfile(x)
+    )
+    relative = lambda files: [os.path.relpath(x, pack_dir) for x in files]
+    return relative(monsters), relative(encounters), relative(images)
+
+
+def get_monster_key(source):
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def compile_bundle(pack_dir, bundle_file=None):
+    """
+    Compile the monsters, encounters, and image listing of a content pack
+    into a single bundle file. Records are validated against their schemas
+    before being stored, so readers can use them as-is.
+
+    The layout is designed to be memory-mapped and read in place:
+
+    * a fixed-size preamble
+    * a table of fixed-size entries, sorted by monster key, giving the
+      offset and length of each monster record
+    * the monster and encounter records, each stored individually as JSON
+      (plain data, so opening a pack someone else compiled can't run code)
+    * a header recording the mtime, size, and hash of every source file
+      (so readers can tell when the bundle has gone stale), plus the
+      name-to-key mapping, encounter locations, and image listing
+
+    Monster variants are flattened with their ancestors from the same
+    pack before being stored, noting the names they inherit from; if a
+    pack earlier in the search path defines one of those names, the
+    flattened record is passed over. Variants that inherit from a monster
+    in another pack are stored as they are. Either way, the monster index
+    resolves those variants instead (see ContentBundles.get_monster).
+    """
+    bundle_file = bundle_file or f"{pack_dir}/{bundle_filename}"
+    monster_files, encounter_files, images = get_source_files(pack_dir)
+
+    sources = {}
+    monsters = {}
+    names = {}
+    encounters = []
+
+    for source in monster_files + encounter_files:
+        filename = f"{pack_dir}/{source}"
+        with open(filename, "rb") as fin:
+            raw = fin.read()
+        stat = os.stat(filename)
+        sources[source] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        }
+
+        try:
+            data = toml.loads(raw.decode("utf-8"))
+        except Exception as e:
+            raise BundleError(f"Unable to parse {filename}: {e}")
+
+        try:
+            if source in encounter_files:
+                data = validate_encounter(data)
+            else:
+                data = validate_monster(data)
+        except SchemaError as e:
+            raise BundleError(f"Invalid content in {filename}: {e}")
+
+        if source in encounter_files:
+            encounters.append((source, data))
+            continue
+
+        key = get_monster_key(source)
+        monsters[key] = (source, data)
+        if data.get("name") is not None:
+            names.setdefault(data["name"], key)
+
+    # Variants are stored flattened, and depend on every file in their
+    # chain; a chain that leads out of the pack can only be followed once
+    # the other packs are known, so those variants are stored unflattened
+    parents = {
+        key: data["inherits"]
+        for key, (_, data) in monsters.items()
+        if "inherits" in data and data["inherits"] in names
+    }
+    chains = {}
+    for key in monsters:
+        try:
+            chain = resolve_chain(key, parents, names)
+        except VariantError as e:
+            raise BundleError(f"Unable to resolve {pack_dir}: {e}")
+        chains[key] = [key] if "inherits" in monsters[chain[0]][1] else chain
+
+    writer = BundleWriter(bundle_file)
+    try:
+        for key in sorted(monsters):
+            writer.add_monster(
+                key,
+                flatten(chains[key], lambda x: monsters[x][1]),
+                sources=[monsters[x][0] for x in chains[key]],
+                inherits=[parents[x] for x in chains[key] if x in parents],
+            )
+        for source, data in encounters:
+            writer.add_encounter(source, data)
+    except BaseException:
+        writer.discard()
+        raise
+
+    return writer.close(sources=sources, images=images)
+
+
+class BundleWriter:
+    """
+    Write a bundle one record at a time.
+
+    Records are spooled to a temporary file as they're added and copied
+    in after the offset table when the bundle is closed, so memory use
+    only grows with the number of monsters (for the table and header),
+    not with the size of their records.
+    """
+
+    def __init__(self, bundle_file):
+        self.bundle_file = bundle_file
+        self.records = tempfile.TemporaryFile(
+            dir=os.path.dirname(os.path.abspath(bundle_file))
+        )
+        self.size = 0
+        self.monsters = {}
+        self.names = {}
+        self.encounters = []
+
+    def _add_record(self, data):
+        record = self._dumps(data)
+        self.records.write(record)
+        location = (self.size, len(record))
+        self.size += len(record)
+        return location
+
+    def _dumps(self, data):
+        try:
+            return json.dumps(data, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            raise BundleError(f"Unable to store content in bundle: {e}")
+
+    def add_monster(self, key, data, sources=(), inherits=()):
+        """
+        Add a monster's (flattened) data, along with the source files it
+        came from, if any, relative to the pack dir, and the names of any
+        monsters it was flattened with.
+        """
+        if len(key.encode("utf-8")) > KEY_SIZE:
+            raise BundleError(f"Monster key too long for bundle: {key}")
+        if key in self.monsters:
+            raise BundleError(f"Duplicate monster key: {key}")
+        self.monsters[key] = (self._add_record(data), list(sources), list(inherits))
+        if data.get("name") is not None:
+            self.names.setdefault(data["name"], key)
+
+    def add_encounter(self, source, data):
+        self.encounters.append((source, self._add_record(data)))
+
+    def discard(self):
+        self.records.close()
+
+    def close(self, sources=None, images=()):
+        keys = sorted(self.monsters)
+        records_offset = preamble.size + table_entry.size * len(keys)
+
+        def moved(location):
+            return (records_offset + location[0], location[1])
+
+        header = self._dumps(
+            {
+                "sources": sources or {},
+                "monster_sources": {key: self.monsters[key][1] for key in keys},
+                "monster_inherits": {
+                    key: self.monsters[key][2] for key in keys if self.monsters[key][2]
+                },
+                "names": self.names,
+                "encounters": [
+                    (source, moved(location)) for source, location in self.encounters
+                ],
+                "images": list(images),
+            }
+        )
+
+        tmp_file = f"{self.bundle_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as fout:
+            fout.write(
+                preamble.pack(
+                    MAGIC, VERSION, len(keys), records_offset + self.size, len(header)
+                )
+            )
+            for key in keys:
+                location = moved(self.monsters[key][0])
+                fout.write(table_entry.pack(key.encode("utf-8"), *location))
+            self.records.seek(0)
+            shutil.copyfileobj(self.records, fout)
+            fout.write(header)
+        self.records.close()
+        os.replace(tmp_file, self.bundle_file)
+
+        return self.bundle_file
+
+
+class MonsterTable:
+    """
+    Sorted sequence of monster keys read straight out of the bundle's
+    offset table, suitable for binary search.
+    """
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.entry(i)[0]
+
+    def entry(self, i):
+        key, offset, length = table_entry.unpack_from(
+            self.buffer, preamble.size + i * table_entry.size
+        )
+        return key.rstrip(b"\0").decode("utf-8"), offset, length
+
+    def find(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            entry = self.entry(lo)
+            if entry[0] == key:
+                return entry[1:]
+        return None
+
+
+class ContentBundle:
+    """
+    Read-only, memory-mapped view of a compiled content pack.
+
+    The bundle is never read in full; keys and records are read directly
+    from the mapped buffer, so several dndme processes on one host share
+    the same pages via the OS page cache.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pack_dir = os.path.dirname(filename)
+
+        with open(filename, "rb") as fin:
+            try:
+                self.buffer = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise BundleError(f"Empty bundle: {filename}")
+
+        try:
+            magic, version, count, header_offset, header_length = preamble.unpack_from(
+                self.buffer
+            )
+        except struct.error:
+            self.close()
+            raise BundleError(f"Truncated bundle: {filename}")
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise BundleError(f"Unsupported bundle format: {filename}")
+
+        try:
+            header = self.read_record((header_offset, header_length))
+            self.sources = header["sources"]
+            self.monster_sources = header["monster_sources"]
+            self.monster_inherits = header["monster_inherits"]
+            self.names = header["names"]
+            self.encounters = dict(header["encounters"])
+            self.images = header["images"]
+        except (KeyError, TypeError, ValueError):
+            self.close()
+            raise BundleError(f"Corrupt bundle header: {filename}")
+        self.monster_table = MonsterTable(self.buffer, count)
+        self.monsters_dir_mtime = None
+        self.stale = not self.is_fresh()
+
+    def close(self):
+        self.buffer.close()
+
+    @property
+    def monster_keys(self):
+        return list(self.monster_table)
+
+    def is_fresh(self):
+        """
+        Check whether every source is unchanged and no sources were added.
+        """
+        monster_files, encounter_files, _ = get_source_files(self.pack_dir)
+        if set(monster_files + encounter_files) != set(self.sources):
+            return False
+        return all(self.source_is_current(source) for source in self.sources)
+
+    def monsters_are_fresh(self):
+        """
+        Check whether the pack's monster files are the same files, unchanged,
+        that the bundle was compiled from; cheaper than `is_fresh`, as it
+        leaves out encounters and images.
+
+        The monsters dir is only listed again when its mtime changes, i.e.
+        when files were added, removed, or renamed; edits to a monster file
+        are caught when its record is read (see `get_monster_by_key`).
+        """
+        monsters_dir = f"{self.pack_dir}/monsters"
+        try:
+            mtime = os.stat(monsters_dir).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.monsters_dir_mtime:
+            return True
+
+        current = {
+            os.path.join("monsters", x)
+            for x in os.listdir(monsters_dir)
+            if x.endswith(".toml")
+        }
+        compiled = {x for x in self.sources if os.path.dirname(x) == "monsters"}
+        if current != compiled:
+            return False
+        if not all(self.source_is_current(source) for source in current):
+            return False
+        self.monsters_dir_mtime = mtime
+        return True
+
+    def source_is_current(self, source):
+        entry = self.sources[source]
+        filename = f"{self.pack_dir}/{source}"
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        if entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return True
+        # Touched but maybe not modified; only the content hash can say
+        return entry["size"] == stat.st_size and entry["sha256"] == hash_file(filename)
+
+    def read_record(self, location):
+        offset, length = location
+        return json.loads(self.buffer[offset : offset + length])
+
+    def get_monster_by_key(self, key):
+        if self.stale:
+            return None
+        location = self.monster_table.find(key)
+        if location is None:
+            return None
+        if not all(map(self.source_is_current, self.monster_sources[key])):
+            self.stale = True
+            return None
+        return self.read_record(location)
+
+    def get_monster(self, monster_name):
+        key = self.names.get(monster_name)
+        if key is None:
+            return None
+        return self.get_monster_by_key(key)
+
+    def get_encounter(self, source):
+        """
+        Get an encounter by its source file, relative to the pack dir, as
+        long as that file hasn't changed since the bundle was compiled.
+        """
+        location = self.encounters.get(source)
+        if self.stale or location is None:
+            return None
+        if not self.source_is_current(source):
+            self.stale = True
+            return None
+        return self.read_record(location)
+
+
+class ContentBundles:
+    """
+    Process-wide registry of compiled content bundles for the packs on a
+    content search path.
+
+    Bundles are reopened whenever the bundle file itself changes, and any
+    bundle that has gone stale is ignored so that callers fall back to
+    reading the TOML sources.
+    """
+
+    def __init__(self, content_path=default_content_path):
+        self.content_path = content_path
+        self.bundles = {}
+
+    def get(self, filename):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self._discard(filename)
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self.bundles.get(filename)
+        if not entry or entry[0] != signature:
+            self._discard(filename)
+            try:
+                entry = (signature, ContentBundle(filename))
+            except (BundleError, OSError, ValueError):
+                entry = (signature, None)
+            self.bundles[filename] = entry
+
+        bundle = entry[1]
+        if bundle is None or bundle.stale:
+            return None
+        return bundle
+
+    def _discard(self, filename):
+        entry = self.bundles.pop(filename, None)
+        if entry and entry[1]:
+            entry[1].close()
+
+    def get_for_pack(self, pack_dir):
+        return self.get(f"{pack_dir}/{bundle_filename}")
+
+    def get_all(self):
+        bundles = [self.get_for_pack(x) for x in get_pack_dirs(self.content_path)]
+        return [x for x in bundles if x]
+
+    def get_monster(self, monster_name):
+        """
+        Look for a monster in each pack's bundle, in search path order.
+
+        A pack with monsters but no fresh bundle might define the monster
+        too, so on reaching one we give up and let the caller fall back to
+        the monster index, which knows about every pack. Monster files can
+        be added or changed mid-session, so each bundle's freshness is
+        checked on every lookup, not just when it's opened.
+
+        Likewise a variant flattened with a monster that an earlier pack
+        overrides, or that inherits from another pack, is left to the
+        index, which looks parents up by search path order too.
+        """
+        searched = []
+        for pack_dir in get_pack_dirs(self.content_path):
+            if not os.path.isdir(f"{pack_dir}/monsters"):
+                continue
+            bundle = self.get_for_pack(pack_dir)
+            if bundle is None:
+                return None
+            if not bundle.monsters_are_fresh():
+                bundle.stale = True
+                return None
+            monster = bundle.get_monster(monster_name)
+            if monster is None:
+                searched.append(bundle)
+                continue
+            if "inherits" in monster:
+                return None
+            inherits = bundle.monster_inherits.get(bundle.names[monster_name], ())
+            if any(name in x.names for x in searched for name in inherits):
+                return None
+            return monster
+        return None
+
+
+content_bundles = ContentBundles()
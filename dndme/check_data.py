@@ -1,20 +1,81 @@
 #!/usr/bin/env python
+import hashlib
+import json
+import os
 import sys
 
-import pytoml as toml
+import attr
+import click
 
-from dndme.models import Game, Monster
-from dndme.loaders import ImageLoader, MonsterLoader
+from dndme.counts import compile_count, party_names
+from dndme.dice import is_dice_expr
+from dndme.models import Combat, ContentError, Encounter, Game, Monster
+from dndme.loaders import (
+    EncounterLoader,
+    ImageLoader,
+    MonsterLoader,
+    load_toml_files,
+    set_content_path,
+    set_jobs,
+)
+from dndme import schemas
+from dndme.variants import merge_variant
+
+default_cache_file = "content/.check_data_cache.json"
+
+
+def validate_monster(data):
+    """
+    Check that a monster loads, returning the monster it inherits from
+    (if any) so that it can be checked against the monster index.
+    """
+    data = schemas.validate_monster(data)
+    Monster(**merge_variant({}, data))
+    return [data["inherits"]] if "inherits" in data else []
+
+
+def validate_encounter(data):
+    """
+    Check that an encounter loads and that every group's count can be
+    worked out, returning the monsters the encounter needs so that they
+    can be checked against the monster index.
+    """
+    encounter = Encounter(**schemas.validate_encounter(data))
+    loader = EncounterLoader(None, None, Combat())
+    monster_groups = {}
+
+    for key, group in encounter.groups.items():
+        if not group.get("monster"):
+            raise ValueError(f"Group '{key}' has no monster")
+
+        count = str(group.get("count", ""))
+        if not count.isdigit() and not is_dice_expr(count):
+            for name in sorted(compile_count(count).names):
+                if name not in monster_groups and name not in party_names:
+                    raise ValueError(
+                        f"Group '{key}' count refers to unknown group '{name}'"
+                    )
+
+        monster_groups[key] = [None] * loader._determine_count(group, monster_groups)
+
+    return sorted({group["monster"] for group in encounter.groups.values()})
+
+
+def is_encounter_file(filename):
+    return os.path.basename(os.path.dirname(filename)) == "encounters"
 
 
 class Checker:
-    def __init__(self, filenames=None):
+    def __init__(self, filenames=None, jobs=1, cache_file=None):
         self.monster_loader = self.get_monster_loader()
         self.filenames = filenames or []
+        self.jobs = jobs
+        self.cache_file = cache_file
         self.counts = {
             "files_checked": 0,
             "files_ok": 0,
             "files_bad": 0,
+            "files_cached": 0,
         }
         self.errors = {}
 
@@ -34,35 +95,183 @@ class Checker:
         monster_loader = MonsterLoader(image_loader)
         return monster_loader
 
+    def load_cache(self):
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, "r") as fin:
+                return json.load(fin)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self, cache):
+        if not self.cache_file:
+            return
+        with open(self.cache_file, "w") as fout:
+            json.dump(cache, fout)
+
+    def get_monster_names_digest(self):
+        index = self.monster_loader.index
+        index.refresh()
+        names = "\n".join(sorted(index.names))
+        return hashlib.sha256(names.encode("utf-8")).hexdigest()
+
     def check_files(self, filenames=None):
+        """
+        Check monster and encounter files, skipping any whose contents
+        haven't changed since the last run recorded in the cache file.
+
+        Encounter and monster variant results also depend on which monsters
+        exist, so they're only reused while the set of monster names is
+        unchanged.
+        """
         filenames = filenames or self.filenames
+        cache = self.load_cache()
+        names_digest = self.get_monster_names_digest()
+        results = {}
+        to_check = []
+
         for filename in filenames:
-            self.counts["files_checked"] += 1
+            entry = cache.get(filename)
             try:
-                print(f"Trying {filename}", end="")
-                self.load_monster(filename)
-                print(" ✅")
-                self.counts["files_ok"] += 1
-            except Exception as e:
-                print(" ❌")
-                self.counts["files_bad"] += 1
-                self.errors[filename] = str(e)
+                signature = self.get_signature(filename, entry)
+            except OSError as e:
+                # e.g. deleted since we were asked to check it
+                error = ContentError.from_exception(filename, e)
+                results[filename] = (
+                    {"sha256": None, "error": attr.asdict(error)},
+                    False,
+                )
                 continue
+            if (
+                entry
+                and entry["sha256"] == signature["sha256"]
+                and entry.get("names_digest") in (None, names_digest)
+            ):
+                results[filename] = ({**entry, **signature}, True)
+            else:
+                to_check.append((filename, signature))
 
+        self.check_changed_files(to_check, names_digest, results)
+
+        for filename in filenames:
+            entry, cached = results[filename]
+            cache[filename] = entry
+            suffix = " (cached)" if cached else ""
+            self.counts["files_checked"] += 1
+            self.counts["files_cached"] += int(cached)
+            if entry["error"]:
+                print(f"Trying {filename} ❌{suffix}")
+                self.counts["files_bad"] += 1
+                self.errors[filename] = ContentError(**entry["error"])
+            else:
+                print(f"Trying {filename} ✅{suffix}")
+                self.counts["files_ok"] += 1
+
+        self.save_cache(cache)
         return self.counts
 
+    def get_signature(self, filename, entry=None):
+        stat = os.stat(filename)
+        signature = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+        if entry and all(entry.get(k) == v for k, v in signature.items()):
+            # Untouched since last time, so don't bother hashing it again
+            signature["sha256"] = entry["sha256"]
+        else:
+            with open(filename, "rb") as fin:
+                signature["sha256"] = hashlib.sha256(fin.read()).hexdigest()
+        return signature
+
+    def check_changed_files(self, to_check, names_digest, results):
+        signatures = dict(to_check)
+        monster_files = [x for x in signatures if not is_encounter_file(x)]
+        encounter_files = [x for x in signatures if is_encounter_file(x)]
+        known_monsters = self.monster_loader.index.names
+
+        checked = load_toml_files(
+            monster_files, transform=validate_monster, jobs=self.jobs
+        ) + load_toml_files(
+            encounter_files, transform=validate_encounter, jobs=self.jobs
+        )
+
+        for filename, result, error in checked:
+            if not error:
+                missing = [x for x in result if x not in known_monsters]
+                if missing:
+                    error = ContentError(
+                        filename=filename,
+                        kind="UnknownMonster",
+                        message=f"No such monster: {', '.join(missing)}",
+                    )
+                elif result and not is_encounter_file(filename):
+                    # Make sure the whole inheritance chain merges cleanly
+                    error = self.check_variant(filename)
+
+            entry = {
+                **signatures[filename],
+                "error": attr.asdict(error) if error else None,
+            }
+            if is_encounter_file(filename) or result:
+                entry["names_digest"] = names_digest
+            results[filename] = (entry, False)
+
+    def check_variant(self, filename):
+        try:
+            self.load_monster(filename)
+        except Exception as e:
+            return ContentError.from_exception(filename, e)
+
     def load_monster(self, filename):
         monster_data = self.monster_loader.load_from_file(filename)
         monster = Monster(**monster_data)
         return monster
 
 
-if __name__ == "__main__":
-    filenames = sys.argv[1:]
-    checker = Checker()
+@click.command()
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of worker processes to check files with; 0 for one per CPU",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Only re-check files that changed since the last incremental run",
+)
+@click.option(
+    "--cache-file",
+    default=default_cache_file,
+    help=f"Where to keep results for incremental runs; default: {default_cache_file}",
+)
+@click.option(
+    "--content-path",
+    "-p",
+    multiple=True,
+    help="Content pack to look for monsters in, highest precedence first; "
+    "may be given more than once; default: content/*",
+)
+@click.argument("filenames", nargs=-1)
+def main(jobs, incremental, cache_file, content_path, filenames):
+    if content_path:
+        set_content_path(content_path)
+    set_jobs(jobs or None)
+    checker = Checker(jobs=jobs or None, cache_file=cache_file if incremental else None)
     results = checker.check_files(filenames)
     print(f"\n{results}")
+
+    shadowed = checker.monster_loader.index.get_shadowed()
+    if shadowed:
+        print()
+        for name, winner, losers in shadowed:
+            for loser in losers:
+                print(f"⚠️  {name}: {loser} is shadowed by {winner}")
     if checker.errors:
         print()
-        for file, error in checker.errors.items():
-            print(f"❌ {file}:\n    {error}")
+        for error in checker.errors.values():
+            print(f"❌ {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
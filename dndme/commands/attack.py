@@ -0,0 +1,143 @@
+from dndme.commands import Command
+from dndme.commands.damage_combatant import DamageCombatant
+from dndme.dice import compile_dice_expr, roll_dice_expr_many
+from dndme.probability import get_attack_odds
+
+
+class Attack(Command):
+
+    keywords = ["attack"]
+    help_text = """{keyword}
+{divider}
+Summary: Resolve attacks from one or more combatants at once against a
+single target, all with the same to-hit bonus and damage. A natural 20 is a
+critical hit, doubling the damage dice; a natural 1 always misses.
+
+The target can be a combatant, whose AC will be used and who can then take
+the total damage, or just an AC. Add "adv" or "dis" to roll with advantage
+or disadvantage.
+
+Usage: {keyword} <attacker1> [<attacker2> ...] <to-hit> <damage> vs <target> [adv|dis]
+       {keyword} <attacker1> [<attacker2> ...] <to-hit> <damage> vs <AC> [adv|dis]
+
+Examples:
+
+    {keyword} goblin* +4 1d6+2 vs Frodo
+    {keyword} orc1 orc2 +5 1d12+3 vs 16
+    {keyword} wolf* +4 2d4+2 vs Merry adv
+"""
+
+    d20_rolls = {"adv": "2d20kh1", "dis": "2d20kl1"}
+
+    def get_suggestions(self, words):
+        combat = self.game.combat
+        names_already_chosen = words[1:]
+        return sorted(set(combat.combatant_names) - set(names_already_chosen))
+
+    def do_command(self, *args):
+        args = list(args)
+        d20_roll = "1d20"
+        if args and args[-1] in self.d20_rolls:
+            d20_roll = self.d20_rolls[args.pop()]
+
+        if "vs" not in args or len(args) < 5:
+            print("Need attackers, a to-hit bonus, damage, and a target or AC.")
+            return
+
+        split = args.index("vs")
+        if split < 3 or split != len(args) - 2:
+            print("Need attackers, a to-hit bonus, damage, and a target or AC.")
+            return
+
+        try:
+            bonus = int(args[split - 2])
+        except ValueError:
+            print(f"Invalid to-hit bonus: {args[split - 2]}")
+            return
+
+        damage = args[split - 1]
+        try:
+            compile_dice_expr(damage)
+        except ValueError:
+            print(f"Invalid damage: {damage}")
+            return
+
+        combat = self.game.combat
+        attackers = combat.get_targets(args[: split - 2])
+        if not attackers:
+            print(f"No attackers found from `{args[:split - 2]}`")
+            return
+
+        target = None
+        try:
+            ac = int(args[-1])
+        except ValueError:
+            target = combat.get_target(args[-1])
+            if not target:
+                print(f"No target found from `{args[-1]}`")
+                return
+            ac = target.ac
+
+        hits, crits, total = self.resolve(attackers, bonus, damage, ac, d20_roll)
+
+        if hits:
+            print(
+                f"{hits} of {len(attackers)} hit ({crits} critical); "
+                f"{total} total damage"
+            )
+        else:
+            print(f"All {len(attackers)} missed")
+
+        if not target or not total:
+            return
+
+        if (
+            self.session.prompt(f"Apply {total} damage to {target.name}? [Y]: ") or "y"
+        ).lower() != "y":
+            return
+        DamageCombatant.do_command(self, target.name, str(total))
+
+    def resolve(self, attackers, bonus, damage, ac, d20_roll="1d20"):
+        """
+        Roll every attack at once, then the damage for all of the hits and
+        all of the crits at once, and print each attacker's result.
+        """
+        stream = self.game.combat.rng.child("attack")
+        naturals = roll_dice_expr_many(d20_roll, len(attackers), stream=stream)
+
+        crit = [natural == 20 for natural in naturals]
+        hit = [
+            is_crit or (natural > 1 and natural + bonus >= ac)
+            for natural, is_crit in zip(naturals, crit)
+        ]
+        hit_damage = iter(
+            roll_dice_expr_many(
+                damage, hit.count(True) - crit.count(True), stream=stream
+            )
+        )
+        crit_damage = iter(
+            roll_dice_expr_many(damage, crit.count(True), stream=stream, dice_mult=2)
+        )
+
+        chance, crit_chance = get_attack_odds(bonus, ac, d20_roll)
+        self.print(
+            f"<b>Attacking AC {ac} at {bonus:+d} for {damage}</b> "
+            f"({chance:.0%} to hit, {crit_chance:.0%} to crit)"
+        )
+
+        total = 0
+        for attacker, natural, is_hit, is_crit in zip(attackers, naturals, hit, crit):
+            roll = f"{natural + bonus} ({natural}{bonus:+d})"
+            if not is_hit:
+                self.print(f"{attacker.name}: {roll}, miss")
+                continue
+            amount = max(next(crit_damage if is_crit else hit_damage), 0)
+            total += amount
+            if is_crit:
+                self.print(
+                    f"{attacker.name}: {roll}, <x1>critical hit</x1> for {amount}"
+                )
+            else:
+                self.print(f"{attacker.name}: {roll}, hit for {amount}")
+
+        return hit.count(True), crit.count(True), total
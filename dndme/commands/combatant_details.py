@@ -2,6 +2,8 @@ from math import inf
 from prompt_toolkit import print_formatted_text, HTML
 from prompt_toolkit.styles import Style
 from dndme.commands import Command
+from dndme.dice import is_dice_expr
+from dndme.probability import get_distribution
 
 
 class CombatantDetails(Command):
@@ -75,6 +77,13 @@ Examples:
                 f"<x>HP:</x> {t.cur_hp}/{t.max_hp} "
                 f"({int(100*t.cur_hp/t.max_hp):>3}%)"
             )
+            if is_dice_expr(t._max_hp_expr):
+                hp = get_distribution(t._max_hp_expr)
+                self.print(
+                    f"<x>HP roll:</x> {t._max_hp} on {t._max_hp_expr} "
+                    f"(percentile {hp.rank(t._max_hp):.0f}; "
+                    f"mean {hp.mean:.0f}, max {hp.max})"
+                )
             self.print(f"<x>Speed:</x> {t.speed}")
             self.print(
                 f"<x>STR:</x> {t.str} ({mf(t.str_mod)}) "
@@ -33,7 +33,7 @@ Examples:
             return [
                 "monster",
                 "player",
-            ] + self.image_loader.get_available_content_images()
+            ] + self.image_loader.get_available_content_images(words[-1])
         if len(words) == 3:
             if words[1] == "monster":
                 return self.monster_loader.get_available_monster_keys()
@@ -1,11 +1,26 @@
-from fnmatch import fnmatch
 from dndme.commands import Command
 from dndme.commands import (
     convert_str_to_bool,
     convert_to_int,
     convert_to_int_or_dice_expr,
 )
-from dndme.loaders import EncounterLoader, ImageLoader, MonsterLoader, PartyLoader
+from dndme.counts import get_party_counts
+from dndme.difficulty import rate_encounter
+from dndme.library import ContentLibrary
+from dndme.loaders import (
+    EncounterLoader,
+    GroupPlan,
+    ImageLoader,
+    MonsterLoader,
+    PartyLoader,
+)
+from dndme.models import Encounter, EncounterSummary
+from dndme.schemas import validate_encounter
+
+
+def format_range(values):
+    low, high = values
+    return f"{low}" if low == high else f"{low}-{high}"
 
 
 class Load(Command):
@@ -21,21 +36,37 @@ Load an encounter to have a predefined set of monsters to contend with.
 Optionally specify a filter to only list a subset of available encounters
 (useful in larger adventures when there might be hundreds of encounters
 to choose from). The filter will consider both the encounter name and
-location, and is not case sensitive.
+location, and is not case sensitive. Each encounter is listed with its
+number of monsters, total XP, and difficulty for the loaded party.
 
 Load a specific monster as needed to spice things up.
 
+If the campaign has a content library configured, monsters can also be
+found by searching: filter on cr, xp, type, size, alignment, or speed,
+and/or search their names, traits, actions, and notes. A single word that
+isn't the name of a monster is searched for too. The same monster filters
+can be used to find encounters that include matching monsters.
+
 Usage:
 
     {keyword} party
-    {keyword} encounter [<filter>]
+    {keyword} encounter [<filter> ...]
     {keyword} monster <monster>
+    {keyword} monster <filter> [<filter> ...]
 
-Example:
+Examples:
 
     {keyword} encounter moria
+    {keyword} encounter type:undead
+    {keyword} monster type:undead cr:2-5 speed:fly
+    {keyword} monster breath
 """
 
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        self._library = None
+        self._library_synced = False
+
     def get_suggestions(self, words):
         if len(words) == 2:
             return ["encounter", "monster", "party"]
@@ -45,6 +76,8 @@ Example:
             return monster_loader.get_available_monster_keys()
 
     def do_command(self, *args):
+        # Bring the library up to date at most once per command
+        self._library_synced = False
         if not args:
             print("Load what?")
             return
@@ -52,11 +85,37 @@ Example:
             self.load_party()
         elif args[0] == "encounter":
             self.load_encounter(args[1:])
-        elif args[0] == "monster" and len(args) == 2:
-            self.load_monster(args[-1])
+        elif args[0] == "monster" and len(args) == 2 and self.is_monster(args[1]):
+            self.load_monster(args[1])
+        elif args[0] == "monster" and len(args) > 1 and self.library:
+            self.find_monster(args[1:])
         else:
             print("Sorry; can't load that.")
 
+    def is_monster(self, term):
+        """
+        Check whether a term names a monster, or should be searched for.
+        """
+        if ":" in term:
+            return False
+        if not self.game.content_library:
+            # Nothing to search, so it had better be a monster
+            return True
+        return MonsterLoader(ImageLoader(self.game)).index.lookup(term) is not None
+
+    @property
+    def library(self):
+        if not self.game.content_library:
+            return None
+        if not self._library:
+            self._library = ContentLibrary(
+                self.game.content_library, encounters_dir=self.game.encounters_dir
+            )
+        if not self._library_synced:
+            self._library.sync()
+            self._library_synced = True
+        return self._library
+
     def load_party(self):
         party_loader = PartyLoader(self.game.party_file)
         party = party_loader.load(self.game.combat)
@@ -95,7 +154,7 @@ Example:
             return roll
 
         image_loader = ImageLoader(self.game)
-        monster_loader = MonsterLoader(image_loader)
+        monster_loader = MonsterLoader(image_loader, lazy=True)
         encounter_loader = EncounterLoader(
             self.game.encounters_dir,
             monster_loader,
@@ -104,13 +163,22 @@ Example:
             initiative_resolver=prompt_initiative,
         )
 
-        filter_string = f"*{args[0].lower()}*" if args else "*"
-        encounters = [
-            e
-            for e in encounter_loader.get_available_encounters()
-            if fnmatch(e.name.lower(), filter_string)
-            or fnmatch(e.location.lower(), filter_string)
-        ]
+        library = self.library
+        if library:
+            try:
+                encounters = [
+                    Encounter(**validate_encounter(x))
+                    for x in library.find_encounters(
+                        args, directory=self.game.encounters_dir
+                    )
+                ]
+            except ValueError as e:
+                print(e)
+                return
+        else:
+            encounters = encounter_loader.get_encounter_summaries(
+                args[0] if args else ""
+            )
 
         if not encounters:
             print("No available encounters found.")
@@ -118,19 +186,82 @@ Example:
 
         # prompt to pick an encounter
         print("Available encounters:\n")
-        for i, encounter in enumerate(encounters, 1):
-            print(f"{i}: {encounter.name} ({encounter.location})")
+        for row in self.get_encounter_rows(encounters, monster_loader):
+            print(row)
+
+        # Get the encounters and their monsters into memory while the DM
+        # decides, so that loading the one they pick doesn't have to wait
+        prefetcher = encounter_loader.prefetch(encounters)
+        try:
+            pick = self.safe_input("Load encounter", converter=convert_to_int)
+        finally:
+            prefetcher.stop()
 
-        pick = self.safe_input("Load encounter", converter=convert_to_int)
         pick = pick - 1
-        if pick < 0 or pick > len(encounters):
+        if pick < 0 or pick >= len(encounters):
             print("Invalid encounter.")
             return
 
         encounter = encounters[pick]
+        if isinstance(encounter, EncounterSummary):
+            encounter = encounter_loader.get_encounter(encounter)
         monsters = encounter_loader.load(encounter)
         print(f"Loaded encounter: {encounter.name}" f" with {len(monsters)} monsters")
 
+    def get_encounter_rows(self, encounters, monster_loader):
+        """
+        List encounters with their monster counts, total XP, and difficulty
+        for the current party, all worked out from the monster index and
+        the encounters' group counts without loading any monsters.
+        """
+        characters = self.game.combat.characters.values()
+        levels = [x.level for x in characters]
+        party_counts = get_party_counts(characters)
+        monster_xp = monster_loader.index.get_xp_table()
+
+        labels = [f"{i}: {x.name} ({x.location})" for i, x in enumerate(encounters, 1)]
+        width = max(map(len, labels))
+        rows = []
+        for label, encounter in zip(labels, encounters):
+            rating = rate_encounter(encounter.groups, monster_xp, levels, party_counts)
+            if rating is None:
+                rows.append(f"{label:<{width}}  (invalid monster counts)")
+                continue
+            count = format_range(rating.count)
+            xp = format_range(rating.xp)
+            difficulty = (
+                format_range([x.title() for x in rating.difficulty])
+                if levels
+                else "no party loaded"
+            )
+            rows.append(
+                f"{label:<{width}}  {count:>5} monsters  {xp:>11} XP  {difficulty}"
+            )
+        return rows
+
+    def find_monster(self, terms):
+        try:
+            monsters = self.library.find_monsters(terms)
+        except ValueError as e:
+            print(e)
+            return
+
+        if not monsters:
+            print("No matching monsters found.")
+            return
+
+        print("Matching monsters:\n")
+        for i, monster in enumerate(monsters, 1):
+            print(f"{i}: {monster['name']} (CR {monster['cr']:g} {monster['mtype']})")
+
+        pick = self.safe_input("Load monster", converter=convert_to_int)
+        pick = pick - 1
+        if pick < 0 or pick >= len(monsters):
+            print("Invalid monster.")
+            return
+
+        self.load_monster(monsters[pick]["name"])
+
     def load_monster(self, monster_name):
         def prompt_initiative(monster):
             # prompt to add the monsters to initiative order
@@ -175,7 +306,7 @@ Example:
                 return rolled_hp
 
         image_loader = ImageLoader(self.game)
-        monster_loader = MonsterLoader(image_loader)
+        monster_loader = MonsterLoader(image_loader, lazy=True)
         count = self.safe_input(
             "Number of monsters", converter=convert_to_int_or_dice_expr
         )
@@ -193,8 +324,9 @@ Example:
             initiative_resolver=prompt_initiative,
             hp_resolver=prompt_hp,
         )
-        encounter_loader._set_hp([], monsters)
-        encounter_loader._set_names([], monsters)
+        encounter_loader._instantiate(
+            GroupPlan(None, {"monster": monster_name, "count": count}), monsters
+        )
         encounter_loader._add_to_combat(self.game.combat, monsters)
         for monster in monsters:
             monster.origin = "unplanned"
@@ -3,6 +3,7 @@ import datetime
 import os
 import sys
 from dndme.commands import Command
+from dndme.rng import get_seed
 
 
 class Log(Command):
@@ -32,6 +33,8 @@ Examples:
             f"Session started {now:%Y-%m-%d %H:%M:%S}",
             with_leading_newline=os.path.exists(self.log_file or ""),
         )
+        # Set this as the campaign's seed to replay the session's rolls
+        self.log_message(f"Dice seed: {get_seed()}", with_bullet=True)
 
         def sign_off():
             self.do_command(
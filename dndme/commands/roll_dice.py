@@ -1,5 +1,8 @@
+from collections import Counter
+
 from dndme.commands import Command
-from dndme.dice import roll_dice, roll_dice_expr
+from dndme.dice import roll_dice_expr_many
+from dndme.probability import get_distribution
 
 
 class RollDice(Command):
@@ -10,7 +13,15 @@ class RollDice(Command):
 Summary: Roll dice using a dice expression. Use multiple dice expressions to
 get multiple, separate results.
 
+Dice expressions can add up any number of dice and numbers, and dice can be
+kept or dropped (kh, kl, dh, dl), rerolled until they stop matching (r) or
+just once (ro), or exploded to roll again and add on a max or other match (!).
+
+With "stats", show the exact odds for dice expressions instead of rolling:
+their range, mean, and percentiles, plus the chance of meeting a DC.
+
 Usage: {keyword} <dice expression> [<dice expression> ...]
+       {keyword} stats <dice expression> [<dice expression> ...] [dc <number>]
 
 Examples:
 
@@ -18,14 +29,61 @@ Examples:
     {keyword} 1d20+2
     {keyword} 2d4-1
     {keyword} 1d20 1d20
+    {keyword} 2d6+1d4+3
+    {keyword} 4d6kh3
+    {keyword} 2d20kh1
+    {keyword} 2d20kl1
+    {keyword} 2d6ro<3
+    {keyword} 1d6!
+    {keyword} 1d10!>=9
+    {keyword} stats 8d6
+    {keyword} stats 1d20+5 2d20kh1+5 dc 15
 """
 
+    percentiles = (10, 25, 50, 75, 90)
+
     def do_command(self, *args):
-        results = []
+        if args and args[0] == "stats":
+            self.show_stats(args[1:])
+            return
+
+        # Roll all of the same expression at once, e.g. 1d20 1d20 1d20
+        rolls = {}
+        for dice_expr, n in Counter(args).items():
+            try:
+                rolls[dice_expr] = iter(roll_dice_expr_many(dice_expr, n))
+            except ValueError:
+                print(f"Invalid dice expression: {dice_expr}")
+                return
+        print(", ".join(str(next(rolls[x])) for x in args))
+
+    def show_stats(self, args):
+        dc = None
+        if len(args) >= 2 and args[-2] == "dc":
+            try:
+                dc = int(args[-1])
+            except ValueError:
+                print(f"Invalid DC: {args[-1]}")
+                return
+            args = args[:-2]
+
+        if not args:
+            print("Stats for what dice expression?")
+            return
+
         for dice_expr in args:
             try:
-                results.append(str(roll_dice_expr(dice_expr)))
+                distribution = get_distribution(dice_expr)
             except ValueError:
                 print(f"Invalid dice expression: {dice_expr}")
                 return
-        print(", ".join(results))
+
+            percentiles = ", ".join(
+                f"{x}%: {distribution.percentile(x)}" for x in self.percentiles
+            )
+            print(
+                f"{dice_expr}: {distribution.min} to {distribution.max}, "
+                f"mean {distribution.mean:.1f}; {percentiles}"
+            )
+            if dc is not None:
+                print(f"    DC {dc}: {distribution.at_least(dc):.1%}")
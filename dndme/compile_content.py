@@ -0,0 +1,29 @@
+import os
+import sys
+
+import click
+
+from dndme.bundle import BundleError, compile_bundle
+
+base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@click.command()
+@click.argument("name")
+def main(name):
+    content_dir = f"{base_dir}/content/{name}"
+    if not os.path.isdir(content_dir):
+        print(f"Content package {name} does not exist")
+        sys.exit(1)
+
+    try:
+        bundle_file = compile_bundle(content_dir)
+    except BundleError as e:
+        print(e)
+        sys.exit(1)
+
+    print(f"Compiled {name} to {os.path.relpath(bundle_file, base_dir)}")
+
+
+if __name__ == "__main__":
+    main()
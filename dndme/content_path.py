@@ -0,0 +1,48 @@
+"""
+The content search path: an ordered list of content pack directories, or
+globs of them, highest precedence first. When more than one pack defines
+a monster with the same name, the one from the earliest pack wins; packs
+matched by a single glob are taken in sorted order.
+
+Campaigns can set their own search path in settings.toml:
+
+    content_path = ["content/homebrew", "content/*"]
+"""
+
+import glob
+import os
+
+default_content_path = ("content/*",)
+
+# The search path in use, as set by dndme.loaders.set_content_path
+_current_content_path = default_content_path
+
+
+def get_content_path():
+    return _current_content_path
+
+
+def set_current_content_path(content_path):
+    global _current_content_path
+    _current_content_path = tuple(content_path)
+
+
+def get_pack_dirs(content_path=default_content_path):
+    """
+    Expand a content search path into pack directories, in order of
+    precedence.
+    """
+    packs = {}
+    for entry in content_path:
+        for pack in sorted(glob.glob(entry)):
+            if os.path.isdir(pack):
+                packs.setdefault(os.path.normpath(pack), None)
+    return list(packs)
+
+
+def get_pack_patterns(content_path, pattern):
+    """
+    Get globs for files within every pack on a content search path, e.g.
+    "monsters/*.toml", in order of precedence.
+    """
+    return [f"{entry}/{pattern}" for entry in content_path]
@@ -0,0 +1,149 @@
+"""
+Encounter group counts like "goblins + 2" or "players * 2 - 1".
+
+Count expressions are parsed once into closures over their syntax tree, so
+nothing is ever eval'd, and only arithmetic on integers and names is
+allowed. Names refer to the sizes of earlier groups in the encounter or to
+the party's counts (players, sidekicks, party); unknown names count as 0.
+"""
+
+import ast
+import operator
+from functools import lru_cache
+
+from dndme.dice import is_dice_expr, max_dice_expr, min_dice_expr
+
+party_names = ("players", "sidekicks", "party")
+
+binary_ops = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+}
+
+unary_ops = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CountError(ValueError):
+    pass
+
+
+class CountExpression:
+    """
+    A compiled count expression.
+
+    Calling it with a dict of name to count gives the count, which is
+    always at least 1. `bounds` does the same with a dict of name to
+    (low, high) pairs, giving the lowest and highest possible counts.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.names = set()
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError:
+            raise CountError(f"Invalid monster count: {source}")
+        self._evaluate, self._bounds = self._compile(tree.body)
+        self.names = frozenset(self.names)
+
+    def __call__(self, variables):
+        try:
+            return max(int(self._evaluate(variables)), 1)
+        except ZeroDivisionError:
+            raise CountError(f"Division by zero in monster count: {self.source}")
+
+    def bounds(self, variables):
+        low, high = self._bounds(variables)
+        return max(int(low), 1), max(int(high), 1)
+
+    def _compile(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            value = node.value
+            return (lambda v: value), (lambda v: (value, value))
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.names.add(name)
+            return (lambda v: v.get(name, 0)), (lambda v: v.get(name, (0, 0)))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in unary_ops:
+            op = unary_ops[type(node.op)]
+            operand, operand_bounds = self._compile(node.operand)
+
+            def unary_bounds(v):
+                return tuple(sorted(map(op, operand_bounds(v))))
+
+            return (lambda v: op(operand(v))), unary_bounds
+
+        if isinstance(node, ast.BinOp) and type(node.op) in binary_ops:
+            op = binary_ops[type(node.op)]
+            left, left_bounds = self._compile(node.left)
+            right, right_bounds = self._compile(node.right)
+
+            def binary_bounds(v):
+                # Every operator is monotonic in each operand (as long as a
+                # divisor can't be zero), so the extremes are at the corners
+                (a, b), (c, d) = left_bounds(v), right_bounds(v)
+                if op in (operator.truediv, operator.floordiv) and c <= 0 <= d:
+                    raise CountError(f"Possible division by zero: {self.source}")
+                corners = [op(a, c), op(a, d), op(b, c), op(b, d)]
+                return min(corners), max(corners)
+
+            return (lambda v: op(left(v), right(v))), binary_bounds
+
+        raise CountError(f"Invalid monster count: {self.source}")
+
+
+@lru_cache(maxsize=1024)
+def compile_count(source):
+    return CountExpression(source)
+
+
+def get_party_counts(characters):
+    ctypes = [x.ctype for x in characters]
+    return {
+        "players": ctypes.count("player"),
+        "sidekicks": ctypes.count("sidekick"),
+        "party": len(ctypes),
+    }
+
+
+def get_group_bounds(groups, party_counts=None):
+    """
+    Work out the fewest and most monsters each of an encounter's groups
+    can have, or None if any group's count is invalid.
+    """
+    variables = {k: (v, v) for k, v in (party_counts or {}).items()}
+    bounds = {}
+
+    for key, group in groups.items():
+        count = str(group.get("count", 1))
+        try:
+            if count.isdigit():
+                bounds[key] = (int(count), int(count))
+            elif is_dice_expr(count):
+                bounds[key] = (min_dice_expr(count), max_dice_expr(count))
+            else:
+                bounds[key] = compile_count(count).bounds(variables)
+        except ValueError:
+            return None
+        variables[key] = bounds[key]
+
+    return bounds
+
+
+def count_range(groups, party_counts=None):
+    """
+    Work out the fewest and most monsters an encounter's groups can add up
+    to, or None if any group's count is invalid.
+    """
+    bounds = get_group_bounds(groups, party_counts)
+    if bounds is None:
+        return None
+    return (sum(x[0] for x in bounds.values()), sum(x[1] for x in bounds.values()))
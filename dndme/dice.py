@@ -1,10 +1,20 @@
-import random
+import operator
 import re
+from functools import lru_cache
+from itertools import accumulate
 
-dice_expr = re.compile(r"^(\d+)d(\d+)\+?(\-?\d+)?$")
+from dndme.rng import current_stream
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def roll_dice(times, sides, modifier=0, dice_mult=1, total_mult=1):
+# Above this many dice in one call, NumPy's setup cost pays for itself
+numpy_threshold = 128
+
+
+def roll_dice(times, sides, modifier=0, dice_mult=1, total_mult=1, stream=None):
     """
     Simulate a dice roll of XdY + Z.
 
@@ -26,43 +36,400 @@ def roll_dice(times, sides, modifier=0, dice_mult=1, total_mult=1):
        >>> roll_dice(1, 8, dice_mult=2)
        # Damage (crit, 2E)
        >>> roll_dice(1, 8, total_mult=2)
+
+    Rolls come from the given random stream (see dndme.rng), or else the
+    current one.
+    """
+    return roll_dice_many(
+        times,
+        sides,
+        1,
+        modifier=modifier,
+        dice_mult=dice_mult,
+        total_mult=total_mult,
+        stream=stream,
+    )[0]
+
+
+def roll_dice_many(times, sides, n, modifier=0, dice_mult=1, total_mult=1, stream=None):
+    """
+    Simulate n separate dice rolls of XdY + Z, e.g. the hit points for a
+    whole group of monsters, returning a list of n results.
+
+    Uses NumPy when it's installed and there are enough dice to make it
+    worthwhile, and the standard library otherwise; either way a seeded
+    stream gives the same rolls.
+
+    Example usage:
+
+       # Hit points for 500 goblins: 2d6 each
+       >>> roll_dice_many(2, 6, 500)
+       # Initiative for 4 monsters
+       >>> roll_dice_many(1, 20, 4)
+    """
+    if n <= 0:
+        return []
+    stream = stream or current_stream()
+    if times <= 0 or sides <= 0:
+        dice_results = [0] * n
+    elif np is not None and times * n >= numpy_threshold:
+        dice_results = _sum_rolls_numpy(times, sides, n, stream.random)
+    else:
+        dice_results = _sum_rolls(times, sides, n, stream.random)
+    return [total_mult * (dice_mult * x + modifier) for x in dice_results]
+
+
+def _sum_rolls(times, sides, n, random):
+    # choices makes every roll in one call, far faster than calling randint
+    # per die; summing runs of them gives each result
+    rolls = random.choices(range(1, sides + 1), k=times * n)
+    if times == 1:
+        return rolls
+    if n == 1:
+        return [sum(rolls)]
+    totals = [0, *accumulate(rolls)]
+    return [totals[i + times] - totals[i] for i in range(0, times * n, times)]
+
+
+def _sum_rolls_numpy(times, sides, n, random):
+    # Make the same rolls as _sum_rolls, from the same Mersenne Twister
+    # words: choices turns each pair of words into a float the way
+    # random() does, (a >> 5, b >> 6) / 2**53, and picks floor(x * sides)
+    k = times * n
+    words = np.frombuffer(
+        random.getrandbits(64 * k).to_bytes(8 * k, "little"), dtype="<u4"
+    ).reshape(k, 2)
+    x = ((words[:, 0] >> 5) * 67108864.0 + (words[:, 1] >> 6)) / 9007199254740992.0
+    rolls = np.floor(x * sides).astype(np.int64) + 1
+    return rolls.reshape(n, times).sum(axis=1).tolist()
+
+
+class DiceError(ValueError):
+    pass
+
+
+comparisons = {
+    "=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Tokens: numbers, the d in XdY, keep/drop, rerolls, explosions, operators
+dice_token = re.compile(r"\d+|kh|kl|dh|dl|ro|[dkr!%+\-]|[<>]=?|=")
+
+# Exploding dice stop after this many extra rolls per die, like most
+# online dice rollers, so that rolls (and maximums) stay finite
+max_explosions = 100
+
+
+class Dice:
+    """
+    One XdY term of a dice expression, plus its modifiers: rerolls
+    ("r1" rerolls 1s until they stop coming up, "ro<3" rerolls 1s and 2s
+    once), explosions ("!" rolls again on a max and adds it to the die,
+    "!>=5" does so on a 5 or 6), and keep/drop ("kh3", "kl1", "dl1", "dh1").
+    """
+
+    def __init__(self, times, sides):
+        self.times = times
+        self.sides = sides
+        self.reroll = None
+        self.reroll_once = False
+        self.explode = None
+        self.keep = None
+
+    @property
+    def is_simple(self):
+        return not (self.reroll or self.explode or self.keep)
+
+    def compile(self, source):
+        """
+        Compile the term into a roller function, which takes the random
+        stream to roll with, returning it along with the term's lowest and
+        highest possible totals.
+        """
+        faces = range(1, self.sides + 1)
+        first_faces = faces
+        if self.reroll and not self.reroll_once:
+            first_faces = [x for x in faces if not self.reroll(x)]
+            if not first_faces:
+                raise DiceError(f"Dice expression '{source}' rerolls forever")
+        if self.explode and all(map(self.explode, faces)):
+            raise DiceError(f"Dice expression '{source}' explodes forever")
+
+        die_low, die_high = self._die_bounds(first_faces)
+        kept = self.times
+        if self.keep:
+            kept = max(0, min(self.keep[1], self.times))
+            if self.keep[0] in ("dh", "dl"):
+                kept = self.times - kept
+
+        if self.is_simple and self.times == 1:
+            sides = self.sides
+            roll = lambda stream: int(stream.random.random() * sides) + 1
+        elif self.is_simple:
+            times, sides = self.times, self.sides
+            roll = lambda stream: roll_dice(times, sides, stream=stream)
+        else:
+            roll = self._compile_roller(kept)
+
+        return roll, kept * die_low, kept * die_high
+
+    def _die_bounds(self, first_faces):
+        explode = self.explode or (lambda x: False)
+        faces = range(1, self.sides + 1)
+
+        # A die that explodes adds the next roll, which can explode in turn,
+        # so work out from the last allowed roll back to the first
+        low, high = 1, self.sides
+        for _ in range(max_explosions - 1 if self.explode else 0):
+            low = min(x + low if explode(x) else x for x in faces)
+            high = max(x + high if explode(x) else x for x in faces)
+
+        low = min(x + low if explode(x) else x for x in first_faces)
+        high = max(x + high if explode(x) else x for x in first_faces)
+        return low, high
+
+    def _compile_roller(self, kept):
+        times, sides = self.times, self.sides
+        reroll, reroll_once, explode = self.reroll, self.reroll_once, self.explode
+        keep = self.keep[0] if self.keep else None
+
+        def roll_die(randint):
+            value = randint(1, sides)
+            if reroll:
+                if reroll_once:
+                    if reroll(value):
+                        value = randint(1, sides)
+                else:
+                    while reroll(value):
+                        value = randint(1, sides)
+            if explode:
+                last = value
+                for _ in range(max_explosions):
+                    if not explode(last):
+                        break
+                    last = randint(1, sides)
+                    value += last
+            return value
+
+        if keep is None:
+            return lambda stream: sum(
+                roll_die(stream.random.randint) for _ in range(times)
+            )
+
+        # Keeping the highest is dropping the lowest, and vice versa
+        highest = keep in ("kh", "dl")
+
+        def roll(stream):
+            randint = stream.random.randint
+            dice = sorted((roll_die(randint) for _ in range(times)), reverse=highest)
+            return sum(dice[:kept])
+
+        return roll
+
+
+class DiceExpression:
+    """
+    A compiled dice expression like "2d6+1d4+3", "4d6kh3", "2d20kl1",
+    "2d6ro<3", or "1d6!".
+
+    Expressions are parsed once into terms, and each term is compiled into
+    a roller function; `roll()` rolls the whole expression, `roll_many(n)`
+    rolls it n separate times, and `min` and `max` are its lowest and
+    highest possible results.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.terms = self._parse(source)
+
+        # Constants are added up ahead of time, leaving a roller per dice term
+        self.min = self.max = offset = 0
+        rollers = []
+        for sign, term in self.terms:
+            if not isinstance(term, Dice):
+                offset += sign * term
+                continue
+            roll, low, high = term.compile(source)
+            if sign < 0:
+                low, high = -high, -low
+                roll = (lambda roll: lambda stream: -roll(stream))(roll)
+            self.min += low
+            self.max += high
+            rollers.append(roll)
+        self.min += offset
+        self.max += offset
+
+        if len(rollers) == 1:
+            roll = rollers[0]
+            self._roll = lambda stream: roll(stream) + offset
+            self._roll_dice = roll
+        else:
+            self._roll = lambda stream: sum(roll(stream) for roll in rollers) + offset
+            self._roll_dice = lambda stream: sum(roll(stream) for roll in rollers)
+        self.offset = offset
+
+        self.has_dice = bool(rollers)
+        self.is_simple = all(isinstance(x, int) or x.is_simple for _, x in self.terms)
+
+    def __call__(self, stream=None):
+        return self.roll(stream)
+
+    def roll(self, stream=None, dice_mult=1):
+        if dice_mult != 1:
+            return self._roll_dice(stream or current_stream()) * dice_mult + self.offset
+        return self._roll(stream or current_stream())
+
+    def roll_many(self, n, stream=None, dice_mult=1):
+        """
+        Roll the expression n separate times; as with `roll_dice`,
+        `dice_mult` multiplies what the dice come up but not the constants,
+        e.g. dice_mult=2 for a critical hit's damage.
+        """
+        stream = stream or current_stream()
+        if not self.is_simple:
+            return [self.roll(stream, dice_mult) for _ in range(n)]
+
+        # Plain dice and constants can be rolled for all n at once, term by term
+        results = [0] * n
+        for sign, term in self.terms:
+            if isinstance(term, Dice):
+                rolls = roll_dice_many(
+                    term.times,
+                    term.sides,
+                    n,
+                    dice_mult=dice_mult,
+                    total_mult=sign,
+                    stream=stream,
+                )
+                results = [x + y for x, y in zip(results, rolls)]
+            else:
+                results = [x + sign * term for x in results]
+        return results
+
+    def _parse(self, source):
+        text = "".join(str(source).lower().split())
+        tokens = dice_token.findall(text)
+        if not text or "".join(tokens) != text:
+            raise DiceError(f"Invalid dice expression '{source}'")
+
+        self._tokens = tokens
+        self._pos = 0
+        terms = []
+        sign = 1
+        if self._peek() in ("+", "-"):
+            sign = -1 if self._next() == "-" else 1
+        while True:
+            terms.append((sign, self._parse_term()))
+            op = self._next()
+            if op is None:
+                break
+            if op not in ("+", "-"):
+                raise DiceError(f"Invalid dice expression '{source}'")
+            sign = -1 if op == "-" else 1
+        return terms
+
+    def _peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        self._pos += 1
+        return token
+
+    def _number(self, default=None):
+        if self._peek() is not None and self._peek().isdigit():
+            return int(self._next())
+        if default is None:
+            raise DiceError(f"Invalid dice expression '{self.source}'")
+        return default
+
+    def _selector(self, default=None):
+        op = "="
+        if self._peek() in comparisons:
+            op = self._next()
+        elif default is not None and not (self._peek() or "").isdigit():
+            return lambda x: x == default
+        value = self._number()
+        compare = comparisons[op]
+        return lambda x: compare(x, value)
+
+    def _parse_term(self):
+        if self._peek() != "d":
+            times = self._number()
+            if self._peek() != "d":
+                return times
+        else:
+            times = 1
+
+        self._next()
+        if self._peek() == "%":
+            self._next()
+            sides = 100
+        else:
+            sides = self._number()
+        if not sides:
+            raise DiceError(f"Dice need at least one side in '{self.source}'")
+
+        dice = Dice(times, sides)
+        while self._peek() not in (None, "+", "-"):
+            token = self._next()
+            if token in ("r", "ro") and not dice.reroll:
+                dice.reroll = self._selector()
+                dice.reroll_once = token == "ro"
+            elif token == "!" and not dice.explode:
+                dice.explode = self._selector(default=sides)
+            elif token in ("k", "kh", "kl", "dh", "dl") and not dice.keep:
+                dice.keep = ("kh" if token == "k" else token, self._number())
+            else:
+                raise DiceError(f"Invalid dice expression '{self.source}'")
+        return dice
+
+
+@lru_cache(maxsize=1024)
+def compile_dice_expr(value):
     """
-    randint = random.randint
-    dice_result = sum(map(lambda x: randint(1, sides), range(times)))
-    return total_mult * (dice_mult * dice_result + modifier)
+    Compile a dice expression, reusing the compiled form for expressions
+    we've seen before.
+    """
+    return DiceExpression(value)
 
 
-def roll_dice_expr(value):
+def is_dice_expr(value):
+    """
+    Check whether a string is a valid dice expression with some dice in it.
+    """
+    try:
+        return compile_dice_expr(value).has_dice
+    except (TypeError, ValueError):
+        return False
+
+
+def roll_dice_expr(value, stream=None, dice_mult=1):
     """
     Get a dice roll from a dice expression; i.e. a string like
-    "3d6" or "1d8+1"
+    "3d6", "1d8+1", "2d6+1d4+3", "4d6kh3", or "2d20kl1"
     """
-    m = dice_expr.match(value)
+    return compile_dice_expr(value).roll(stream, dice_mult)
 
-    if not m:
-        raise ValueError(f"Invalid dice expression '{value}'")
 
-    times, sides, modifier = m.groups()
-    times = int(times)
-    sides = int(sides)
-    modifier = int(modifier or 0)
-    return roll_dice(times, sides, modifier=modifier)
+def roll_dice_expr_many(value, n, stream=None, dice_mult=1):
+    """
+    Get n separate dice rolls from a dice expression.
+    """
+    return compile_dice_expr(value).roll_many(n, stream, dice_mult)
 
 
 def max_dice_expr(value, floor=None):
     """
     Get the maximum value of a dice expression.
     """
-    m = dice_expr.match(value)
-
-    if not m:
-        raise ValueError(f"Invalid dice expression '{value}'")
-
-    times, sides, modifier = m.groups()
-    times = int(times)
-    sides = int(sides)
-    modifier = int(modifier or 0)
-    calculated = (times * sides) + modifier
+    calculated = compile_dice_expr(value).max
     if floor is not None:
         return max(calculated, floor)
     return calculated
@@ -72,16 +439,7 @@ def min_dice_expr(value, floor=None):
     """
     Get the minimum value of a dice expression.
     """
-    m = dice_expr.match(value)
-
-    if not m:
-        raise ValueError(f"Invalid dice expression '{value}'")
-
-    times, sides, modifier = m.groups()
-    times = int(times)
-    sides = int(sides)
-    modifier = int(modifier or 0)
-    calculated = times + modifier
+    calculated = compile_dice_expr(value).min
     if floor is not None:
         return max(calculated, floor)
     return calculated
@@ -0,0 +1,134 @@
+"""
+5E encounter difficulty, per the Dungeon Master's Guide: total monster XP,
+adjusted by a multiplier for the number of monsters, compared against the
+party's XP thresholds.
+"""
+
+from dndme.counts import get_group_bounds
+from dndme.models import EncounterRating
+
+difficulties = ("easy", "medium", "hard", "deadly")
+
+# Easy, medium, hard, and deadly XP thresholds per character level
+xp_thresholds = {
+    1: (25, 50, 75, 100),
+    2: (50, 100, 150, 200),
+    3: (75, 150, 225, 400),
+    4: (125, 250, 375, 500),
+    5: (250, 500, 750, 1100),
+    6: (300, 600, 900, 1400),
+    7: (350, 750, 1100, 1700),
+    8: (450, 900, 1400, 2100),
+    9: (550, 1100, 1600, 2400),
+    10: (600, 1200, 1900, 2800),
+    11: (800, 1600, 2400, 3600),
+    12: (1000, 2000, 3000, 4500),
+    13: (1100, 2200, 3400, 5100),
+    14: (1250, 2500, 3800, 5700),
+    15: (1400, 2800, 4300, 6400),
+    16: (1600, 3200, 4800, 7200),
+    17: (2000, 3900, 5900, 8800),
+    18: (2100, 4200, 6300, 9500),
+    19: (2400, 4900, 7300, 10900),
+    20: (2800, 5700, 8500, 12700),
+}
+
+# XP per monster by challenge rating
+xp_by_cr = {
+    0: 10,
+    0.125: 25,
+    0.25: 50,
+    0.5: 100,
+    1: 200,
+    2: 450,
+    3: 700,
+    4: 1100,
+    5: 1800,
+    6: 2300,
+    7: 2900,
+    8: 3900,
+    9: 5000,
+    10: 5900,
+    11: 7200,
+    12: 8400,
+    13: 10000,
+    14: 11500,
+    15: 13000,
+    16: 15000,
+    17: 18000,
+    18: 20000,
+    19: 22000,
+    20: 25000,
+    21: 33000,
+    22: 41000,
+    23: 50000,
+    24: 62000,
+    25: 75000,
+    26: 90000,
+    27: 105000,
+    28: 120000,
+    29: 135000,
+    30: 155000,
+}
+
+# Multipliers for 1, 2, 3-6, 7-10, 11-14, and 15+ monsters, with one more
+# at each end for unusually small or large parties
+multipliers = (0.5, 1, 1.5, 2, 2.5, 3, 4, 5)
+monster_count_steps = (1, 2, 3, 7, 11, 15)
+
+
+def get_party_thresholds(levels):
+    thresholds = [xp_thresholds[min(max(level, 1), 20)] for level in levels]
+    return tuple(map(sum, zip(*thresholds)))
+
+
+def get_multiplier(monster_count, party_size):
+    if not monster_count:
+        return 0
+    step = sum(1 for x in monster_count_steps if monster_count >= x)
+    if party_size < 3:
+        step += 1
+    elif party_size >= 6:
+        step -= 1
+    return multipliers[step]
+
+
+def get_difficulty(xp, monster_count, levels):
+    if not levels:
+        return None
+    adjusted = xp * get_multiplier(monster_count, len(levels))
+    difficulty = "trivial"
+    for name, threshold in zip(difficulties, get_party_thresholds(levels)):
+        if adjusted >= threshold:
+            difficulty = name
+    return difficulty
+
+
+def rate_encounter(groups, monster_xp, levels, party_counts=None):
+    """
+    Rate an encounter from its groups without loading any monsters.
+
+    :param groups: The encounter's groups, or a summary of them; each needs
+                   a monster and count, and may override the monster's xp.
+    :param monster_xp: Dict of monster name to xp.
+    :param levels: The party's character levels.
+    :param party_counts: Party counts for group counts like "players + 1".
+    :return: An EncounterRating, or None if a group count is invalid.
+    """
+    bounds = get_group_bounds(groups, party_counts)
+    if bounds is None:
+        return None
+
+    count = [0, 0]
+    xp = [0, 0]
+    for key, group in groups.items():
+        each = group.get("xp", monster_xp.get(group.get("monster"), 0)) or 0
+        for i in (0, 1):
+            count[i] += bounds[key][i]
+            xp[i] += bounds[key][i] * each
+
+    return EncounterRating(
+        count=tuple(count),
+        xp=tuple(xp),
+        difficulty=tuple(get_difficulty(xp[i], count[i], levels) for i in (0, 1)),
+    )
@@ -0,0 +1,365 @@
+"""
+Generate a large synthetic content pack and campaign for scale testing:
+lots of monsters (some of them variants), encounters with every kind of
+group count, a big party, a long calendar, and a campaign log covering
+many sessions, all in the same formats as the real thing.
+
+Output is deterministic for a given seed. Each kind of output draws from
+its own seeded stream, so e.g. asking for more monsters doesn't change
+the party.
+"""
+
+import os
+import random
+import re
+import sys
+
+import click
+import pytoml as toml
+
+from dndme.difficulty import xp_by_cr
+
+base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+syllables = (
+    "ak", "bar", "cor", "dra", "el", "fen", "gor", "hal", "is", "jor", "kel",
+    "lor", "mor", "nar", "ol", "pel", "quin", "ras", "sul", "tor", "ul",
+    "vex", "wyn", "xan", "yor", "zed",
+)  # fmt: skip
+sizes = ("tiny", "small", "medium", "large", "huge", "gargantuan")
+mtypes = (
+    "aberration", "beast", "celestial", "construct", "dragon", "elemental",
+    "fey", "fiend", "giant", "humanoid", "monstrosity", "ooze", "plant",
+    "undead",
+)  # fmt: skip
+alignments = (
+    "lawful good", "neutral good", "chaotic good", "lawful neutral",
+    "neutral", "chaotic neutral", "lawful evil", "neutral evil",
+    "chaotic evil", "unaligned",
+)  # fmt: skip
+damage_types = (
+    "acid", "cold", "fire", "lightning", "necrotic", "poison", "psychic",
+    "radiant", "thunder",
+)  # fmt: skip
+skills = ("athletics", "acrobatics", "arcana", "perception", "stealth", "survival")
+classes = (
+    "Barbarian", "Bard", "Cleric", "Druid", "Fighter", "Monk", "Paladin",
+    "Ranger", "Rogue", "Sorcerer", "Warlock", "Wizard",
+)  # fmt: skip
+species = ("Dwarf", "Elf", "Gnome", "Halfling", "Human", "Orc", "Tiefling")
+crs = list(xp_by_cr)
+
+
+def make_word(rng, min_syllables=2, max_syllables=3):
+    return "".join(
+        rng.choice(syllables) for _ in range(rng.randint(min_syllables, max_syllables))
+    )
+
+
+def generate_monster(rng, name):
+    cr = rng.choice(crs[: rng.choice((9, 15, len(crs)))])
+    hit_dice = max(1, int(cr * 2) + rng.randint(1, 4))
+    die = rng.choice((6, 8, 10, 12))
+    data = {
+        "name": name,
+        "size": rng.choice(sizes),
+        "mtype": rng.choice(mtypes),
+        "alignment": rng.choice(alignments),
+        "ac": rng.randint(10, 20),
+        "armor": rng.choice(("", "natural armor", "chain mail", "shield")),
+        "max_hp": f"{hit_dice}d{die}+{hit_dice * rng.randint(0, 3)}",
+        "speed": rng.choice((20, 25, 30, 40, "30, fly 60", "30, swim 30")),
+        "str": rng.randint(3, 24),
+        "dex": rng.randint(3, 20),
+        "con": rng.randint(8, 24),
+        "int": rng.randint(1, 20),
+        "wis": rng.randint(3, 20),
+        "cha": rng.randint(1, 20),
+        "vulnerable": rng.choice(("",) * 4 + damage_types),
+        "resist": ", ".join(rng.sample(damage_types, rng.randint(0, 2))),
+        "immune": rng.choice(("",) * 4 + damage_types),
+        "languages": rng.choice(("", "Common", "Common, Draconic", "Abyssal")),
+        "cr": cr,
+        "xp": xp_by_cr[cr],
+        "notes": " ".join(make_word(rng) for _ in range(rng.randint(5, 60))) + "\n",
+        "skills": {x: rng.randint(1, 10) for x in rng.sample(skills, 2)},
+        "senses": {
+            "darkvision": rng.choice((0, 60, 120)),
+            "perception": rng.randint(8, 20),
+        },
+        "traits": generate_sections(rng, rng.randint(0, 3)),
+        "actions": generate_sections(rng, rng.randint(1, 4)),
+    }
+    if cr >= 10 and rng.random() < 0.5:
+        data["legendary_actions"] = generate_sections(rng, 3)
+    return data
+
+
+def generate_variant(rng, name, parent):
+    return {
+        "name": name,
+        "inherits": parent,
+        "ac": rng.randint(10, 20),
+        "max_hp": f"{rng.randint(2, 12)}d8",
+        "actions": generate_sections(rng, 1),
+    }
+
+
+def generate_sections(rng, count):
+    sections = {}
+    for _ in range(count):
+        name = f"{make_word(rng).title()} {rng.choice(('Strike', 'Breath', 'Aura'))}"
+        sections[name.lower().replace(" ", "_")] = {
+            "name": name,
+            "description": (
+                f"Melee Weapon Attack: +{rng.randint(2, 12)} to hit, reach 5 ft., "
+                f"one target. Hit: {rng.randint(1, 4)}d{rng.choice((4, 6, 8, 10))} "
+                f"{rng.choice(damage_types)} damage.\n"
+            ),
+        }
+    return sections
+
+
+def generate_count(rng, earlier_groups):
+    """
+    A group count: a number, dice, or an expression on the party's counts
+    or on the sizes of earlier groups.
+    """
+    kinds = ["number", "dice", "party"]
+    if earlier_groups:
+        kinds.append("group")
+    kind = rng.choice(kinds)
+
+    if kind == "number":
+        return rng.randint(1, 8)
+    if kind == "dice":
+        return f"{rng.randint(1, 3)}d{rng.choice((4, 6))}+{rng.randint(0, 2)}"
+    if kind == "party":
+        name = rng.choice(("players", "party", "sidekicks"))
+        return rng.choice((f"{name} + {rng.randint(0, 3)}", f"{name} * 2 - 1"))
+    name = rng.choice(earlier_groups)
+    return rng.choice((name, f"{name} + {rng.randint(1, 2)}", f"{name} // 2"))
+
+
+def generate_encounter(rng, name, monster_names):
+    groups = {}
+    for i in range(rng.randint(1, 5)):
+        monster = rng.choice(monster_names)
+        key = f"{make_word(rng)}_{i}"
+        group = {"monster": monster, "count": generate_count(rng, list(groups))}
+        if type(group["count"]) is int and rng.random() < 0.3:
+            group["max_hp"] = [rng.randint(5, 60) for _ in range(group["count"])]
+        groups[key] = group
+
+    return {
+        "name": name,
+        "location": make_word(rng).title(),
+        "notes": " ".join(make_word(rng) for _ in range(rng.randint(5, 40))) + "\n",
+        "groups": groups,
+    }
+
+
+def generate_party(rng, size):
+    party = {}
+    while len(party) < size:
+        name = make_word(rng).title()
+        if name in party:
+            continue
+        level = rng.randint(1, 20)
+        max_hp = level * rng.randint(6, 12)
+        party[name] = {
+            "name": name,
+            "species": rng.choice(species),
+            "cclass": rng.choice(classes),
+            "ctype": "sidekick" if rng.random() < 0.2 else "player",
+            "level": level,
+            "pronouns": rng.choice(("", "he/him", "she/her", "they/them")),
+            "max_hp": max_hp,
+            "cur_hp": max_hp,
+            "temp_hp": 0,
+            "ac": rng.randint(10, 20),
+            "initiative_mod": rng.randint(-1, 5),
+            "image_url": "",
+            "senses": {"perception": rng.randint(8, 18)},
+        }
+    return party
+
+
+def generate_calendar(rng, months, moons):
+    names = []
+    while len(names) < months:
+        name = make_word(rng).title()
+        if name not in names:
+            names.append(name)
+
+    month_data = {}
+    for name in names:
+        month_data[name.lower()] = {"name": name, "days": rng.choice((1, 28, 30, 31))}
+    month_data[names[-1].lower()]["leap_year_days"] = (
+        month_data[names[-1].lower()]["days"] + 1
+    )
+    days_in_year = sum(x["days"] for x in month_data.values()) + 0.25
+
+    seasons = {}
+    for i, key in enumerate(
+        ("spring_equinox", "summer_solstice", "autumn_equinox", "winter_solstice")
+    ):
+        month = month_data[names[(i * 2 + 1) * months // 8].lower()]
+        seasons[key] = {
+            "name": key.replace("_", " ").title(),
+            "month": month["name"],
+            "day": rng.randint(1, month["days"]),
+        }
+
+    return {
+        "name": f"Calendar of {make_word(rng).title()}",
+        "hours_in_day": 24,
+        "minutes_in_hour": 60,
+        "leap_year_rule": "year % 4 == 0",
+        "axial_tilt": round(rng.uniform(10, 35), 2),
+        "solar_days_in_year": days_in_year,
+        "default_day": 1,
+        "default_month": names[0],
+        "default_year": 1000,
+        "months": month_data,
+        "seasons": seasons,
+        "moons": {
+            f"moon{i}": {
+                "name": make_word(rng).title(),
+                "period": round(rng.uniform(10, 60), 4),
+                "full_on": f"1 {names[0]} 1000",
+            }
+            for i in range(1, moons + 1)
+        },
+    }
+
+
+def generate_log(rng, sessions, calendar):
+    """
+    Generate a campaign log's lines, in the format the log command writes:
+    each session starts with a timestamp and ends with the in-game date,
+    time, and latitude the next session picks up from.
+    """
+    months = [x for x in calendar["months"].values() if x["days"] > 1] or list(
+        calendar["months"].values()
+    )
+    year = calendar["default_year"]
+    month_index = 0
+    latitude = round(rng.uniform(-60, 60), 1)
+
+    for session in range(sessions):
+        yield ""
+        yield (
+            f"Session started {2000 + session // 50}-{session // 5 % 12 + 1:02d}-"
+            f"{session % 28 + 1:02d} {rng.randint(10, 23):02d}:"
+            f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        )
+        for _ in range(rng.randint(0, 25)):
+            yield "* " + " ".join(make_word(rng) for _ in range(rng.randint(2, 15)))
+
+        month_index += rng.randint(0, 1)
+        if month_index >= len(months):
+            month_index = 0
+            year += 1
+        latitude = round(latitude + rng.uniform(-0.5, 0.5), 1)
+        month = months[month_index]
+        yield (
+            f"* Session ended on {rng.randint(1, month['days'])} {month['name']} "
+            f"{year} at {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d} "
+            f"at {latitude}°"
+        )
+
+
+def write_toml(filename, data):
+    with open(filename, "w") as fout:
+        toml.dump(data, fout)
+
+
+def generate_content_pack(content_dir, seed, monsters, encounters):
+    """
+    Write a content pack with the given numbers of monsters and
+    encounters; about one monster in ten is a variant of another.
+    """
+    os.makedirs(f"{content_dir}/monsters")
+    os.makedirs(f"{content_dir}/encounters")
+    os.makedirs(f"{content_dir}/images/monsters")
+
+    rng = random.Random(f"{seed}:monsters")
+    prefix = re.sub(r"\W+", "_", os.path.basename(content_dir).lower())
+    names = [f"{prefix}_{make_word(rng)}_{i}" for i in range(monsters)]
+    for i, name in enumerate(names):
+        if i >= 10 and rng.random() < 0.1:
+            data = generate_variant(rng, name, rng.choice(names[: i // 2]))
+        else:
+            data = generate_monster(rng, name)
+        write_toml(f"{content_dir}/monsters/{name}.toml", data)
+
+    rng = random.Random(f"{seed}:encounters")
+    for i in range(encounters):
+        data = generate_encounter(
+            rng, f"Encounter {i}: {make_word(rng).title()}", names
+        )
+        write_toml(f"{content_dir}/encounters/encounter_{i}.toml", data)
+
+    return names
+
+
+def generate_campaign(campaign_dir, content_dir, seed, party_size, sessions, months):
+    """
+    Write a campaign with a party, calendar, log, and settings that use
+    the given content pack.
+    """
+    os.makedirs(campaign_dir)
+    relative = lambda x: os.path.relpath(x, base_dir)
+
+    write_toml(
+        f"{campaign_dir}/party.toml",
+        generate_party(random.Random(f"{seed}:party"), party_size),
+    )
+
+    calendar = generate_calendar(random.Random(f"{seed}:calendar"), months, moons=3)
+    write_toml(f"{campaign_dir}/calendar.toml", calendar)
+
+    rng = random.Random(f"{seed}:log")
+    with open(f"{campaign_dir}/log.md", "w") as fout:
+        for line in generate_log(rng, sessions, calendar):
+            fout.write(line + "\n")
+
+    write_toml(
+        f"{campaign_dir}/settings.toml",
+        {
+            "calendar_file": relative(f"{campaign_dir}/calendar.toml"),
+            "log_file": relative(f"{campaign_dir}/log.md"),
+            "party_file": relative(f"{campaign_dir}/party.toml"),
+            "encounters": relative(f"{content_dir}/encounters"),
+            "images": relative(f"{content_dir}/images"),
+            "content_path": [relative(content_dir)],
+        },
+    )
+
+
+@click.command()
+@click.argument("name")
+@click.option("--seed", default=0, help="Seed for the random generators")
+@click.option("--monsters", default=1000, help="Number of monsters to generate")
+@click.option("--encounters", default=500, help="Number of encounters to generate")
+@click.option("--party-size", default=40, help="Number of characters in the party")
+@click.option("--sessions", default=2000, help="Number of sessions in the log")
+@click.option("--months", default=48, help="Number of months in the calendar")
+def main(name, seed, monsters, encounters, party_size, sessions, months):
+    content_dir = f"{base_dir}/content/{name}"
+    campaign_dir = f"{base_dir}/campaigns/{name}"
+    for directory in (content_dir, campaign_dir):
+        if os.path.exists(directory):
+            print(f"{os.path.relpath(directory, base_dir)} already exists")
+            sys.exit(1)
+
+    generate_content_pack(content_dir, seed, monsters, encounters)
+    generate_campaign(campaign_dir, content_dir, seed, party_size, sessions, months)
+
+    print(f"Generated content/{name} and campaigns/{name}")
+    print(f"Run it with: dndme --campaign {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+import csv
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+import multiprocessing
+
+import click
+import pytoml as toml
+
+from dndme.bundle import BundleError, compile_bundle
+from dndme.dice import is_dice_expr
+from dndme.difficulty import xp_by_cr
+from dndme.schemas import monster_schema, validate_monster
+
+base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+default_batch_size = 64
+default_chunk_size = 64 * 1024
+
+abilities = {
+    "strength": "str",
+    "dexterity": "dex",
+    "constitution": "con",
+    "intelligence": "int",
+    "wisdom": "wis",
+    "charisma": "cha",
+}
+
+sections = {
+    "special_abilities": "traits",
+    "traits": "traits",
+    "actions": "actions",
+    "bonus_actions": "bonus_actions",
+    "legendary_actions": "legendary_actions",
+    "lair_actions": "lair_actions",
+    "reactions": "reactions",
+}
+
+
+def read_json_records(fin, chunk_size=default_chunk_size):
+    """
+    Stream the records out of a JSON array, or out of JSON lines, reading
+    only as much of the file as it takes to decode the next record.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    while True:
+        # Skip whatever's between records: whitespace, commas, and the
+        # brackets around the array
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = fin.read(chunk_size), 0
+            eof = not buffer
+
+        if pos >= len(buffer):
+            return
+
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Probably just haven't read the whole record yet
+            more = fin.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+
+        yield record
+
+
+def read_csv_records(fin):
+    for row in csv.DictReader(fin):
+        yield {
+            key: parse_scalar(value)
+            for key, value in row.items()
+            if key and value and value.strip()
+        }
+
+
+def parse_scalar(value):
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def make_key(name):
+    return re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_") or "monster"
+
+
+def parse_number(value):
+    value = str(value).split()[0]
+    return int(re.match(r"-?\d+", value).group())
+
+
+def parse_cr(value):
+    cr = float(Fraction(str(value).strip()))
+    return int(cr) if cr.is_integer() else cr
+
+
+def parse_hp_expr(value):
+    value = re.sub(r"\s+", "", str(value))
+    return value if is_dice_expr(value) else None
+
+
+def parse_speed(value):
+    if isinstance(value, dict):
+        if set(value) <= {"walk"}:
+            return parse_number(value.get("walk", 0))
+        return ", ".join(
+            f"{value[k]}" if k == "walk" else f"{k} {value[k]}" for k in value
+        )
+    if isinstance(value, str) and re.fullmatch(r"\d+( ft\.?)?", value.strip()):
+        return parse_number(value)
+    return value
+
+
+def parse_senses(value):
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = [
+            (m.group(1), m.group(2))
+            for m in re.finditer(r"([A-Za-z_ ]+?)\s+(\d+)", str(value))
+        ]
+    senses = {}
+    for sense, distance in items:
+        sense = make_key(sense).replace("passive_", "")
+        try:
+            senses[sense] = parse_number(distance)
+        except (AttributeError, ValueError):
+            senses[sense] = str(distance)
+    return senses
+
+
+def parse_skills(record):
+    if isinstance(record.get("skills"), dict):
+        return {make_key(k): int(v) for k, v in record["skills"].items()}
+
+    skills = {}
+    for proficiency in record.get("proficiencies", []):
+        name = proficiency.get("proficiency", {}).get("name", "")
+        if name.startswith("Skill: "):
+            skills[make_key(name[len("Skill: ") :])] = int(proficiency["value"])
+    return skills
+
+
+def parse_section(entries):
+    if isinstance(entries, dict):
+        return entries
+
+    section = {}
+    for entry in entries:
+        key = base_key = make_key(entry.get("name", ""))
+        i = 2
+        while key in section:
+            key, i = f"{base_key}_{i}", i + 1
+        section[key] = {
+            "name": entry.get("name", ""),
+            "description": entry.get("desc", entry.get("description", "")),
+        }
+    return section
+
+
+def join_list(value):
+    if isinstance(value, list):
+        return ", ".join(x.get("name", "") if isinstance(x, dict) else x for x in value)
+    return value
+
+
+def convert_record(record):
+    """
+    Convert a monster record from a JSON or CSV dump into dndme's monster
+    format. Understands the common SRD export layouts (5e-srd-api and
+    Open5e style) as well as records that already use dndme's keys.
+    """
+    record = {k: v for k, v in record.items() if v not in ("", None, [], {})}
+    if "name" not in record:
+        raise ValueError("Record has no name")
+
+    data = {"name": make_key(record["name"])}
+
+    if "size" in record:
+        data["size"] = str(record["size"]).lower()
+    if "type" in record:
+        data["mtype"] = str(record["type"]).lower()
+        if record.get("subtype"):
+            data["mtype"] += f":{str(record['subtype']).lower()}"
+    if "alignment" in record:
+        data["alignment"] = record["alignment"]
+
+    armor_class = record.get("armor_class")
+    if isinstance(armor_class, list):
+        data["ac"] = int(armor_class[0]["value"])
+        armor = join_list(armor_class[0].get("armor", []))
+        if armor:
+            data["armor"] = armor
+    elif armor_class is not None:
+        data["ac"] = parse_number(armor_class)
+    if "armor_desc" in record:
+        data["armor"] = record["armor_desc"]
+
+    for key in ("hit_points_roll", "hit_dice", "hit_points_dice"):
+        max_hp = parse_hp_expr(record.get(key, ""))
+        if max_hp:
+            data["max_hp"] = max_hp
+            break
+    if "hit_points" in record:
+        data["avg_hp"] = parse_number(record["hit_points"])
+        data.setdefault("max_hp", data["avg_hp"])
+
+    if "speed" in record:
+        data["speed"] = parse_speed(record["speed"])
+
+    for long_name, short_name in abilities.items():
+        if long_name in record:
+            data[short_name] = int(record[long_name])
+
+    for key, field in (
+        ("damage_vulnerabilities", "vulnerable"),
+        ("damage_resistances", "resist"),
+        ("damage_immunities", "immune"),
+    ):
+        if key in record:
+            data[field] = join_list(record[key])
+    if "condition_immunities" in record:
+        conditions = join_list(record["condition_immunities"])
+        data["immune"] = "; ".join(x for x in (data.get("immune"), conditions) if x)
+
+    if "languages" in record:
+        data["languages"] = join_list(record["languages"])
+    if "challenge_rating" in record:
+        data["cr"] = parse_cr(record["challenge_rating"])
+    if "proficiency_bonus" in record:
+        data["pb"] = int(record["proficiency_bonus"])
+    if isinstance(record.get("desc"), str):
+        data["notes"] = record["desc"]
+
+    if "senses" in record:
+        data["senses"] = parse_senses(record["senses"])
+    skills = parse_skills(record)
+    if skills:
+        data["skills"] = skills
+
+    for key, section in sections.items():
+        if key in record and isinstance(record[key], (list, dict)):
+            data.setdefault(section, {}).update(parse_section(record[key]))
+
+    # Anything already in dndme's format comes across as-is
+    for key in monster_schema.fields:
+        if key in record and key not in data:
+            data[key] = record[key]
+
+    if "xp" not in data and data.get("cr") in xp_by_cr:
+        data["xp"] = xp_by_cr[data["cr"]]
+
+    return validate_monster(data)
+
+
+def convert_batch(batch, as_toml=False):
+    """
+    Convert a batch of (record number, record) pairs into (record number,
+    name, data, error) tuples; the data is TOML text if as_toml is set.
+    """
+    results = []
+    for number, record in batch:
+        name = record.get("name") if isinstance(record, dict) else None
+        try:
+            data = convert_record(record)
+            results.append((number, name, toml.dumps(data) if as_toml else data, None))
+        except Exception as e:
+            results.append((number, name, None, f"{e.__class__.__name__}: {e}"))
+    return results
+
+
+def batched(records, batch_size):
+    batch = []
+    for number, record in enumerate(records, 1):
+        batch.append((number, record))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def convert_records(records, as_toml=False, jobs=1, batch_size=default_batch_size):
+    """
+    Convert records in batches, yielding results in input order.
+
+    With jobs other than 1, batches are converted across a pool of worker
+    processes (jobs=None for one per CPU), but only a couple of batches
+    per worker are ever in flight, so memory use stays the same however
+    many records there are.
+    """
+    batches = batched(records, batch_size)
+
+    if jobs == 1:
+        for batch in batches:
+            yield from convert_batch(batch, as_toml)
+        return
+
+    workers = jobs or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append(executor.submit(convert_batch, batch, as_toml))
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+class TomlWriter:
+    """
+    Write converted monsters to a pack's monsters dir, one TOML file each.
+    """
+
+    def __init__(self, pack_dir, overwrite=False):
+        self.pack_dir = pack_dir
+        self.monsters_dir = f"{pack_dir}/monsters"
+        self.overwrite = overwrite
+        os.makedirs(self.monsters_dir, exist_ok=True)
+
+    def add(self, key, text):
+        filename = f"{self.monsters_dir}/{key}.toml"
+        if not self.overwrite and os.path.exists(filename):
+            raise FileExistsError(f"{filename} already exists")
+        with open(filename, "w") as fout:
+            fout.write(text)
+
+    def close(self):
+        return self.monsters_dir
+
+
+class PackBundleWriter(TomlWriter):
+    """
+    Write converted monsters to a pack's TOML files, then compile the
+    pack's content bundle from them.
+
+    The TOML files stay the source of truth: the monster index and
+    check_data read them, and the loaders fall back to them whenever the
+    bundle goes stale, e.g. when an encounter is added to the pack.
+    """
+
+    def close(self):
+        super().close()
+        try:
+            return compile_bundle(self.pack_dir)
+        except BundleError as e:
+            raise click.ClickException(f"Imported, but unable to compile bundle: {e}")
+
+
+def import_records(records, writer, as_toml, jobs=1, batch_size=default_batch_size):
+    counts = {"imported": 0, "failed": 0}
+    keys = set()
+
+    for number, name, data, error in convert_records(
+        records, as_toml=as_toml, jobs=jobs, batch_size=batch_size
+    ):
+        if not error:
+            key = make_key(name)
+            try:
+                if key in keys:
+                    raise ValueError(f"Duplicate monster name {key}")
+                writer.add(key, data)
+                keys.add(key)
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+
+        if error:
+            counts["failed"] += 1
+            print(f"❌ Record {number} ({name or 'unnamed'}): {error}")
+        else:
+            counts["imported"] += 1
+
+    return counts
+
+
+def open_records(fin, fmt):
+    if fmt == "csv":
+        return read_csv_records(fin)
+    return read_json_records(fin)
+
+
+@click.command()
+@click.argument("name")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["json", "csv"]),
+    help="Format of the source file; default: guessed from its extension",
+)
+@click.option(
+    "--bundle/--toml",
+    default=False,
+    help="Also compile the pack's content bundle from the imported TOML files",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of worker processes to convert records with; 0 for one per CPU",
+)
+@click.option(
+    "--overwrite/--no-overwrite",
+    default=False,
+    help="Replace existing monster files with the same names",
+)
+def main(name, source, fmt, bundle, jobs, overwrite):
+    fmt = fmt or ("csv" if source.lower().endswith(".csv") else "json")
+    pack_dir = f"{base_dir}/content/{name}"
+    writer = (PackBundleWriter if bundle else TomlWriter)(pack_dir, overwrite)
+
+    with open(source, "r", newline="" if fmt == "csv" else None) as fin:
+        counts = import_records(
+            open_records(fin, fmt), writer, as_toml=True, jobs=jobs or None
+        )
+    destination = writer.close()
+
+    print(
+        f"Imported {counts['imported']} monsters into "
+        f"{os.path.relpath(destination, base_dir)}; {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import glob
+import json
+import os
+import sqlite3
+from fractions import Fraction
+
+import pytoml as toml
+
+from dndme.content_path import get_content_path, get_pack_patterns
+from dndme.schemas import validate_encounter
+
+schema = """
+CREATE TABLE IF NOT EXISTS sources (
+    filename TEXT PRIMARY KEY,
+    mtime INTEGER,
+    size INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS monsters (
+    id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE,
+    key TEXT,
+    name TEXT,
+    cr REAL,
+    xp INTEGER,
+    mtype TEXT,
+    size TEXT,
+    alignment TEXT,
+    speed TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS monsters_name ON monsters (name);
+CREATE INDEX IF NOT EXISTS monsters_cr ON monsters (cr);
+CREATE INDEX IF NOT EXISTS monsters_xp ON monsters (xp);
+CREATE INDEX IF NOT EXISTS monsters_mtype ON monsters (mtype);
+CREATE INDEX IF NOT EXISTS monsters_size ON monsters (size);
+CREATE INDEX IF NOT EXISTS monsters_alignment ON monsters (alignment);
+CREATE VIRTUAL TABLE IF NOT EXISTS monster_text
+    USING fts5(name, traits, actions, notes);
+
+CREATE TABLE IF NOT EXISTS encounters (
+    id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE,
+    directory TEXT,
+    name TEXT,
+    location TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS encounters_directory ON encounters (directory);
+CREATE TABLE IF NOT EXISTS encounter_monsters (
+    encounter_id INTEGER,
+    monster TEXT
+);
+CREATE INDEX IF NOT EXISTS encounter_monsters_encounter
+    ON encounter_monsters (encounter_id);
+CREATE INDEX IF NOT EXISTS encounter_monsters_monster
+    ON encounter_monsters (monster);
+CREATE VIRTUAL TABLE IF NOT EXISTS encounter_text
+    USING fts5(name, location, notes);
+"""
+
+# Filter keywords and the monster columns they query
+range_filters = {"cr": "cr", "xp": "xp"}
+text_filters = {
+    "type": ("mtype", "{}%"),
+    "size": ("size", "{}"),
+    "alignment": ("alignment", "%{}%"),
+    "speed": ("speed", "%{}%"),
+}
+
+
+def section_text(*sections):
+    """
+    Flatten stat block sections (traits, actions, etc.) into plain text
+    for the full-text index.
+    """
+    text = []
+    for section in sections:
+        if not isinstance(section, dict):
+            continue
+        for entry in section.values():
+            if isinstance(entry, dict):
+                text.append(str(entry.get("name", "")))
+                text.append(str(entry.get("description", "")))
+    return "\n".join(text)
+
+
+def parse_number(value):
+    return float(Fraction(value))
+
+
+def parse_range(value):
+    """
+    Parse "2", "2-5", "1/4-1", "2-" or "-5" into a (low, high) pair,
+    either of which may be None.
+    """
+    low, sep, high = value.partition("-")
+    low = parse_number(low) if low else None
+    if not sep:
+        return low, low
+    high = parse_number(high) if high else None
+    return low, high
+
+
+def get_filenames(patterns):
+    """
+    List the files matching a glob, or list of globs, without duplicates.
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    filenames = {}
+    for pattern in patterns:
+        for filename in sorted(glob.glob(pattern)):
+            filenames.setdefault(filename, None)
+    return list(filenames)
+
+
+def fts_query(words):
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+class ContentLibrary:
+    """
+    Optional SQLite-backed index of monsters and encounters.
+
+    Monsters get indexed columns for the stats people search on (cr, xp,
+    type, size, alignment) plus a full-text index over their names,
+    traits, actions, and notes, so that filters like "undead CR 2-5 with
+    a fly speed" can be answered without loading every monster.
+
+    Content files are found with globs, or lists of them; by default,
+    the monsters and encounters of every pack on the content search path,
+    plus the campaign's own encounters dir, if given, wherever it is.
+    """
+
+    def __init__(
+        self, filename, monster_files=None, encounter_files=None, encounters_dir=None
+    ):
+        self.filename = filename
+        self._monster_files = monster_files
+        self._encounter_files = encounter_files
+        self.encounters_dir = encounters_dir
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    @property
+    def monster_files(self):
+        return self._monster_files or get_pack_patterns(
+            get_content_path(), "monsters/*.toml"
+        )
+
+    @property
+    def encounter_files(self):
+        patterns = self._encounter_files or get_pack_patterns(
+            get_content_path(), "encounters/*.toml"
+        )
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if self.encounters_dir:
+            patterns = [*patterns, f"{self.encounters_dir}/*.toml"]
+        return patterns
+
+    def sync(self):
+        """
+        Bring the library up to date with the content on disk, re-importing
+        only files that are new or have changed.
+        """
+        known = {
+            filename: (mtime, size)
+            for filename, mtime, size in self.db.execute(
+                "SELECT filename, mtime, size FROM sources"
+            )
+        }
+        seen = set()
+
+        with self.db:
+            for pattern, importer in (
+                (self.monster_files, self._import_monster),
+                (self.encounter_files, self._import_encounter),
+            ):
+                for filename in get_filenames(pattern):
+                    try:
+                        stat = os.stat(filename)
+                    except OSError:
+                        continue
+                    seen.add(filename)
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    if known.get(filename) == signature:
+                        continue
+
+                    self._remove(filename)
+                    try:
+                        with open(filename, "r") as fin:
+                            importer(filename, toml.load(fin))
+                    except Exception:
+                        # Leave broken files out of the library;
+                        # check_data will tell us what's wrong with them.
+                        pass
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                        (filename, *signature),
+                    )
+
+            for filename in set(known) - seen:
+                self._remove(filename)
+                self.db.execute("DELETE FROM sources WHERE filename = ?", (filename,))
+
+    def _remove(self, filename):
+        for (monster_id,) in self.db.execute(
+            "SELECT id FROM monsters WHERE filename = ?", (filename,)
+        ).fetchall():
+            self.db.execute("DELETE FROM monster_text WHERE rowid = ?", (monster_id,))
+        self.db.execute("DELETE FROM monsters WHERE filename = ?", (filename,))
+
+        for (encounter_id,) in self.db.execute(
+            "SELECT id FROM encounters WHERE filename = ?", (filename,)
+        ).fetchall():
+            self.db.execute(
+                "DELETE FROM encounter_text WHERE rowid = ?", (encounter_id,)
+            )
+            self.db.execute(
+                "DELETE FROM encounter_monsters WHERE encounter_id = ?",
+                (encounter_id,),
+            )
+        self.db.execute("DELETE FROM encounters WHERE filename = ?", (filename,))
+
+    def _import_monster(self, filename, data):
+        try:
+            cr = parse_number(str(data.get("cr", 0)))
+        except (ValueError, ZeroDivisionError):
+            cr = None
+        cursor = self.db.execute(
+            "INSERT INTO monsters "
+            "(filename, key, name, cr, xp, mtype, size, alignment, speed, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                filename,
+                os.path.splitext(os.path.basename(filename))[0],
+                data.get("name", ""),
+                cr,
+                data.get("xp", 0),
+                str(data.get("mtype", "")).lower(),
+                str(data.get("size", "")).lower(),
+                str(data.get("alignment", "")).lower(),
+                str(data.get("speed", "")).lower(),
+                json.dumps(data),
+            ),
+        )
+        self.db.execute(
+            "INSERT INTO monster_text (rowid, name, traits, actions, notes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                cursor.lastrowid,
+                data.get("name", ""),
+                section_text(data.get("traits"), data.get("features")),
+                section_text(
+                    data.get("actions"),
+                    data.get("bonus_actions"),
+                    data.get("legendary_actions"),
+                    data.get("lair_actions"),
+                    data.get("reactions"),
+                ),
+                data.get("notes", ""),
+            ),
+        )
+
+    def _import_encounter(self, filename, data):
+        data = validate_encounter(data)
+        cursor = self.db.execute(
+            "INSERT INTO encounters (filename, directory, name, location, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                filename,
+                os.path.dirname(os.path.abspath(filename)),
+                data.get("name", ""),
+                data.get("location", ""),
+                json.dumps(data),
+            ),
+        )
+        encounter_id = cursor.lastrowid
+        self.db.executemany(
+            "INSERT INTO encounter_monsters VALUES (?, ?)",
+            [
+                (encounter_id, group["monster"])
+                for group in data.get("groups", {}).values()
+                if "monster" in group
+            ],
+        )
+        self.db.execute(
+            "INSERT INTO encounter_text (rowid, name, location, notes) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                encounter_id,
+                data.get("name", ""),
+                data.get("location", ""),
+                data.get("notes", ""),
+            ),
+        )
+
+    def _monster_filters(self, terms):
+        """
+        Turn filter terms like "cr:2-5 type:undead speed:fly dragon" into
+        SQL conditions on the monsters table. Terms without a keyword are
+        matched against the full-text index.
+        """
+        conditions = []
+        params = []
+        words = []
+
+        for term in terms:
+            keyword, sep, value = term.lower().partition(":")
+            if not sep:
+                words.append(term)
+            elif keyword in range_filters:
+                low, high = parse_range(value)
+                column = range_filters[keyword]
+                if low is not None:
+                    conditions.append(f"monsters.{column} >= ?")
+                    params.append(low)
+                if high is not None:
+                    conditions.append(f"monsters.{column} <= ?")
+                    params.append(high)
+            elif keyword in text_filters:
+                column, pattern = text_filters[keyword]
+                conditions.append(f"monsters.{column} LIKE ?")
+                params.append(pattern.format(value))
+            else:
+                raise ValueError(f"Unknown filter: {keyword}")
+
+        if words:
+            conditions.append(
+                "monsters.id IN "
+                "(SELECT rowid FROM monster_text WHERE monster_text MATCH ?)"
+            )
+            params.append(fts_query(words))
+
+        return conditions, params
+
+    def find_monsters(self, terms):
+        conditions, params = self._monster_filters(terms)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(
+            "SELECT key, name, cr, mtype FROM monsters " f"{where} ORDER BY cr, name",
+            params,
+        )
+        return [
+            {"key": key, "name": name, "cr": cr, "mtype": mtype}
+            for key, name, cr, mtype in rows
+        ]
+
+    def find_encounters(self, terms, directory=None):
+        """
+        Find encounters whose name or location matches the plain filter
+        terms (with the same wildcard semantics as the old fnmatch filter)
+        and which include monsters matching any keyword filters.
+        """
+        conditions = []
+        params = []
+        monster_terms = []
+
+        if directory:
+            conditions.append("encounters.directory = ?")
+            params.append(os.path.abspath(directory))
+
+        for term in terms:
+            if ":" in term:
+                monster_terms.append(term)
+                continue
+            pattern = f"*{term.lower()}*"
+            conditions.append(
+                "(lower(encounters.name) GLOB ? OR lower(encounters.location) GLOB ?)"
+            )
+            params.extend([pattern, pattern])
+
+        if monster_terms:
+            monster_conditions, monster_params = self._monster_filters(monster_terms)
+            conditions.append(
+                "encounters.id IN (SELECT encounter_id FROM encounter_monsters "
+                "JOIN monsters ON monsters.name = encounter_monsters.monster "
+                f"WHERE {' AND '.join(monster_conditions)})"
+            )
+            params.extend(monster_params)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(
+            f"SELECT data FROM encounters {where} ORDER BY filename", params
+        )
+        return [json.loads(data) for (data,) in rows]
@@ -1,11 +1,236 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from functools import partial
+import copy
 import glob
+import json
+import multiprocessing
+import os
 import re
-import uuid
+import threading
 
 import pytoml as toml
 
-from dndme.dice import dice_expr, roll_dice, roll_dice_expr
-from dndme.models import Character, Encounter, Monster
+from dndme.bundle import content_bundles
+from dndme.content_path import (
+    default_content_path,
+    get_content_path,
+    get_pack_patterns,
+    set_current_content_path,
+)
+from dndme.counts import compile_count, count_range, get_party_counts, party_names
+from dndme.dice import is_dice_expr, roll_dice_expr, roll_dice_expr_many, roll_dice_many
+from dndme.models import (
+    Character,
+    ContentError,
+    Encounter,
+    EncounterSummary,
+    Monster,
+)
+from dndme.rng import current_stream, use_stream
+from dndme.schemas import validate_encounter, validate_monster, validate_party
+from dndme.variants import VariantError, flatten, merge_variant, resolve_chain
+
+default_monster_files = get_pack_patterns(default_content_path, "monsters/*.toml")
+default_monster_index_file = "content/.monster_index.json"
+default_monster_cache_size = 256
+encounter_catalog_filename = ".catalog.json"
+default_chunk_size = 64
+
+
+def load_toml_files(filenames, transform=None, jobs=1, chunk_size=default_chunk_size):
+    """
+    Parse a batch of TOML files, optionally passing each parsed dict
+    through a transform, across a pool of worker processes.
+
+    Files are handed out in chunks to keep the per-file overhead of the
+    pool down; with jobs=1, or only one chunk of work, everything is done
+    in this process. Pass jobs=None to use every core. The transform must
+    be a module-level function so it can be sent to the workers.
+
+    Returns (filename, result, error) tuples in the order given, where
+    exactly one of result and error is None.
+    """
+    filenames = list(filenames)
+    chunks = [
+        filenames[i : i + chunk_size] for i in range(0, len(filenames), chunk_size)
+    ]
+    load_chunk = partial(_load_toml_chunk, transform)
+
+    # Any rolls a transform makes come from a stream per chunk, so they're
+    # the same whichever process gets the chunk; loading gets a stream of
+    # its own so that refreshing content never moves anything else's rolls
+    stream = current_stream().child("load_toml_files")
+    streams = [stream.child(i) for i in range(len(chunks))]
+
+    if jobs == 1 or len(chunks) < 2:
+        results = map(load_chunk, chunks, streams)
+    else:
+        # Spawn rather than fork; the shell has other threads running
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            results = list(pool.map(load_chunk, chunks, streams))
+
+    return [x for chunk in results for x in chunk]
+
+
+def _load_toml_chunk(transform, filenames, stream):
+    with use_stream(stream):
+        return [_load_toml_file(transform, filename) for filename in filenames]
+
+
+def _load_toml_file(transform, filename):
+    try:
+        with open(filename, "r") as fin:
+            data = toml.load(fin)
+        if transform:
+            data = transform(data)
+        return (filename, data, None)
+    except Exception as e:
+        return (filename, None, ContentError.from_exception(filename, e))
+
+
+# Group settings that are applied to the monster's stat block as a variant
+group_overrides = (
+    "str",
+    "dex",
+    "con",
+    "int",
+    "wis",
+    "cha",
+    "armor",
+    "ac",
+    "alignment",
+    "race",
+    "species",
+    "languages",
+    "xp",
+    "disposition",
+    "skills",
+    "traits",
+    "actions",
+    "legendary_actions",
+    "reactions",
+    "remove",
+)
+
+
+class GroupPlan:
+    """
+    An encounter group compiled into what's needed to instantiate it: the
+    monster to start from, the group's overrides as a variant of that
+    monster (so every monster in the group is built from one merged stat
+    block), and how to name the monsters and give them hit points.
+    """
+
+    def __init__(self, key, group):
+        self.key = key
+        self.group = group
+        self.monster = group["monster"]
+        self.names = group.get("name")
+        self.aliases = group.get("alias")
+        self.max_hp = group.get("max_hp")
+
+        variant = {k: group[k] for k in group_overrides if k in group}
+        if "race" in variant:
+            variant.setdefault("species", variant.pop("race"))
+        self.variant = variant or None
+
+    def set_names(self, monsters):
+        if self.names is not None:
+            if hasattr(self.names, "islower"):
+                for monster in monsters:
+                    monster.name = self.names
+            else:
+                for monster, name in zip(monsters, self.names):
+                    monster.name = name
+
+        if self.aliases is not None:
+            if hasattr(self.aliases, "islower"):
+                for monster in monsters:
+                    monster.alias = self.aliases
+            else:
+                for monster, alias in zip(monsters, self.aliases):
+                    monster.alias = alias
+
+        for i, monster in enumerate(monsters, 1):
+            if monster.name.islower():
+                if not monster._alias:
+                    monster.alias = f"{monster.name.replace('_', ' ').title()} {i}"
+                suffix = current_stream().random.getrandbits(16)
+                monster.name += f"-{i:0>2}/{suffix:04x}"
+            elif not monster._alias:
+                monster.alias = monster.name.replace("_", " ").title()
+
+    def set_hp(self, monsters, hp_resolver=None):
+        max_hp = self.max_hp
+
+        # Have we got a list of max hp?
+        if hasattr(max_hp, "append"):
+            if len(max_hp) != len(monsters):
+                return
+            for monster, hp in zip(monsters, max_hp):
+                monster.max_hp = hp
+                monster.cur_hp = monster.max_hp
+            return
+
+        # Not overriding max hp at all
+        if max_hp is None:
+            if hp_resolver:
+                max_hp = hp_resolver(monsters[0])
+            else:
+                max_hp = monsters[0]._max_hp
+
+        # A dice expression, rolled for the whole group in one go
+        if isinstance(max_hp, str) and is_dice_expr(max_hp):
+            rolls = roll_dice_expr_many(max_hp, len(monsters))
+            for monster, hp in zip(monsters, rolls):
+                monster._max_hp_expr = max_hp
+                monster.max_hp = hp
+                monster.cur_hp = monster.max_hp
+            return
+
+        # A single int (or anything else the monster knows what to do with)
+        for monster in monsters:
+            monster.max_hp = max_hp
+            monster.cur_hp = monster.max_hp
+
+
+class EncounterPrefetcher:
+    """
+    Background thread that warms the caches for a list of encounters (the
+    encounters themselves and their plans, and the monster data and images
+    they need), in the order given, while the DM is still choosing one.
+
+    Call stop() before loading anything for real; the caches involved
+    aren't meant to be shared between threads.
+    """
+
+    def __init__(self, encounter_loader, encounters):
+        self.encounter_loader = encounter_loader
+        self.encounters = list(encounters)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        seen = set()
+        for encounter in self.encounters:
+            if self.stopped.is_set():
+                return
+            try:
+                self.encounter_loader.warm(encounter, seen)
+            except Exception:
+                # Whatever's wrong will come up again if it gets picked
+                pass
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
 
 
 class EncounterLoader:
@@ -17,6 +242,7 @@ class EncounterLoader:
         count_resolver=None,
         initiative_resolver=None,
         hp_resolver=None,
+        bundles=None,
     ):
         self.base_dir = base_dir
         self.monster_loader = monster_loader
@@ -24,19 +250,65 @@ class EncounterLoader:
         self.count_resolver = count_resolver
         self.initiative_resolver = initiative_resolver
         self.hp_resolver = hp_resolver
+        self.bundles = bundles or content_bundles
 
     def get_available_encounters(self):
-        available_encounter_files = glob.glob(f"{self.base_dir}/*.toml")
-        encounters = [
-            Encounter(**toml.load(open(filename, "r")))
-            for filename in sorted(available_encounter_files)
-        ]
-        return encounters
+        return [self.get_encounter(x) for x in self.get_encounter_summaries()]
+
+    def get_encounter_summaries(self, filter_string=""):
+        """
+        List encounters whose name or location matches the filter, using
+        the encounter catalog rather than parsing every encounter file.
+        """
+        catalog = get_encounter_catalog(self.base_dir, self.bundles)
+        if self.combat:
+            catalog.set_party_counts(get_party_counts(self.combat.characters.values()))
+        return catalog.find(filter_string)
+
+    def get_encounter(self, summary):
+        catalog = get_encounter_catalog(self.base_dir, self.bundles)
+        return catalog.get_encounter(summary.filename)
+
+    def prefetch(self, encounters):
+        """
+        Start warming the caches for some encounters in the background;
+        see EncounterPrefetcher.
+        """
+        prefetcher = EncounterPrefetcher(self, encounters)
+        prefetcher.start()
+        return prefetcher
+
+    def warm(self, encounter, seen=None):
+        """
+        Get an encounter, its plan, and its monsters into memory without
+        loading anything into combat.
+        """
+        seen = set() if seen is None else seen
+        if isinstance(encounter, EncounterSummary):
+            encounter = self.get_encounter(encounter)
+        for plan in self.get_plan(encounter):
+            if plan.monster not in seen:
+                seen.add(plan.monster)
+                self.monster_loader.warm(plan.monster)
+
+    def get_plan(self, encounter):
+        """
+        Get the instantiation plan for an encounter, compiling it the first
+        time the encounter is loaded.
+        """
+        if encounter._plan is None:
+            encounter._plan = [
+                GroupPlan(key, group) for key, group in encounter.groups.items()
+            ]
+        return encounter._plan
 
     def load(self, encounter):
+        # Each group rolls its count and hit points from its own stream
+        stream = self.combat.rng if self.combat else current_stream()
         monster_groups = {}
-        for key, group in encounter.groups.items():
-            monster_groups[key] = self._load_group(group, monster_groups)
+        for plan in self.get_plan(encounter):
+            with use_stream(stream.child(encounter.name, plan.key)):
+                monster_groups[plan.key] = self._load_group(plan, monster_groups)
 
         monsters = [y for x in monster_groups.values() for y in x]
 
@@ -45,197 +317,43 @@ class EncounterLoader:
 
         return monsters
 
-    def _load_group(self, group, monster_groups):
-        count = self._determine_count(group, monster_groups)
-        monsters = self.monster_loader.load(group["monster"], count=count)
-        self._set_names(group, monsters)
-        self._set_stats(group, monsters)
-        self._set_hp(group, monsters)
-        self._set_armor(group, monsters)
-        self._set_alignment(group, monsters)
-        self._set_species(group, monsters)
-        self._set_languages(group, monsters)
-        self._set_xp(group, monsters)
-        self._set_disposition(group, monsters)
-        self._add_attributes(group, monsters)
-        self._remove_attributes(group, monsters)
+    def _load_group(self, plan, monster_groups):
+        count = self._determine_count(plan.group, monster_groups)
+        monsters = self.monster_loader.load(
+            plan.monster, count=count, variant=plan.variant
+        )
+        self._instantiate(plan, monsters)
         return monsters
 
+    def _instantiate(self, plan, monsters):
+        plan.set_names(monsters)
+        plan.set_hp(monsters, self.hp_resolver)
+
     def _determine_count(self, group, monster_groups):
         try:
             count = int(group["count"])
         except ValueError:
-            if dice_expr.match(group["count"]):
+            if is_dice_expr(group["count"]):
                 if self.count_resolver:
                     count = self.count_resolver(group["count"], group["monster"])
                 else:
                     count = roll_dice_expr(group["count"])
             else:
-                group_count = group["count"]
-                names = {
-                    x: 0
-                    for x in re.findall(r"(\w+)", group["count"])
-                    if not x.isdigit()
-                }
-                for name in names:
-                    if name in monster_groups:
-                        names[name] = len(monster_groups[name])
-                    elif name == "players":
-                        names[name] = len(
-                            [
-                                x
-                                for x in self.combat.characters.values()
-                                if x.ctype == "player"
-                            ]
-                        )
-                    elif name == "sidekicks":
-                        names[name] = len(
-                            [
-                                x
-                                for x in self.combat.characters.values()
-                                if x.ctype == "sidekick"
-                            ]
-                        )
-                    elif name == "party":
-                        names[name] = len(self.combat.characters)
-                    group_count = group_count.replace(name, str(names[name]))
-                if re.match(r"[^\d\s\(\)\+\-\*\/]", group_count):
-                    raise ValueError(f"Invalid monster count: {group['count']}")
-                count = max(eval(group_count), 1)
+                expression = compile_count(group["count"])
+                count = expression(
+                    self._get_count_variables(expression.names, monster_groups)
+                )
 
         return count
 
-    def _set_names(self, group, monsters):
-        if "name" in group:
-            if hasattr(group["name"], "islower"):
-                for monster in monsters:
-                    monster.name = group["name"]
-            else:
-                for i, name in enumerate(group["name"]):
-                    monsters[i].name = name
-
-        if "alias" in group:
-            if hasattr(group["alias"], "islower"):
-                for monster in monsters:
-                    monster.alias = group["alias"]
-            else:
-                for i, alias in enumerate(group["alias"]):
-                    monsters[i].alias = alias
-
-        for i, monster in enumerate(monsters, 1):
-            if monster.name.islower():
-                if not monster._alias:
-                    monster.alias = f"{monster.name.replace('_', ' ').title()} {i}"
-                monster.name += f"-{i:0>2}/{str(uuid.uuid4())[:4]}"
-            elif not monster._alias:
-                monster.alias = monster.name.replace("_", " ").title()
-
-    def _set_stats(self, group, monsters):
-        for monster in monsters:
-            if "str" in group:
-                monster.str = group["str"]
-            if "dex" in group:
-                monster.dex = group["dex"]
-            if "con" in group:
-                monster.con = group["con"]
-            if "int" in group:
-                monster.int = group["int"]
-            if "wis" in group:
-                monster.wis = group["wis"]
-            if "cha" in group:
-                monster.cha = group["cha"]
-
-    def _set_hp(self, group, monsters):
-        # Are we overriding max hp?
-        if "max_hp" in group:
-
-            # Have we got a list of max hp?
-            if hasattr(group["max_hp"], "append") and len(group["max_hp"]) == len(
-                monsters
-            ):
-                for i, monster in enumerate(monsters):
-                    monster.max_hp = group["max_hp"][i]
-                    monster.cur_hp = monster.max_hp
-
-            # Have we got a single int or dice expression?
-            elif hasattr(group["max_hp"], "real") or hasattr(group["max_hp"], "join"):
-                for monster in monsters:
-                    monster.max_hp = group["max_hp"]
-                    monster.cur_hp = monster.max_hp
-
-        # Not overriding max hp at all
-        else:
-            if self.hp_resolver:
-                max_hp = self.hp_resolver(monsters[0])
-            else:
-                max_hp = monsters[0]._max_hp
-            for monster in monsters:
-                monster.max_hp = max_hp
-                monster.cur_hp = monster.max_hp
-
-    def _set_armor(self, group, monsters):
-        if "armor" in group:
-            for monster in monsters:
-                monster.armor = group["armor"]
-
-        if "ac" in group:
-            for monster in monsters:
-                monster.ac = group["ac"]
-
-    def _set_alignment(self, group, monsters):
-        if "alignment" in group:
-            for monster in monsters:
-                monster.alignment = group["alignment"]
-
-    def _set_species(self, group, monsters):
-        if "race" in group:
-            for monster in monsters:
-                monster.species = group["race"]
-        if "species" in group:
-            for monster in monsters:
-                monster.species = group["species"]
-
-    def _set_languages(self, group, monsters):
-        if "languages" in group:
-            for monster in monsters:
-                monster.languages = group["languages"]
-
-    def _set_xp(self, group, monsters):
-        if "xp" in group:
-            for monster in monsters:
-                monster.xp = group["xp"]
-
-    def _set_disposition(self, group, monsters):
-        if "disposition" in group:
-            for monster in monsters:
-                monster.disposition = group["disposition"]
-
-    def _add_attributes(self, group, monsters):
-        for monster in monsters:
-            if "skills" in group:
-                monster.skills.update(group["skills"])
-            if "traits" in group:
-                monster.traits.update(group["traits"])
-            if "actions" in group:
-                monster.actions.update(group["actions"])
-            if "legendary_actions" in group:
-                monster.legendary_actions.update(group["legendary_actions"])
-            if "reactions" in group:
-                monster.reactions.update(group["reactions"])
-
-    def _remove_attributes(self, group, monsters):
-        for attr in group.get("remove", []):
-            try:
-                (attr, key) = attr.split(".")
-                for monster in monsters:
-                    if hasattr(monster, attr):
-                        getattr(monster, attr).pop(key)
-            except KeyError:
-                pass
-            except ValueError:
-                for monster in monsters:
-                    if hasattr(monster, attr):
-                        delattr(monster, attr)
+    def _get_count_variables(self, names, monster_groups):
+        variables = {}
+        if not names.isdisjoint(party_names):
+            variables.update(get_party_counts(self.combat.characters.values()))
+        for name in names:
+            if name in monster_groups:
+                variables[name] = len(monster_groups[name])
+        return variables
 
     def _set_origin(self, encounter, monsters):
         for monster in monsters:
@@ -253,55 +371,660 @@ class EncounterLoader:
         if not combat.tm:
             return
 
-        for monster in monsters:
-            if self.initiative_resolver:
-                roll = self.initiative_resolver(monster)
-            else:
-                roll = roll_dice(1, 20, modifier=monster.initiative_mod)
+        if self.initiative_resolver:
+            rolls = [self.initiative_resolver(monster) for monster in monsters]
+        else:
+            initiative = roll_dice_many(
+                1, 20, len(monsters), stream=combat.rng.child("initiative")
+            )
+            rolls = [
+                roll + monster.initiative_mod
+                for monster, roll in zip(monsters, initiative)
+            ]
+
+        for monster, roll in zip(monsters, rolls):
             combat.tm.add_combatant(monster, roll)
 
 
-class MonsterLoader:
-    def __init__(self, image_loader):
-        self.image_loader = image_loader
+class FileCatalog:
+    """
+    Base for persistent catalogs that summarize a set of content files,
+    given by a glob pattern or by a list of them in order of precedence.
 
-    def load(self, monster_name, count=1):
-        # TODO: hey maybe make this more efficient, yeah?
+    Each cataloged file is stored with its mtime and size so that the
+    catalog can be revalidated cheaply: a refresh only re-parses files that
+    are new or have changed since the last time we looked at them.
+    Subclasses decide what to keep from each file and how to index it.
+    """
+
+    version = 1
+
+    def __init__(self, index_file, pattern, jobs=1):
+        self.index_file = index_file
+        self.pattern = pattern
+        self.jobs = jobs
+        self.files = {}
+        self.loaded = False
+
+    @staticmethod
+    def summarize(data):
+        """
+        Pick out what to keep from a parsed file. Broken files can't be
+        cataloged, so this gets None for them; check_data will tell us
+        what's wrong with them.
+        """
+        raise NotImplementedError
+
+    def rebuild(self):
+        pass
+
+    def summarize_files(self, filenames):
+        """
+        Summarize new or changed files, as (filename, summary) pairs.
+        """
+        return [
+            (filename, summary)
+            for filename, summary, error in load_toml_files(
+                filenames, transform=self.summarize, jobs=self.jobs
+            )
+        ]
+
+    @property
+    def patterns(self):
+        if isinstance(self.pattern, str):
+            return [self.pattern]
+        return list(self.pattern)
+
+    def get_filenames(self):
+        """
+        List the files matching the catalog's pattern, or patterns, in
+        order of precedence: by pattern first, then by filename.
+        """
+        filenames = {}
+        for pattern in self.patterns:
+            for filename in sorted(glob.glob(pattern)):
+                filenames.setdefault(filename, None)
+        return list(filenames)
+
+    def is_current(self, filename):
+        entry = self.files.get(filename)
+        if not entry:
+            return False
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        return entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def load(self):
+        self.loaded = True
+        try:
+            with open(self.index_file, "r") as fin:
+                data = json.load(fin)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.version or data.get("pattern") != self.patterns:
+            return
+        self.files = data.get("files", {})
+        self.rebuild()
+
+    def save(self):
+        data = {"version": self.version, "pattern": self.patterns, "files": self.files}
+        tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "w") as fout:
+                json.dump(data, fout)
+            os.replace(tmp_file, self.index_file)
+        except OSError:
+            # The catalog is only an optimization; failing to persist it
+            # just means we'll have to do a bit more work next time.
+            pass
+
+    def refresh(self):
+        if not self.loaded:
+            self.load()
+
+        files = {}
+        changed = []
+
+        for filename in self.get_filenames():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+
+            entry = self.files.get(filename)
+            if (
+                entry
+                and entry["mtime"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+            ):
+                files[filename] = entry
+                continue
+
+            files[filename] = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+            changed.append(filename)
+
+        for filename, summary in self.summarize_files(changed):
+            files[filename].update(summary or self.summarize(None))
+
+        if changed or list(files) != list(self.files):
+            self.files = files
+            self.rebuild()
+            self.save()
+
+
+class MonsterIndex(FileCatalog):
+    """
+    Persistent index of monster names to the files that define them.
+
+    When more than one file defines a monster, the first in order of
+    precedence (see dndme.content_path) wins and the rest are recorded as
+    shadowed.
+
+    Variants (monsters that inherit from another monster) have their
+    inheritance chains resolved whenever the index is rebuilt, so loading
+    one never has to go looking for its ancestors.
+
+    The index also keeps each monster's cr and xp, for rating encounters.
+    """
+
+    version = 2
+
+    def __init__(
+        self,
+        index_file=default_monster_index_file,
+        pattern=default_monster_files,
+        jobs=1,
+    ):
+        super().__init__(index_file, pattern, jobs=jobs)
+        self.names = {}
+        self.shadowed = {}
+        self.chains = {}
+        self.broken = {}
+        self.xp = {}
+
+    def lookup(self, monster_name):
+        if not self.loaded:
+            self.load()
+
+        filename = self.names.get(monster_name)
+        chain = self.chains.get(filename, [filename])
+        if filename and all(self.is_current(x) for x in chain):
+            return filename
+
+        # Missing or out of date, so bring the index up to date and retry
+        self.refresh()
+        return self.names.get(monster_name)
+
+    def set_content_path(self, content_path):
+        self.pattern = get_pack_patterns(content_path, "monsters/*.toml")
+        if self.loaded:
+            self.refresh()
+
+    def get_shadowed(self):
+        """
+        List the monsters defined by more than one file, as (name, winning
+        file, shadowed files) in name order.
+        """
+        self.refresh()
+        return [
+            (name, self.names[name], shadowed)
+            for name, shadowed in sorted(self.shadowed.items())
+        ]
+
+    def get_chain(self, filename):
+        """
+        Get the files a monster is built from, root ancestor first.
+        """
+        if filename in self.broken:
+            raise VariantError(self.broken[filename])
+        return self.chains.get(filename, [filename])
+
+    @staticmethod
+    def summarize(data):
+        if not data:
+            return {"name": None}
+        return {
+            "name": data.get("name"),
+            "inherits": data.get("inherits"),
+            "cr": data.get("cr"),
+            "xp": data.get("xp"),
+        }
+
+    def get_stat(self, filename, stat):
+        """
+        Get a monster's stat from the index, following its inheritance
+        chain if the monster doesn't set it itself.
+        """
+        for x in reversed(self.chains.get(filename, [filename])):
+            value = self.files[x].get(stat)
+            if value is not None:
+                return value
+        return None
+
+    def get_xp_table(self):
+        """
+        Get every monster's xp, without loading any of them.
+        """
+        self.refresh()
+        return {name: self.xp[filename] for name, filename in self.names.items()}
+
+    def rebuild(self):
+        self.names = {}
+        self.shadowed = {}
+        parents = {}
+        for filename, entry in self.files.items():
+            name = entry["name"]
+            if name in self.names:
+                self.shadowed.setdefault(name, []).append(filename)
+            elif name is not None:
+                self.names[name] = filename
+            if entry.get("inherits"):
+                parents[filename] = entry["inherits"]
+
+        self.chains = {}
+        self.broken = {}
+        for filename in parents:
+            try:
+                self.chains[filename] = resolve_chain(filename, parents, self.names)
+            except VariantError as e:
+                self.broken[filename] = str(e)
+
+        self.xp = {x: self.get_stat(x, "xp") or 0 for x in self.names.values()}
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
 
-        monster_files = self.get_available_monster_files()
-        monsters = []
 
-        for filename in monster_files:
-            monster = load_from_file(filename)
+class EncounterCatalog(FileCatalog):
+    """
+    Persistent catalog of the encounters in a directory, with just enough
+    about each one (name, location, and a summary of its groups) to list
+    and filter them without parsing every encounter file.
 
-            if monster["name"] != monster_name:
+    Filtering uses a trigram index over the lowercased names and
+    locations, so only the encounters that could possibly match get
+    checked.
+
+    When the directory is a content pack's encounters and the pack has a
+    compiled bundle, encounters are read out of the bundle instead of
+    their TOML files for as long as the files haven't changed.
+    """
+
+    version = 2
+
+    def __init__(self, base_dir, index_file=None, jobs=1, bundles=None):
+        super().__init__(
+            index_file or f"{base_dir}/{encounter_catalog_filename}",
+            f"{base_dir}/*.toml",
+            jobs=jobs,
+        )
+        self.base_dir = base_dir
+        self.bundles = bundles or content_bundles
+        self.entries = []
+        self.lowered = []
+        self.trigrams = {}
+        self.encounters = {}
+        self.party_counts = {}
+
+    @staticmethod
+    def summarize(data):
+        if data is None:
+            return {"name": None}
+        return {
+            "name": data.get("name", ""),
+            "location": data.get("location", ""),
+            "groups": {
+                key: {
+                    "monster": group.get("monster"),
+                    "count": group.get("count", 1),
+                    **({"xp": group["xp"]} if "xp" in group else {}),
+                }
+                for key, group in data.get("groups", {}).items()
+            },
+        }
+
+    def rebuild(self):
+        self.entries = []
+        self.lowered = []
+        self.trigrams = {}
+
+        for filename in sorted(self.files):
+            entry = self.files[filename]
+            if entry["name"] is None:
                 continue
 
-            image_url = monster.get("image_url")
-            if image_url and not image_url.startswith("http"):
-                monster["image_url"] = self.image_loader.get_monster_image_path(
-                    image_url
+            i = len(self.entries)
+            self.entries.append(
+                EncounterSummary(
+                    name=entry["name"],
+                    location=entry["location"],
+                    groups=entry["groups"],
+                    filename=filename,
+                    count_range=count_range(entry["groups"], self.party_counts),
                 )
+            )
+            lowered = (entry["name"].lower(), entry["location"].lower())
+            self.lowered.append(lowered)
+            for text in lowered:
+                for trigram in trigrams(text):
+                    self.trigrams.setdefault(trigram, set()).add(i)
+
+    def summarize_files(self, filenames):
+        bundled = {filename: self.read_bundled(filename) for filename in filenames}
+        summaries = super().summarize_files(
+            [filename for filename, data in bundled.items() if data is None]
+        )
+        return summaries + [
+            (filename, self.summarize(data))
+            for filename, data in bundled.items()
+            if data is not None
+        ]
+
+    def read_bundled(self, filename):
+        """
+        Get an encounter file's validated data out of its pack's bundle, if
+        the pack has a bundle and the file hasn't changed since it was
+        compiled.
+        """
+        base_dir = os.path.normpath(self.base_dir)
+        if os.path.basename(base_dir) != "encounters":
+            return None
+        bundle = self.bundles.get_for_pack(os.path.dirname(base_dir))
+        if not bundle:
+            return None
+        return bundle.get_encounter(f"encounters/{os.path.basename(filename)}")
+
+    def set_party_counts(self, party_counts):
+        """
+        Update the party counts that encounter count ranges are worked out
+        with, e.g. for counts like "players + 1".
+        """
+        if party_counts == self.party_counts:
+            return
+        self.party_counts = party_counts
+        for entry in self.entries:
+            entry.count_range = count_range(entry.groups, party_counts)
+
+    def find(self, filter_string=""):
+        self.refresh()
+
+        text = filter_string.lower()
+        if not text:
+            return list(self.entries)
+
+        if any(x in text for x in "*?["):
+            pattern = f"*{text}*"
+            return [
+                entry
+                for entry, (name, location) in zip(self.entries, self.lowered)
+                if fnmatch(name, pattern) or fnmatch(location, pattern)
+            ]
+
+        if len(text) >= 3:
+            candidates = set.intersection(
+                *[self.trigrams.get(x, set()) for x in trigrams(text)]
+            )
+        else:
+            candidates = range(len(self.entries))
+
+        return [
+            self.entries[i]
+            for i in sorted(candidates)
+            if text in self.lowered[i][0] or text in self.lowered[i][1]
+        ]
+
+    def get_encounter(self, filename):
+        """
+        Get the full Encounter from one of the catalog's files, reusing the
+        one built last time (along with its instantiation plan) unless the
+        file has changed.
+        """
+        stat = os.stat(filename)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self.encounters.get(filename)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        data = self.read_bundled(filename)
+        if data is None:
+            with open(filename, "r") as fin:
+                data = validate_encounter(toml.load(fin))
+        encounter = Encounter(**data)
+        self.encounters[filename] = (signature, encounter)
+        return encounter
+
+
+encounter_catalogs = {}
+
+# Worker processes the process-wide monster index and encounter catalogs
+# parse files with; in-process unless set_jobs says otherwise, since the
+# shell refreshes them in the middle of a session
+catalog_jobs = 1
+
+
+def get_encounter_catalog(base_dir, bundles=None):
+    key = (os.path.normpath(base_dir), bundles or content_bundles)
+    if key not in encounter_catalogs:
+        encounter_catalogs[key] = EncounterCatalog(
+            key[0], jobs=catalog_jobs, bundles=key[1]
+        )
+    return encounter_catalogs[key]
 
-            for i in range(count):
-                monsters.append(Monster(**monster))
-            break
 
+class MonsterCache:
+    """
+    Process-wide LRU cache of parsed and validated monster files.
+
+    Entries are keyed by filename and invalidated when the file's mtime or
+    size changes. Cached dicts are shared, so callers must never mutate
+    them; use copy_monster_data to get a private copy.
+    """
+
+    def __init__(self, maxsize=default_monster_cache_size):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename):
+        stat = os.stat(filename)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self.entries.get(filename)
+        if entry and entry[0] == signature:
+            self.hits += 1
+            self.entries.move_to_end(filename)
+            return entry[1]
+
+        self.misses += 1
+        with open(filename, "r") as fin:
+            data = validate_monster(toml.load(fin))
+
+        self.entries[filename] = (signature, data)
+        self.entries.move_to_end(filename)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        return data
+
+    def get_flattened(self, chain):
+        """
+        Get the merged data for a monster variant's inheritance chain,
+        caching the result until any file in the chain changes.
+        """
+        if len(chain) == 1:
+            return self.get(chain[0])
+
+        key = tuple(chain)
+        signature = tuple(
+            (stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, chain)
+        )
+        entry = self.entries.get(key)
+        if entry and entry[0] == signature:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+        data = flatten(chain, self.get)
+        self.entries[key] = (signature, data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        return data
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+
+def copy_monster_data(data):
+    """
+    Copy parsed monster data so that each Monster gets its own traits,
+    actions, skills, etc. rather than sharing them with every other
+    monster loaded from the same file.
+    """
+    return {
+        key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for key, value in data.items()
+    }
+
+
+monster_index = MonsterIndex(jobs=catalog_jobs)
+monster_cache = MonsterCache()
+
+
+def set_jobs(jobs):
+    """
+    Set how many worker processes the process-wide monster index and
+    encounter catalogs may use to parse files; None for one per CPU.
+    """
+    global catalog_jobs
+    catalog_jobs = jobs
+    monster_index.jobs = jobs
+    for catalog in encounter_catalogs.values():
+        catalog.jobs = jobs
+
+
+def set_content_path(content_path):
+    """
+    Set the content search path for the process-wide monster index and
+    content bundles, and for everything else that looks for content packs
+    (monster images, the content library).
+    """
+    set_current_content_path(content_path)
+    monster_index.set_content_path(content_path)
+    content_bundles.content_path = content_path
+
+
+class MonsterLoader:
+    def __init__(self, image_loader, index=None, cache=None, bundles=None, lazy=False):
+        self.image_loader = image_loader
+        self.index = index or monster_index
+        self.cache = cache or monster_cache
+        self.bundles = bundles or content_bundles
+        self.lazy = lazy
+
+    def load(self, monster_name, count=1, variant=None):
+        """
+        Load some monsters, optionally applying a variant's overrides
+        (see dndme.variants) to the stat block they're built from.
+        """
+        monster = self.load_data(monster_name)
+        if monster is None:
+            return []
+        if variant:
+            monster = merge_variant(monster, variant)
+
+        image_url = monster.get("image_url")
+        if image_url and not image_url.startswith("http"):
+            monster["image_url"] = self.image_loader.get_monster_image_path(image_url)
+
+        if not self.lazy:
+            return [Monster(**copy_monster_data(monster)) for i in range(count)]
+
+        # Only keep the header fields resident; the rest of the stat block
+        # gets loaded the first time anything asks for it.
+        header = {k: v for k, v in monster.items() if k not in Monster.lazy_sections}
+        monsters = []
+        for i in range(count):
+            lazy_monster = Monster(**copy_monster_data(header))
+            for section in Monster.lazy_sections:
+                del lazy_monster.__dict__[section]
+            lazy_monster._load_sections = partial(
+                self.load_sections, monster_name, variant
+            )
+            monsters.append(lazy_monster)
         return monsters
 
+    def warm(self, monster_name):
+        """
+        Get a monster's data and image path cached without building it.
+        """
+        monster = self.load_data(monster_name)
+        image_url = monster and monster.get("image_url")
+        if image_url and not image_url.startswith("http"):
+            self.image_loader.get_monster_image_path(image_url)
+
+    def load_sections(self, monster_name, variant=None):
+        monster = self.load_data(monster_name) or {}
+        if variant:
+            monster = merge_variant(monster, variant)
+        return copy_monster_data(
+            {k: v for k, v in monster.items() if k in Monster.lazy_sections}
+        )
+
+    def load_data(self, monster_name):
+        """
+        Get the raw data for a monster, preferring a compiled content bundle
+        and falling back to the TOML sources if there isn't a fresh one.
+        """
+        monster = self.bundles.get_monster(monster_name)
+        if monster is not None:
+            return monster
+
+        filename = self.index.lookup(monster_name)
+        if not filename:
+            return None
+        return dict(self.cache.get_flattened(self.index.get_chain(filename)))
+
     def load_from_file(self, filename):
-        monster = toml.load(open(filename, "r"))
-        return monster
+        data = self.cache.get(filename)
+        if data.get("inherits"):
+            self.index.refresh()
+            data = self.cache.get_flattened(self.index.get_chain(filename))
+        return copy_monster_data(data)
 
     def get_available_monster_files(self):
-        monster_files = glob.glob("content/*/monsters/*.toml")
-        return monster_files
+        return self.index.get_filenames()
 
     def get_available_monster_keys(self):
-        keys = [
-            re.sub(r".*\/(.*)\.toml", "\\1", fn)
-            for fn in self.get_available_monster_files()
-        ]
+        # Packs with a fresh bundle can list their keys straight out of
+        # the bundle; we only need to look at the TOML files for the rest.
+        keys = set()
+        bundled_packs = set()
+        for bundle in self.bundles.get_all():
+            keys.update(bundle.monster_keys)
+            bundled_packs.add(os.path.normpath(bundle.pack_dir))
+
+        for fn in self.get_available_monster_files():
+            if os.path.normpath(os.path.dirname(os.path.dirname(fn))) in bundled_packs:
+                continue
+            keys.add(re.sub(r".*\/(.*)\.toml", "\\1", fn))
+
         return sorted(keys)
 
 
@@ -311,21 +1034,113 @@ class PartyLoader:
 
     def load(self, combat):
         with open(self.filename, "r") as fin:
-            party = toml.load(fin)
+            party = validate_party(toml.load(fin))
         combat.characters.update({x["name"]: Character(**x) for x in party.values()})
         return party
 
 
+class AssetIndex:
+    """
+    Process-wide index of image files, grouped by the directories they live
+    in, mapping filenames to the static URLs the player view serves them
+    from.
+
+    Directory listings are cached against the directory's mtime, so a
+    refresh only re-lists directories where files were added or removed.
+    Each set of directories gets a dict for O(1) resolution and a sorted
+    list of lowercased names for prefix completion.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.categories = {}
+
+    def _list(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None, []
+
+        listing = self.listings.get(directory)
+        if not listing or listing[0] != mtime:
+            names = sorted(
+                x
+                for x in os.listdir(directory)
+                if not x.startswith(".")
+                and "." in x
+                and os.path.isfile(f"{directory}/{x}")
+            )
+            listing = (mtime, names)
+            self.listings[directory] = listing
+        return listing
+
+    def get(self, dir_pattern, root=None):
+        """
+        Get the (urls, names, lowered names) for every image in the
+        directories matching the pattern, or list of patterns in order of
+        precedence. Earlier directories win when two of them have an image
+        with the same name.
+
+        URLs are relative to the root dir the player view serves static
+        files from, if the directories are under it.
+        """
+        if isinstance(dir_pattern, str):
+            dir_pattern = [dir_pattern]
+        dir_pattern = tuple(dir_pattern)
+        directories = {}
+        for pattern in dir_pattern:
+            for directory in sorted(glob.glob(pattern)):
+                directories.setdefault(directory, None)
+        signature = tuple((x, self._list(x)[0]) for x in directories)
+
+        category = self.categories.get((dir_pattern, root))
+        if category and category[0] == signature:
+            return category[1]
+
+        prefix = f"{root.rstrip('/')}/" if root else None
+        urls = {}
+        for directory in directories:
+            url_dir = directory
+            if prefix and directory.startswith(prefix):
+                url_dir = directory[len(prefix) :]
+            for name in self._list(directory)[1]:
+                urls.setdefault(name, f"/static/{url_dir.lstrip('/')}/{name}")
+        names = sorted(urls, key=str.lower)
+        entry = (urls, names, [x.lower() for x in names])
+        self.categories[(dir_pattern, root)] = (signature, entry)
+        return entry
+
+    def resolve(self, dir_pattern, filename, root=None):
+        return self.get(dir_pattern, root)[0].get(filename, "")
+
+    def complete(self, dir_pattern, prefix="", root=None):
+        _, names, lowered = self.get(dir_pattern, root)
+        prefix = prefix.lower()
+        start = bisect_left(lowered, prefix)
+        end = bisect_left(lowered, prefix + "\U0010ffff", lo=start)
+        return names[start:end]
+
+
+asset_index = AssetIndex()
+
+
 class ImageLoader:
-    def __init__(self, game):
+    player_images = "campaigns/*/images"
+
+    def __init__(self, game, assets=None):
         self.game = game
+        self.assets = assets or asset_index
 
-    def get_available_content_images(self):
-        image_dir = self.game.encounters_dir.replace("encounters", "images")
-        images = [
-            x.replace(image_dir, "").lstrip("/") for x in glob.glob(f"{image_dir}/*.*")
-        ]
-        return images
+    @property
+    def monster_images(self):
+        return get_pack_patterns(get_content_path(), "images/monsters")
+
+    @property
+    def content_images(self):
+        return self.game.encounters_dir.replace("encounters", "images")
+
+    def get_available_content_images(self, prefix=""):
+        return self.assets.complete(self.content_images, prefix)
 
     def get_content_image_path(self, filename):
         image_dir = (
@@ -336,14 +1151,12 @@ class ImageLoader:
         image = f"/static/{image_dir}/{filename}"
         return image
 
+    @property
+    def root(self):
+        return self.game.base_dir if self.game else None
+
     def get_monster_image_path(self, filename):
-        monster_image = glob.glob(f"content/*/images/monsters/{filename}")
-        if monster_image:
-            return f"/static/{monster_image[0]}"
-        return ""
+        return self.assets.resolve(self.monster_images, filename, self.root)
 
     def get_player_image_path(self, filename):
-        player_image = glob.glob(f"campaigns/*/images/{filename}")
-        if player_image:
-            return f"/static/{player_image[0]}"
-        return ""
+        return self.assets.resolve(self.player_images, filename, self.root)
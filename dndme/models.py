@@ -1,10 +1,11 @@
 import fnmatch
 from math import floor, inf
 
-from attr import attrs, attrib
+from attr import attrs, attrib, fields_dict
 from attr import Factory as attr_factory
 
 from dndme import dice
+from dndme.rng import current_stream
 
 
 @attrs
@@ -213,9 +214,38 @@ class Monster(Combatant):
             return self.ability_modifier(getattr(self, attr_name[:3]))
         elif attr_name == "initiative_mod":
             return self.ability_modifier(getattr(self, "dex"))
+        elif attr_name in self.lazy_sections and self.__dict__.get("_load_sections"):
+            self.load_sections()
+            return getattr(self, attr_name)
         else:
             raise AttributeError(f"'Monster' object has no attribute '{attr_name}'")
 
+    # Bulky stat block sections that a lazily-loaded monster leaves out
+    # until something actually needs them; see MonsterLoader.
+    lazy_sections = (
+        "traits",
+        "actions",
+        "bonus_actions",
+        "lair_actions",
+        "legendary_actions",
+        "reactions",
+        "notes",
+    )
+
+    def load_sections(self):
+        sections = self.__dict__.pop("_load_sections")()
+        fields = fields_dict(type(self))
+        for name in self.lazy_sections:
+            if name in self.__dict__:
+                continue
+            if name in sections:
+                value = sections[name]
+            elif isinstance(fields[name].default, attr_factory):
+                value = fields[name].default.factory()
+            else:
+                value = fields[name].default
+            setattr(self, name, value)
+
     def ability_modifier(self, stat):
         return floor((stat - 10) / 2)
 
@@ -247,6 +277,51 @@ class Encounter:
     location = attrib(default="")
     notes = attrib(default="")
     groups = attrib(default=[])
+    _plan = attrib(default=None, init=False, repr=False, eq=False)
+
+
+@attrs
+class EncounterSummary:
+
+    name = attrib(default="")
+    location = attrib(default="")
+    groups = attrib(default=attr_factory(dict))
+    filename = attrib(default="")
+    count_range = attrib(default=None)
+
+
+@attrs
+class EncounterRating:
+
+    count = attrib(default=(0, 0))
+    xp = attrib(default=(0, 0))
+    difficulty = attrib(default=(None, None))
+
+
+@attrs
+class ContentError:
+    """
+    Something wrong with a content file, in a form that can be reported
+    (or sent back from a worker process) without the original exception.
+    """
+
+    filename = attrib()
+    kind = attrib(default="Exception")
+    message = attrib(default="")
+    line = attrib(default=None)
+
+    @classmethod
+    def from_exception(cls, filename, exception):
+        return cls(
+            filename=filename,
+            kind=type(exception).__name__,
+            message=getattr(exception, "message", None) or str(exception),
+            line=getattr(exception, "line", None),
+        )
+
+    def __str__(self):
+        location = f"{self.filename}:{self.line}" if self.line else self.filename
+        return f"{location}: {self.kind}: {self.message}"
 
 
 @attrs
@@ -271,6 +346,13 @@ class Combat:
 
     tm = attrib(default=None)
 
+    # Each combat rolls from its own random stream
+    rng = attrib(repr=False, eq=False)
+
+    @rng.default
+    def _rng(self):
+        return current_stream().spawn("combat")
+
     @property
     def combatant_names(self):
         return sorted(list(self.characters.keys()) + list(self.monsters.keys()))
@@ -321,9 +403,12 @@ class Game:
     commands = attrib(default={})
 
     changed = attrib(default=True)
+    state_version = attrib(default=0)
     player_message = attrib(default="")  # TODO: rename for consistency with image
     player_view_image = attrib(default="")
 
+    content_library = attrib(default=None)
+
     @combat.default
     def _combat(self):
         combat = Combat()
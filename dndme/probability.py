@@ -0,0 +1,292 @@
+"""
+Exact probability distributions for dice expressions.
+
+A distribution is worked out by convolving the distributions of its dice,
+which is polynomial multiplication: pools of plain dice are built up by
+squaring with every intermediate pool memoized, and big convolutions go
+through NumPy's FFT when it's installed. Keep/drop, rerolls, and
+explosions are handled exactly too, as far as floating point can tell;
+chains of explosions are followed until they're less likely than it can
+represent.
+
+Results are memoized per expression, so asking about the same attack or
+damage roll over and over during a combat is free.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from itertools import accumulate
+from math import comb, sqrt
+
+from dndme.dice import Dice, compile_dice_expr, max_explosions, np
+
+# Above this many multiplications, convolve with an FFT instead
+fft_threshold = 4096
+
+# Explosion chains less likely than this are dropped
+min_probability = 1e-17
+
+
+class Distribution:
+    """
+    The probability of each possible total, from `min` to `max`.
+    """
+
+    def __init__(self, offset, probabilities):
+        self.offset = offset
+        self.probabilities = tuple(probabilities)
+        self._cdf = None
+
+    @classmethod
+    def from_dict(cls, probabilities):
+        probabilities = {k: v for k, v in probabilities.items() if v}
+        offset = min(probabilities)
+        return cls(
+            offset,
+            [probabilities.get(x, 0.0) for x in range(offset, max(probabilities) + 1)],
+        )
+
+    @property
+    def min(self):
+        return self.offset
+
+    @property
+    def max(self):
+        return self.offset + len(self.probabilities) - 1
+
+    def items(self):
+        return [(self.offset + i, p) for i, p in enumerate(self.probabilities) if p]
+
+    def probability(self, value):
+        i = value - self.offset
+        if 0 <= i < len(self.probabilities):
+            return self.probabilities[i]
+        return 0.0
+
+    @property
+    def cdf(self):
+        if self._cdf is None:
+            self._cdf = tuple(accumulate(self.probabilities))
+        return self._cdf
+
+    def at_most(self, value):
+        i = value - self.offset
+        if i < 0:
+            return 0.0
+        return min(self.cdf[min(i, len(self.cdf) - 1)], 1.0)
+
+    def at_least(self, value):
+        """
+        The chance of a total of at least `value`, e.g. to meet a DC.
+        """
+        return max(1.0 - self.at_most(value - 1), 0.0)
+
+    @property
+    def mean(self):
+        return sum(value * p for value, p in self.items())
+
+    @property
+    def stddev(self):
+        mean = self.mean
+        return sqrt(sum((value - mean) ** 2 * p for value, p in self.items()))
+
+    def percentile(self, q):
+        """
+        The lowest total that's at least as high as q percent of rolls.
+        """
+        target = q / 100 - 1e-12
+        for i, cumulative in enumerate(self.cdf):
+            if cumulative >= target:
+                return self.offset + i
+        return self.max
+
+    def rank(self, value):
+        """
+        The percentage of rolls that come in below `value`, plus half of
+        those that tie it; e.g. the median is about the 50th.
+        """
+        return 100 * (self.at_most(value - 1) + self.probability(value) / 2)
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return Distribution(self.offset + other, self.probabilities)
+        return Distribution(
+            self.offset + other.offset,
+            convolve(self.probabilities, other.probabilities),
+        )
+
+    def __neg__(self):
+        return Distribution(-self.max, reversed(self.probabilities))
+
+
+def convolve(a, b):
+    if np is not None and len(a) * len(b) > fft_threshold:
+        n = len(a) + len(b) - 1
+        size = 1 << (n - 1).bit_length()
+        result = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+        # Round-off can leave tiny negative probabilities; they're really 0
+        return np.clip(result, 0.0, None).tolist()
+
+    result = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+
+@lru_cache(maxsize=1024)
+def get_pool_distribution(times, sides):
+    """
+    The distribution of the total of XdY, built up by squaring so that
+    e.g. 100d6 only takes a handful of (memoized) convolutions.
+    """
+    if times == 0:
+        return Distribution(0, [1.0])
+    if times == 1:
+        return Distribution(1, [1 / sides] * sides)
+    half = get_pool_distribution(times // 2, sides)
+    pool = half + half
+    if times % 2:
+        pool = pool + get_pool_distribution(1, sides)
+    return pool
+
+
+def get_die_distribution(dice):
+    """
+    The distribution of a single die after its rerolls and explosions.
+    """
+    sides = dice.sides
+    faces = range(1, sides + 1)
+    raw = [1 / sides] * sides
+
+    first = raw
+    if dice.reroll:
+        matched = sum(1 for x in faces if dice.reroll(x))
+        if dice.reroll_once:
+            first = [
+                (0.0 if dice.reroll(x) else 1 / sides) + matched / sides / sides
+                for x in faces
+            ]
+        else:
+            first = [0.0 if dice.reroll(x) else 1 / (sides - matched) for x in faces]
+
+    if not dice.explode:
+        return Distribution.from_dict(dict(enumerate(first, 1)))
+
+    exploding = sum(1 for x in faces if dice.explode(x)) / sides
+
+    # Work from the last roll in the chain back to the first, starting
+    # from as deep as the chain could plausibly get
+    depth = 0
+    chance = 1.0
+    while depth < max_explosions - 1 and chance * exploding >= min_probability:
+        chance *= exploding
+        depth += 1
+
+    chain = Distribution(1, raw)
+    for probabilities in [raw] * depth + [first]:
+        chain = explode_step(probabilities, chain, dice.explode)
+    return chain
+
+
+def explode_step(probabilities, chain, explode):
+    result = defaultdict(float)
+    for face, p in enumerate(probabilities, 1):
+        if not p:
+            continue
+        if explode(face):
+            for value, q in chain.items():
+                result[face + value] += p * q
+        else:
+            result[face] += p
+    return Distribution.from_dict(result)
+
+
+def get_kept_distribution(die, times, kept, highest):
+    """
+    The distribution of the total of the highest (or lowest) `kept` of
+    `times` dice that each have the given distribution.
+
+    Goes through the faces from best to worst, counting how many dice show
+    each one; whichever are among the first `kept` get added to the total.
+    """
+    faces = sorted(die.items(), reverse=highest)
+    states = {(0, 0): 1.0}
+
+    for value, p in faces:
+        next_states = defaultdict(float)
+        for (used, total), q in states.items():
+            remaining = times - used
+            for count in range(remaining + 1):
+                keep = min(count, max(kept - used, 0))
+                next_states[(used + count, total + keep * value)] += (
+                    q * comb(remaining, count) * p**count
+                )
+        states = next_states
+
+    return Distribution.from_dict(
+        {total: p for (used, total), p in states.items() if used == times}
+    )
+
+
+def get_term_distribution(dice):
+    if dice.is_simple:
+        return get_pool_distribution(dice.times, dice.sides)
+
+    die = get_die_distribution(dice)
+
+    if dice.keep:
+        kind, count = dice.keep
+        kept = max(0, min(count, dice.times))
+        if kind in ("dh", "dl"):
+            kept = dice.times - kept
+        return get_kept_distribution(die, dice.times, kept, kind in ("kh", "dl"))
+
+    # Add up the dice by squaring, like a pool of plain dice
+    pool = Distribution(0, [1.0])
+    times = dice.times
+    while times:
+        if times & 1:
+            pool = pool + die
+        times >>= 1
+        if times:
+            die = die + die
+    return pool
+
+
+@lru_cache(maxsize=1024)
+def get_distribution(value):
+    """
+    Get the exact distribution of a dice expression's totals.
+    """
+    distribution = Distribution(0, [1.0])
+    for sign, term in compile_dice_expr(value).terms:
+        if isinstance(term, Dice):
+            term = get_term_distribution(term)
+            distribution = distribution + (term if sign > 0 else -term)
+        else:
+            distribution = distribution + sign * term
+    return distribution
+
+
+@lru_cache(maxsize=1024)
+def get_attack_odds(bonus, ac, roll="1d20", crit=20):
+    """
+    Get the chances that an attack hits, and that it's a critical hit.
+
+    :param bonus: The attack's to-hit bonus.
+    :param ac: The target's armor class.
+    :param roll: The d20 roll, e.g. "2d20kh1" for advantage or "2d20kl1"
+                 for disadvantage.
+    :param crit: The lowest natural roll that's a critical hit.
+    :return: The chance to hit (including crits), and the chance to crit.
+    """
+    hit = crit_hit = 0.0
+    for natural, p in get_distribution(roll).items():
+        if natural >= crit:
+            hit += p
+            crit_hit += p
+        elif natural > 1 and natural + bonus >= ac:
+            hit += p
+    return hit, crit_hit
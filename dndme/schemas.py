@@ -0,0 +1,354 @@
+"""
+Declarative schemas for the TOML formats dndme reads, mirroring the files
+in templates/.
+
+Each schema is compiled once into a validator function that checks a
+parsed TOML dict, renames any legacy keys to their current names, and
+returns the (possibly renamed) data, raising SchemaError with every
+problem it found if the data doesn't fit.
+
+Run this module to measure the validation overhead per record:
+
+    python -m dndme.schemas
+"""
+
+import timeit
+
+number = (int, float)
+text = str
+text_or_list = (str, list)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class Record:
+    """
+    A TOML table with known keys.
+
+    :param fields: Dict of key to spec; a spec is a type, a tuple of types,
+                   a Record, a Table, or a ListOf.
+    :param required: Keys that must be present.
+    :param renamed: Dict of legacy key to current key.
+    :param extra: When True, keys not in fields are allowed.
+    """
+
+    def __init__(self, fields, required=(), renamed=None, extra=False):
+        self.fields = fields
+        self.required = required
+        self.renamed = renamed or {}
+        self.extra = extra
+
+
+class Table:
+    """
+    A TOML table with arbitrary keys whose values all match one spec.
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+
+class ListOf:
+    def __init__(self, values):
+        self.values = values
+
+
+def type_name(spec):
+    if isinstance(spec, tuple):
+        return " or ".join(x.__name__ for x in spec)
+    return spec.__name__
+
+
+def check_items(table, check, path, errors):
+    """
+    Check every value in a table, only copying the table if a check had
+    to rename something.
+    """
+    result = table
+    for key, item in table.items():
+        checked = check(item, f"{path}.{key}", errors)
+        if checked is not item:
+            if result is table:
+                result = dict(table)
+            result[key] = checked
+    return result
+
+
+def compile_spec(spec):
+    """
+    Compile a spec into a check(value, path, errors) function.
+    """
+    if isinstance(spec, Record):
+        return compile_record(spec)
+
+    if isinstance(spec, Table):
+        check_value = compile_spec(spec.values)
+
+        def check_table(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path} should be a table")
+                return value
+            return check_items(value, check_value, path, errors)
+
+        return check_table
+
+    if isinstance(spec, ListOf):
+        check_item = compile_spec(spec.values)
+
+        def check_list(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(f"{path} should be a list")
+                return value
+            for i, item in enumerate(value):
+                check_item(item, f"{path}[{i}]", errors)
+            return value
+
+        return check_list
+
+    expected = type_name(spec)
+
+    def check_type(value, path, errors):
+        if not isinstance(value, spec):
+            errors.append(f"{path} should be {expected}, not {type(value).__name__}")
+        return value
+
+    return check_type
+
+
+def compile_record(record):
+    checks = {key: compile_spec(spec) for key, spec in record.fields.items()}
+    required = tuple(record.required)
+    renamed = record.renamed
+    extra = record.extra
+
+    def check_record(value, path, errors):
+        if not isinstance(value, dict):
+            errors.append(f"{path} should be a table")
+            return value
+
+        original = value
+        if renamed and not renamed.keys().isdisjoint(value):
+            value = dict(value)
+            for old, new in renamed.items():
+                if old not in value:
+                    continue
+                if new in value:
+                    errors.append(f"{path} has both '{old}' and '{new}'")
+                value[new] = value.pop(old)
+
+        for key in required:
+            if key not in value:
+                errors.append(f"{path} is missing '{key}'")
+
+        for key, item in value.items():
+            check = checks.get(key)
+            if check:
+                checked = check(item, f"{path}.{key}", errors)
+                if checked is not item:
+                    # Something got renamed further down
+                    if value is original:
+                        value = dict(value)
+                    value[key] = checked
+            elif not extra:
+                errors.append(f"{path} has unknown key '{key}'")
+
+        return value
+
+    return check_record
+
+
+def compile_schema(name, spec):
+    """
+    Compile a top-level spec into a validate(data) function.
+    """
+    check = compile_spec(spec)
+
+    def validate(data):
+        errors = []
+        data = check(data, name, errors)
+        if errors:
+            raise SchemaError("; ".join(errors))
+        return data
+
+    validate.__name__ = f"validate_{name}"
+    return validate
+
+
+section = Record({"name": text, "description": text}, extra=True)
+sections = Table(section)
+
+monster_schema = Record(
+    {
+        "name": text,
+        "size": text,
+        "mtype": text,
+        "species": text,
+        "pronouns": text,
+        "alignment": text,
+        "ac": int,
+        "armor": text,
+        "gear": text,
+        "max_hp": (int, str),
+        "avg_hp": int,
+        "speed": (int, str),
+        "str": int,
+        "dex": int,
+        "con": int,
+        "int": int,
+        "wis": int,
+        "cha": int,
+        "vulnerable": text_or_list,
+        "resist": text_or_list,
+        "immune": text_or_list,
+        "languages": text_or_list,
+        "cr": number,
+        "xp": int,
+        "pb": int,
+        "image_url": text,
+        "notes": text,
+        "skills": Table(int),
+        "senses": Table((int, bool, str)),
+        "traits": sections,
+        "actions": sections,
+        "bonus_actions": sections,
+        "lair_actions": sections,
+        "legendary_actions": sections,
+        "reactions": sections,
+        "disposition": text,
+        "inherits": text,
+        "remove": ListOf(str),
+    },
+    required=("name",),
+    renamed={"race": "species", "features": "traits"},
+)
+
+group_schema = Record(
+    {
+        "monster": text,
+        "count": (int, str),
+        "name": text_or_list,
+        "alias": text_or_list,
+        "str": int,
+        "dex": int,
+        "con": int,
+        "int": int,
+        "wis": int,
+        "cha": int,
+        "max_hp": (int, str, list),
+        "armor": text,
+        "ac": int,
+        "alignment": text,
+        "race": text,
+        "species": text,
+        "languages": text_or_list,
+        "xp": int,
+        "disposition": text,
+        "skills": Table(int),
+        "traits": sections,
+        "actions": sections,
+        "legendary_actions": sections,
+        "reactions": sections,
+        "remove": ListOf(str),
+    },
+    required=("monster", "count"),
+)
+
+encounter_schema = Record(
+    {
+        "name": text,
+        "location": text,
+        "notes": text,
+        "groups": Table(group_schema),
+    },
+    required=("name",),
+)
+
+character_schema = Record(
+    {
+        "name": text,
+        "species": text,
+        "cclass": text,
+        "ctype": text,
+        "level": int,
+        "pronouns": text,
+        "max_hp": int,
+        "cur_hp": int,
+        "temp_hp": int,
+        "max_hp_override": int,
+        "exhaustion": int,
+        "ac": int,
+        "initiative_mod": int,
+        "image_url": text,
+        "senses": Table((int, bool, str)),
+        "conditions": Table(number),
+    },
+    required=("name",),
+    renamed={"race": "species"},
+)
+
+party_schema = Table(character_schema)
+
+calendar_schema = Record(
+    {
+        "name": text,
+        "hours_in_day": int,
+        "minutes_in_hour": int,
+        "leap_year_rule": text,
+        "axial_tilt": number,
+        "solar_days_in_year": number,
+        "default_day": int,
+        "default_month": text,
+        "default_year": int,
+        "months": Table(
+            Record(
+                {"name": text, "alt_name": text, "days": int, "leap_year_days": int},
+                required=("name", "days"),
+            )
+        ),
+        "seasons": Table(
+            Record({"name": text, "month": text, "day": int}, required=("month", "day"))
+        ),
+        "moons": Table(
+            Record(
+                {"name": text, "period": (int, float, str), "full_on": text},
+                required=("period", "full_on"),
+            )
+        ),
+    },
+    required=(
+        "hours_in_day",
+        "minutes_in_hour",
+        "default_day",
+        "default_month",
+        "default_year",
+        "months",
+    ),
+)
+
+validate_monster = compile_schema("monster", monster_schema)
+validate_encounter = compile_schema("encounter", encounter_schema)
+validate_party = compile_schema("party", party_schema)
+validate_calendar = compile_schema("calendar", calendar_schema)
+
+
+def measure(validate, data, number=10000):
+    """
+    Get the average time, in microseconds, to validate one record.
+    """
+    return timeit.timeit(lambda: validate(data), number=number) / number * 1e6
+
+
+if __name__ == "__main__":
+    import pytoml as toml
+
+    for template, validate in [
+        ("monster", validate_monster),
+        ("encounter", validate_encounter),
+        ("party", validate_party),
+        ("calendar", validate_calendar),
+    ]:
+        with open(f"templates/{template}.toml", "r") as fin:
+            data = toml.load(fin)
+        print(f"{template}: {measure(validate, data):.1f} µs per record")
@@ -1,9 +1,11 @@
+from bisect import bisect_left
 from importlib import import_module
 import os
 import pkgutil
 import re
 import subprocess
 import sys
+import threading
 import traceback
 
 import click
@@ -11,14 +13,17 @@ import pytoml as toml
 from prompt_toolkit import HTML
 from prompt_toolkit import PromptSession
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.shortcuts import clear
 from prompt_toolkit.styles import Style
 
 from dndme.gametime import Calendar, Clock, Almanac
+from dndme.loaders import set_content_path
 from dndme.player_view import PlayerViewManager
 from dndme.models import Game
+from dndme.rng import set_seed
+from dndme.schemas import validate_calendar
 
 base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
 
@@ -46,6 +51,11 @@ class DnDCompleter(Completer):
     """
     Simple autocompletion on a list of words.
 
+    Candidates for each command position are cached and kept sorted so
+    that prefix matches can be found by binary search; the cache is thrown
+    away whenever the game's state version changes (i.e. after a command
+    has run), so suggestions never go stale.
+
     :param base_commands: List of base commands.
     :param ignore_case: If True, case-insensitive completion.
     :param meta_dict: Optional dict mapping words to their meta-information.
@@ -56,6 +66,8 @@ class DnDCompleter(Completer):
         contain spaces. (Can not be used together with the WORD option.)
     :param match_middle: When True, match not only the start, but also in the
                          middle of the word.
+    :param game: Optional game whose state version invalidates the cache;
+                 without it, candidates are worked out fresh every time.
     """
 
     def __init__(
@@ -66,6 +78,7 @@ class DnDCompleter(Completer):
         WORD=False,
         sentence=False,
         match_middle=False,
+        game=None,
     ):
         assert not (WORD and sentence)
         self.commands = commands
@@ -75,43 +88,71 @@ class DnDCompleter(Completer):
         self.WORD = WORD
         self.sentence = sentence
         self.match_middle = match_middle
+        self.game = game
 
-    def get_completions(self, document, complete_event):
-        # Get word/text before cursor.
-        if self.sentence:
-            word_before_cursor = document.text_before_cursor
-        else:
-            word_before_cursor = document.get_word_before_cursor(WORD=self.WORD)
+        self.cache = {}
+        self.cache_version = None
+        self.lock = threading.Lock()
 
-        if self.ignore_case:
-            word_before_cursor = word_before_cursor.lower()
+    def fold(self, word):
+        return word.lower() if self.ignore_case else word
 
-        def word_matcher(word):
-            """True when the command before the cursor matches."""
-            if self.ignore_case:
-                word = word.lower()
+    def get_candidates(self, document_text_list):
+        """
+        Get the sorted candidates (and their folded forms) for the last word
+        of the document, independent of what has been typed of it so far.
+        """
+        key = tuple(document_text_list[:-1])
+        version = self.game.state_version if self.game else None
 
-            if self.match_middle:
-                return word_before_cursor in word
-            else:
-                return word.startswith(word_before_cursor)
+        with self.lock:
+            if version is None or version != self.cache_version:
+                self.cache = {}
+                self.cache_version = version
+            candidates = self.cache.get(key)
 
-        suggestions = []
-        document_text_list = document.text.split(" ")
+        if candidates is not None:
+            return candidates
 
         if len(document_text_list) < 2:
-            suggestions = self.base_commands
-
+            words = self.base_commands
         elif document_text_list[0] in self.base_commands:
             command = self.commands[document_text_list[0]]
-            suggestions = command.get_suggestions(document_text_list) or []
+            words = command.get_suggestions(list(key) + [""]) or []
+        else:
+            words = []
 
-        for word in suggestions:
-            if word_matcher(word):
-                display_meta = self.meta_dict.get(word, "")
-                yield Completion(
-                    word, -len(word_before_cursor), display_meta=display_meta
-                )
+        words = sorted(set(words), key=self.fold)
+        candidates = (words, [self.fold(x) for x in words])
+
+        with self.lock:
+            if version is not None and version == self.cache_version:
+                self.cache[key] = candidates
+
+        return candidates
+
+    def get_completions(self, document, complete_event):
+        # Get word/text before cursor.
+        if self.sentence:
+            word_before_cursor = document.text_before_cursor
+        else:
+            word_before_cursor = document.get_word_before_cursor(WORD=self.WORD)
+
+        word_before_cursor = self.fold(word_before_cursor)
+        words, folded = self.get_candidates(document.text.split(" "))
+
+        if self.match_middle:
+            matches = [x for x, y in zip(words, folded) if word_before_cursor in y]
+        else:
+            start = bisect_left(folded, word_before_cursor)
+            end = start
+            while end < len(folded) and folded[end].startswith(word_before_cursor):
+                end += 1
+            matches = words[start:end]
+
+        for word in matches:
+            display_meta = self.meta_dict.get(word, "")
+            yield Completion(word, -len(word_before_cursor), display_meta=display_meta)
 
 
 def load_commands(game, session, player_view):
@@ -150,7 +191,7 @@ def main_loop(campaign, player_view):
     calendar_file = default_calendar_file
     if "calendar_file" in campaign_data:
         calendar_file = f"{base_dir}/{campaign_data['calendar_file']}"
-    cal_data = toml.load(open(calendar_file, "r"))
+    cal_data = validate_calendar(toml.load(open(calendar_file, "r")))
     calendar = Calendar(cal_data)
 
     # Load the clock
@@ -172,6 +213,17 @@ def main_loop(campaign, player_view):
     if "log_file" in campaign_data:
         log_file = f"{base_dir}/{campaign_data['log_file']}"
 
+    content_library = None
+    if "content_library" in campaign_data:
+        content_library = f"{base_dir}/{campaign_data['content_library']}"
+
+    # Seed the dice, so the session can be replayed with the same seed
+    set_seed(campaign_data.get("seed"))
+
+    # Packs to find monsters in, highest precedence first
+    if "content_path" in campaign_data:
+        set_content_path([f"{base_dir}/{x}" for x in campaign_data["content_path"]])
+
     game = Game(
         base_dir=base_dir,
         encounters_dir=encounters_dir,
@@ -181,6 +233,7 @@ def main_loop(campaign, player_view):
         clock=clock,
         almanac=almanac,
         latitude=default_latitude,
+        content_library=content_library,
     )
 
     session = PromptSession()
@@ -270,13 +323,18 @@ def main_loop(campaign, player_view):
     clear()
     print(welcome_text)
 
+    # Work out completions off the UI thread so typing never stalls
+    completer = ThreadedCompleter(
+        DnDCompleter(
+            commands=game.commands, ignore_case=True, match_middle=False, game=game
+        )
+    )
+
     while True:
         try:
             user_input = session.prompt(
                 "> ",
-                completer=DnDCompleter(
-                    commands=game.commands, ignore_case=True, match_middle=False
-                ),
+                completer=completer,
                 bottom_toolbar=bottom_toolbar,
                 auto_suggest=AutoSuggestFromHistory(),
                 key_bindings=kb,
@@ -292,7 +350,11 @@ def main_loop(campaign, player_view):
                 print("Unknown command.")
                 continue
 
-            command.do_command(*user_input[1:])
+            try:
+                command.do_command(*user_input[1:])
+            finally:
+                # Anything could have changed, so suggestions need a rethink
+                game.state_version += 1
 
             if game.changed:
                 player_view_manager.update()
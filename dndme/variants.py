@@ -0,0 +1,82 @@
+"""
+Monster variants: monster files that declare `inherits = "<monster name>"`
+and only list what differs from their parent, with the same override
+semantics as encounter groups.
+
+Top-level keys replace the parent's values, the keyed sections (skills,
+traits, actions, etc.) are merged entry by entry, and `remove` drops
+whole attributes ("gear") or single section entries ("actions.bite").
+"""
+
+merged_sections = (
+    "skills",
+    "senses",
+    "traits",
+    "actions",
+    "bonus_actions",
+    "lair_actions",
+    "legendary_actions",
+    "reactions",
+)
+variant_keys = ("inherits", "remove")
+
+
+class VariantError(ValueError):
+    pass
+
+
+def merge_variant(base, variant):
+    """
+    Apply a variant's overrides to its parent's data, returning new data
+    without modifying either of them.
+    """
+    data = dict(base)
+    for key, value in variant.items():
+        if key in variant_keys:
+            continue
+        if key in merged_sections and isinstance(data.get(key), dict):
+            data[key] = {**data[key], **value}
+        else:
+            data[key] = value
+
+    for attr in variant.get("remove", []):
+        section, _, key = attr.partition(".")
+        if not key:
+            data.pop(section, None)
+        elif key in data.get(section, {}):
+            data[section] = {k: v for k, v in data[section].items() if k != key}
+
+    return data
+
+
+def resolve_chain(item, parents, names):
+    """
+    Work out an item's inheritance chain, root ancestor first.
+
+    :param item: The item (a filename, bundle key, etc.) to resolve.
+    :param parents: Dict of item to the name of the monster it inherits
+                    from, for the items that are variants.
+    :param names: Dict of monster name to item.
+    """
+    chain = [item]
+    while chain[-1] in parents:
+        parent_name = parents[chain[-1]]
+        parent = names.get(parent_name)
+        if parent is None:
+            raise VariantError(f"{item} inherits from unknown monster {parent_name}")
+        if parent in chain:
+            raise VariantError(f"{item} has an inheritance loop via {parent_name}")
+        chain.append(parent)
+    chain.reverse()
+    return chain
+
+
+def flatten(chain, get_data):
+    """
+    Merge the data for each item in an inheritance chain into one
+    stat block.
+    """
+    data = get_data(chain[0])
+    for item in chain[1:]:
+        data = merge_variant(data, get_data(item))
+    return data
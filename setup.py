@@ -32,6 +32,9 @@ setup(
             "pip-tools",
             "pre-commit",
         ],
+        "fast": [
+            "numpy",
+        ],
     },
     tests_require=["pytest"],
     setup_requires=["pytest-runner"],
@@ -40,6 +43,9 @@ setup(
             "dndme = dndme.shell:main_loop",
             "dndme-new-campaign = dndme.new_campaign:main",
             "dndme-new-content = dndme.new_content:main",
+            "dndme-compile-content = dndme.compile_content:main",
+            "dndme-import = dndme.import_content:main",
+            "dndme-generate-content = dndme.generate_content:main",
         ],
     },
 )
@@ -0,0 +1,78 @@
+from dndme.commands.attack import Attack
+from dndme.models import Character, Combat, Game, Monster
+from dndme.rng import set_seed
+
+
+class FakeSession:
+    def __init__(self, answers):
+        self.answers = list(answers)
+
+    def prompt(self, text):
+        return self.answers.pop(0)
+
+
+def make_attack(answers=()):
+    set_seed(1234)
+    game = Game(
+        base_dir=None,
+        encounters_dir=None,
+        party_file=None,
+        log_file=None,
+        calendar=None,
+        clock=None,
+        almanac=None,
+        latitude=None,
+    )
+    game.combat = Combat()
+    for i in range(1, 13):
+        game.combat.monsters[f"goblin{i}"] = Monster(name=f"goblin{i}")
+    game.combat.characters["Frodo"] = Character(
+        name="Frodo", ac=14, max_hp=100, cur_hp=100
+    )
+    return Attack(game, FakeSession(answers), None)
+
+
+def test_resolves_all_attacks_at_once():
+    attack = make_attack()
+    attackers = attack.game.combat.get_targets(["goblin*"])
+
+    hits, crits, total = attack.resolve(attackers, 4, "1d6+2", 14)
+    assert 0 <= crits <= hits <= 12
+    assert 3 * hits <= total <= 8 * (hits - crits) + 14 * crits
+
+    # Only a natural 20 can hit, and a crit doubles the dice but not the +2
+    hits, crits, total = attack.resolve(attackers, 4, "1d6+2", 30)
+    assert hits == crits
+    assert 4 * crits <= total <= 14 * crits
+
+    # Everything but a natural 1 hits
+    hits, crits, total = attack.resolve(attackers, 100, "1d1", 2)
+    assert total == hits + crits
+
+
+def test_applies_total_damage_to_target(capsys):
+    attack = make_attack(answers=[""])
+    frodo = attack.game.combat.characters["Frodo"]
+    attack.game.changed = False
+
+    attack.do_command("goblin*", "+4", "1d6+2", "vs", "Frodo")
+    output = capsys.readouterr().out
+    assert "3 of 12 hit (0 critical); 16 total damage" in output
+    assert frodo.cur_hp == 84
+    assert attack.game.changed
+
+
+def test_declined_damage_and_bad_arguments(capsys):
+    attack = make_attack(answers=["n"])
+    attack.do_command("goblin*", "+4", "1d6+2", "vs", "Frodo")
+    assert attack.game.combat.characters["Frodo"].cur_hp == 100
+
+    attack.do_command("goblin1", "4", "1d6", "Frodo")
+    attack.do_command("goblin1", "+x", "1d6", "vs", "15")
+    attack.do_command("goblin1", "+4", "1d", "vs", "15")
+    attack.do_command("orc*", "+4", "1d6", "vs", "15")
+    output = capsys.readouterr().out
+    assert "Need attackers" in output
+    assert "Invalid to-hit bonus: +x" in output
+    assert "Invalid damage: 1d" in output
+    assert "No attackers found" in output
@@ -0,0 +1,198 @@
+import os
+import pickle
+
+import pytest
+
+from dndme import loaders
+from dndme.bundle import MAGIC, VERSION, ContentBundles, compile_bundle, preamble
+from dndme.loaders import EncounterLoader, MonsterCache, MonsterIndex, MonsterLoader
+
+
+@pytest.fixture
+def pack_dir(tmp_path):
+    pack = tmp_path / "content" / "pack"
+    (pack / "monsters").mkdir(parents=True)
+    (pack / "encounters").mkdir()
+    (pack / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 15\n')
+    (pack / "encounters" / "camp.toml").write_text(
+        'name = "Orc Camp"\nlocation = "Woods"\n\n'
+        '[groups.orcs]\nmonster = "orc"\ncount = 3\n'
+    )
+    return pack
+
+
+@pytest.fixture
+def monster_loader(tmp_path, pack_dir):
+    bundles = ContentBundles(content_path=[f"{tmp_path}/content/*"])
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"),
+        pattern=f"{tmp_path}/content/*/monsters/*.toml",
+    )
+    return MonsterLoader(
+        image_loader=None, index=index, cache=MonsterCache(), bundles=bundles
+    )
+
+
+def test_monsters_load_from_bundle(pack_dir, monster_loader):
+    compile_bundle(str(pack_dir))
+    monster_loader.index.lookup = lambda name: pytest.fail("used TOML index")
+    assert monster_loader.load("orc")[0].max_hp == 15
+
+
+def test_stale_bundle_falls_back_to_toml(pack_dir, monster_loader):
+    compile_bundle(str(pack_dir))
+    (pack_dir / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 150\n')
+    assert monster_loader.load("orc")[0].max_hp == 150
+
+
+def test_encounters_load_from_bundle(pack_dir, monster_loader):
+    compile_bundle(str(pack_dir))
+    encounter_loader = EncounterLoader(
+        base_dir=f"{pack_dir}/encounters",
+        monster_loader=monster_loader,
+        combat=None,
+        bundles=monster_loader.bundles,
+    )
+    os.remove(pack_dir / "encounters" / "camp.toml")
+    assert encounter_loader.get_available_encounters() == []
+
+    (pack_dir / "encounters" / "camp.toml").write_text('name = "Empty Camp"\n')
+    compile_bundle(str(pack_dir))
+    encounters = encounter_loader.get_available_encounters()
+    assert [x.name for x in encounters] == ["Empty Camp"]
+
+
+def test_encounter_catalog_reads_from_bundle(pack_dir, monster_loader, monkeypatch):
+    compile_bundle(str(pack_dir))
+    encounter_loader = EncounterLoader(
+        base_dir=f"{pack_dir}/encounters",
+        monster_loader=monster_loader,
+        combat=None,
+        bundles=monster_loader.bundles,
+    )
+
+    def fail(*args, **kwargs):
+        pytest.fail("read TOML")
+
+    monkeypatch.setattr(loaders, "_load_toml_file", fail)
+    monkeypatch.setattr(loaders.toml, "load", fail)
+
+    [summary] = encounter_loader.get_encounter_summaries("woods")
+    encounter = encounter_loader.get_encounter(summary)
+    assert (encounter.name, encounter.groups["orcs"]["count"]) == ("Orc Camp", 3)
+
+
+def test_monster_keys_come_from_bundle(tmp_path, pack_dir, monster_loader):
+    compile_bundle(str(pack_dir))
+    other = tmp_path / "content" / "other" / "monsters"
+    other.mkdir(parents=True)
+    (other / "ogre.toml").write_text('name = "ogre"\n')
+
+    bundle = monster_loader.bundles.get_for_pack(str(pack_dir))
+    assert bundle.monster_keys == ["orc"]
+    assert bundle.monster_table.find("orc") is not None
+    assert bundle.monster_table.find("ogre") is None
+    assert monster_loader.get_available_monster_keys() == ["ogre", "orc"]
+
+
+def test_variants_are_flattened_into_bundle(pack_dir, monster_loader):
+    (pack_dir / "monsters" / "orc_chief.toml").write_text(
+        'name = "orc chief"\ninherits = "orc"\nac = 16\n'
+    )
+    compile_bundle(str(pack_dir))
+    monster_loader.index.lookup = lambda name: pytest.fail("used TOML index")
+
+    chief = monster_loader.load("orc chief")[0]
+    assert (chief.max_hp, chief.ac) == (15, 16)
+    assert "inherits" not in monster_loader.load_data("orc chief")
+
+
+def test_variant_is_stale_when_parent_changes(pack_dir, monster_loader):
+    (pack_dir / "monsters" / "orc_chief.toml").write_text(
+        'name = "orc chief"\ninherits = "orc"\n'
+    )
+    compile_bundle(str(pack_dir))
+    (pack_dir / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 150\n')
+    assert monster_loader.load("orc chief")[0].max_hp == 150
+
+
+def test_bundles_follow_content_path(tmp_path, pack_dir, monster_loader):
+    homebrew = tmp_path / "content" / "homebrew"
+    (homebrew / "monsters").mkdir(parents=True)
+    (homebrew / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 30\n')
+    compile_bundle(str(pack_dir))
+    content_path = [str(homebrew), f"{tmp_path}/content/*"]
+    monster_loader.bundles.content_path = content_path
+    monster_loader.index.set_content_path(content_path)
+
+    # The homebrew pack isn't bundled, so we have to go by the index
+    assert monster_loader.load("orc")[0].max_hp == 30
+
+    compile_bundle(str(homebrew))
+    monster_loader.index.lookup = lambda name: pytest.fail("used TOML index")
+    assert monster_loader.load("orc")[0].max_hp == 30
+
+
+def test_variants_can_inherit_from_another_pack(tmp_path, pack_dir, monster_loader):
+    homebrew = tmp_path / "content" / "homebrew"
+    (homebrew / "monsters").mkdir(parents=True)
+    (homebrew / "monsters" / "orc_archer.toml").write_text(
+        'name = "orc archer"\ninherits = "orc"\nac = 14\n'
+    )
+    (homebrew / "monsters" / "orc_captain.toml").write_text(
+        'name = "orc captain"\ninherits = "orc archer"\nmax_hp = 40\n'
+    )
+    compile_bundle(str(homebrew))
+    compile_bundle(str(pack_dir))
+
+    bundle = monster_loader.bundles.get_for_pack(str(homebrew))
+    assert bundle.get_monster("orc archer")["inherits"] == "orc"
+
+    archer = monster_loader.load("orc archer")[0]
+    assert (archer.max_hp, archer.ac) == (15, 14)
+    captain = monster_loader.load("orc captain")[0]
+    assert (captain.max_hp, captain.ac) == (40, 14)
+
+
+def test_variants_use_parents_from_earlier_packs(tmp_path, pack_dir, monster_loader):
+    homebrew = tmp_path / "content" / "a_homebrew"
+    (homebrew / "monsters").mkdir(parents=True)
+    (homebrew / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 30\n')
+    (pack_dir / "monsters" / "orc_chief.toml").write_text(
+        'name = "orc chief"\ninherits = "orc"\nac = 16\n'
+    )
+    compile_bundle(str(homebrew))
+    compile_bundle(str(pack_dir))
+
+    # The pack's bundle flattened the chief with its own orc, but the
+    # homebrew orc comes first, so the chief has to be built from that
+    chief = monster_loader.load("orc chief")[0]
+    assert (chief.max_hp, chief.ac) == (30, 16)
+
+
+class Boom:
+    def __reduce__(self):
+        return (pytest.fail, ("unpickled a bundle",))
+
+
+def test_bundles_never_unpickle(pack_dir, monster_loader):
+    bundle_file = compile_bundle(str(pack_dir))
+    header = pickle.dumps(Boom())
+    with open(bundle_file, "wb") as fout:
+        fout.write(preamble.pack(MAGIC, VERSION, 0, preamble.size, len(header)))
+        fout.write(header)
+
+    assert monster_loader.bundles.get_for_pack(str(pack_dir)) is None
+    assert monster_loader.load("orc")[0].max_hp == 15
+
+
+def test_monsters_added_to_bundled_pack_mid_session(tmp_path, pack_dir, monster_loader):
+    homebrew = tmp_path / "content" / "a_homebrew"
+    (homebrew / "monsters").mkdir(parents=True)
+    (homebrew / "monsters" / "ogre.toml").write_text('name = "ogre"\n')
+    compile_bundle(str(homebrew))
+    compile_bundle(str(pack_dir))
+    assert monster_loader.load("orc")[0].max_hp == 15
+
+    (homebrew / "monsters" / "orc.toml").write_text('name = "orc"\nmax_hp = 30\n')
+    assert monster_loader.load("orc")[0].max_hp == 30
@@ -0,0 +1,118 @@
+import pytest
+from click.testing import CliRunner
+
+from dndme import check_data, loaders
+from dndme.check_data import Checker
+from dndme.loaders import MonsterIndex, MonsterLoader
+
+
+@pytest.fixture
+def content(tmp_path):
+    monsters = tmp_path / "monsters"
+    encounters = tmp_path / "encounters"
+    monsters.mkdir()
+    encounters.mkdir()
+    (monsters / "orc.toml").write_text('name = "orc"\n')
+    (monsters / "bad.toml").write_text('name = "bad"\nwings = 2\n')
+    (encounters / "camp.toml").write_text(
+        'name = "Orc Camp"\n\n'
+        '[groups.orcs]\nmonster = "orc"\ncount = "1d4"\n\n'
+        '[groups.ogres]\nmonster = "ogre"\ncount = "orcs + 1"\n'
+    )
+    (encounters / "lair.toml").write_text(
+        'name = "Orc Lair"\n\n[groups.orcs]\nmonster = "orc"\ncount = "chief + 1"\n'
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def checker_factory(content, tmp_path):
+    def make_checker():
+        checker = Checker(cache_file=str(tmp_path / "cache.json"))
+        checker.monster_loader.index = MonsterIndex(
+            index_file=str(tmp_path / "index.json"),
+            pattern=f"{content}/monsters/*.toml",
+        )
+        return checker
+
+    return make_checker
+
+
+def filenames(content):
+    return [str(x) for x in sorted(content.glob("*/*.toml")) if x.name != "index.json"]
+
+
+def test_checks_monsters_and_encounters(content, checker_factory):
+    checker = checker_factory()
+    counts = checker.check_files(filenames(content))
+
+    assert counts["files_ok"] == 1
+    assert counts["files_bad"] == 3
+    errors = {k.split("/")[-1]: v for k, v in checker.errors.items()}
+    assert errors["bad.toml"].kind == "SchemaError"
+    assert "unknown key 'wings'" in errors["bad.toml"].message
+    assert errors["camp.toml"].kind == "UnknownMonster"
+    assert "ogre" in errors["camp.toml"].message
+    assert "unknown group 'chief'" in errors["lair.toml"].message
+
+
+def test_incremental_reuses_unchanged_results(content, checker_factory):
+    checker_factory().check_files(filenames(content))
+
+    checker = checker_factory()
+    counts = checker.check_files(filenames(content))
+    assert counts["files_cached"] == 4
+    assert counts["files_bad"] == 3
+
+    # A new monster invalidates the encounter results but nothing else
+    (content / "monsters" / "ogre.toml").write_text('name = "ogre"\n')
+    checker = checker_factory()
+    counts = checker.check_files(filenames(content))
+    assert counts["files_cached"] == 2
+    assert counts["files_bad"] == 2
+
+
+def test_variants_need_a_known_parent(content, checker_factory):
+    (content / "monsters" / "orc_chief.toml").write_text(
+        'name = "orc chief"\ninherits = "orc"\nac = 16\n'
+    )
+    (content / "monsters" / "ogre_chief.toml").write_text(
+        'name = "ogre chief"\ninherits = "ogre"\n'
+    )
+    checker = checker_factory()
+    checker.check_files(filenames(content))
+
+    errors = {k.split("/")[-1]: v for k, v in checker.errors.items()}
+    assert "orc_chief.toml" not in errors
+    assert errors["ogre_chief.toml"].kind == "UnknownMonster"
+
+
+def test_missing_files_are_reported_not_fatal(content, checker_factory):
+    missing = str(content / "monsters" / "gone.toml")
+    for _ in range(2):
+        checker = checker_factory()
+        counts = checker.check_files(filenames(content) + [missing])
+        assert counts["files_checked"] == 5
+        assert counts["files_bad"] == 4
+        assert checker.errors[missing].kind == "FileNotFoundError"
+
+
+def test_jobs_reach_the_shared_index(monkeypatch):
+    class FakeChecker:
+        errors = {}
+
+        def __init__(self, **kwargs):
+            self.monster_loader = MonsterLoader(None, index=MonsterIndex())
+            self.monster_loader.index.get_shadowed = lambda: []
+
+        def check_files(self, filenames):
+            return {}
+
+    monkeypatch.setattr(check_data, "Checker", FakeChecker)
+    try:
+        CliRunner().invoke(check_data.main, ["--jobs", "3"], catch_exceptions=False)
+        assert loaders.monster_index.jobs == 3
+        assert loaders.get_encounter_catalog("content/example/encounters").jobs == 3
+    finally:
+        loaders.set_jobs(1)
+    assert loaders.monster_index.jobs == 1
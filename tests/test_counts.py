@@ -0,0 +1,40 @@
+import pytest
+
+from dndme.counts import CountError, compile_count, count_range
+
+
+def test_counts_are_evaluated_with_variables():
+    expression = compile_count("goblins + evil_mage * 2 - (players // 2)")
+    assert expression.names == {"goblins", "evil_mage", "players"}
+    assert expression({"goblins": 4, "evil_mage": 1, "players": 5}) == 4
+
+
+def test_counts_are_at_least_one():
+    assert compile_count("players - 10")({"players": 4}) == 1
+    assert compile_count("unknown")({}) == 1
+
+
+def test_counts_are_compiled_once():
+    assert compile_count("players + 2") is compile_count("players + 2")
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["__import__('os')", "players.real", "players ** 100", "[1]", "1.5", "2 +"],
+)
+def test_only_arithmetic_is_allowed(source):
+    with pytest.raises(CountError):
+        compile_count(source)
+
+
+def test_count_range():
+    groups = {
+        "goblins": {"monster": "goblin", "count": "1d4+2"},
+        "evil_mage": {"monster": "evil_mage", "count": "goblins"},
+        "dragon": {"monster": "young_green_dragon", "count": "goblins + evil_mage"},
+        "skeletons": {"monster": "skeleton", "count": "players + 2"},
+        "rats": {"monster": "rat", "count": 3},
+    }
+    party = {"players": 4, "sidekicks": 1, "party": 5}
+    assert count_range(groups, party) == (3 + 3 + 6 + 6 + 3, 6 + 6 + 12 + 6 + 3)
+    assert count_range({"bad": {"count": "1 / (players - 4)"}}, party) is None
@@ -0,0 +1,134 @@
+import pytest
+
+from dndme import dice
+from dndme.dice import (
+    DiceError,
+    compile_dice_expr,
+    is_dice_expr,
+    max_dice_expr,
+    min_dice_expr,
+    roll_dice,
+    roll_dice_expr,
+    roll_dice_expr_many,
+    roll_dice_many,
+)
+from dndme.rng import set_seed
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(dice, "numpy_threshold", 0)
+    else:
+        monkeypatch.setattr(dice, "np", None)
+    return request.param
+
+
+def test_roll_dice_many_stays_in_range(backend):
+    rolls = roll_dice_many(3, 6, 500, modifier=2)
+    assert len(rolls) == 500
+    assert all(5 <= x <= 20 for x in rolls)
+    assert set(roll_dice_many(1, 6, 500)) == set(range(1, 7))
+
+
+def test_roll_dice_many_multipliers(backend):
+    assert all(x % 2 == 0 for x in roll_dice_many(1, 8, 100, dice_mult=2))
+    assert all(x % 3 == 0 for x in roll_dice_many(1, 8, 100, 1, total_mult=3))
+    assert 1000 <= roll_dice_many(1000, 6, 1)[0] <= 6000
+
+
+def test_roll_dice_many_edge_cases(backend):
+    assert roll_dice_many(2, 6, 0) == []
+    assert roll_dice_many(0, 6, 3, modifier=4) == [4, 4, 4]
+
+
+def test_roll_dice_expr_many(backend):
+    rolls = roll_dice_expr_many("2d4-1", 200)
+    assert len(rolls) == 200
+    assert set(rolls) == set(range(1, 8))
+
+    with pytest.raises(ValueError):
+        roll_dice_expr_many("2d", 3)
+
+
+def test_dice_mult_doubles_dice_but_not_constants(backend):
+    rolls = roll_dice_expr_many("1d6+1", 500, dice_mult=2)
+    assert set(rolls) == {3, 5, 7, 9, 11, 13}
+    assert all(x % 2 == 1 for x in roll_dice_expr_many("1d4kh1-1", 50, dice_mult=2))
+    assert roll_dice_expr("1d1+1d1+3", dice_mult=2) == 7
+
+
+@pytest.mark.parametrize("expr", ["1d20", "3d6+2", "4d6kh3"])
+def test_seeded_rolls_are_the_same_on_either_backend(expr, monkeypatch):
+    pytest.importorskip("numpy")
+
+    def roll(threshold):
+        monkeypatch.setattr(dice, "numpy_threshold", threshold)
+        set_seed(1234)
+        return roll_dice_expr_many(expr, 300), roll_dice_many(2, 8, 3)
+
+    assert roll(0) == roll(10**9)
+
+
+def test_single_rolls():
+    set_seed(1)
+    assert 1 <= roll_dice(1, 20) <= 20
+    assert 4 <= roll_dice_expr("1d8+3") <= 11
+    assert (min_dice_expr("2d6-1"), max_dice_expr("2d6-1")) == (1, 11)
+    assert min_dice_expr("1d4-3", floor=1) == 1
+
+
+@pytest.mark.parametrize(
+    "expr, low, high",
+    [
+        ("3d6", 3, 18),
+        ("d20", 1, 20),
+        ("1d8+1", 2, 9),
+        ("2d4-1", 1, 7),
+        ("2d6 + 1d4 + 3", 6, 19),
+        ("-1d4+5", 1, 4),
+        ("4d6kh3", 3, 18),
+        ("4d6dl1", 3, 18),
+        ("2d20kl1", 1, 20),
+        ("2d6r1", 4, 12),
+        ("2d6ro<3", 2, 12),
+        ("d%", 1, 100),
+        ("1d6!", 1, 6 * 101),
+    ],
+)
+def test_dice_expression_bounds(expr, low, high):
+    assert (min_dice_expr(expr), max_dice_expr(expr)) == (low, high)
+    rolls = roll_dice_expr_many(expr, 200) + [roll_dice_expr(expr) for _ in range(50)]
+    assert all(low <= x <= high for x in rolls)
+
+
+def test_keep_highest_and_lowest():
+    set_seed(3)
+    advantage = roll_dice_expr_many("2d20kh1", 2000)
+    disadvantage = roll_dice_expr_many("2d20kl1", 2000)
+    assert sum(advantage) / 2000 > 12.5
+    assert sum(disadvantage) / 2000 < 8.5
+
+
+def test_rerolls_and_explosions():
+    # Rerolled faces never stick; exploded ones are never the final total
+    assert 1 not in roll_dice_expr_many("1d4r1", 200)
+    assert {1, 2}.isdisjoint(roll_dice_expr_many("1d6r<=2", 200))
+    assert 6 not in roll_dice_expr_many("1d6!", 500)
+    assert 5 not in roll_dice_expr_many("1d6!>=5", 500)
+
+
+@pytest.mark.parametrize(
+    "expr", ["", "2d", "d", "3d6+", "1d0", "goblins + 2", "2d6k", "1d6r<7", "1d6!>0"]
+)
+def test_invalid_dice_expressions(expr):
+    with pytest.raises(DiceError):
+        roll_dice_expr(expr)
+    assert not is_dice_expr(expr)
+
+
+def test_dice_expressions_are_compiled_once():
+    assert compile_dice_expr("4d6kh3") is compile_dice_expr("4d6kh3")
+    assert is_dice_expr("1d4 + 2")
+    assert not is_dice_expr("3")
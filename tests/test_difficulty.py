@@ -0,0 +1,34 @@
+from dndme.difficulty import get_difficulty, get_multiplier, rate_encounter
+
+
+def test_multiplier_depends_on_monster_count_and_party_size():
+    assert get_multiplier(1, 4) == 1
+    assert get_multiplier(4, 4) == 2
+    assert get_multiplier(15, 4) == 4
+    assert get_multiplier(1, 2) == 1.5
+    assert get_multiplier(15, 2) == 5
+    assert get_multiplier(1, 6) == 0.5
+
+
+def test_difficulty_against_party_thresholds():
+    levels = [3, 3, 3, 3]
+    assert get_difficulty(50, 1, levels) == "trivial"
+    assert get_difficulty(300, 1, levels) == "easy"
+    assert get_difficulty(400, 2, levels) == "medium"
+    assert get_difficulty(1600, 1, levels) == "deadly"
+    assert get_difficulty(1600, 1, []) is None
+
+
+def test_rate_encounter():
+    groups = {
+        "goblins": {"monster": "goblin", "count": "1d4"},
+        "boss": {"monster": "goblin", "count": 1, "xp": 200},
+        "wolves": {"monster": "wolf", "count": "goblins + players"},
+    }
+    rating = rate_encounter(
+        groups, {"goblin": 50, "wolf": 50}, [1, 1, 1], {"players": 3, "party": 3}
+    )
+    assert rating.count == (6, 12)
+    assert rating.xp == (450, 750)
+    assert rating.difficulty == ("deadly", "deadly")
+    assert rate_encounter({"x": {"monster": "goblin", "count": "1/0"}}, {}, []) is None
@@ -1,8 +1,8 @@
 from attr import attrib
 import pytest
 
-from dndme.loaders import EncounterLoader
-from dndme.models import Combat
+from dndme.loaders import EncounterLoader, MonsterCache, MonsterIndex, MonsterLoader
+from dndme.models import Combat, Encounter
 
 
 @pytest.fixture
@@ -21,3 +21,116 @@ def test_get_available_encounters(encounter_loader):
     assert available_encounters[0].name == "LMoP 1.1.1: Goblin Ambush"
     assert "goblins" in available_encounters[0].groups
     assert available_encounters[0].groups["goblins"]["count"] == 4
+
+
+def test_get_encounter_summaries(tmp_path):
+    for i, (name, location) in enumerate(
+        [
+            ("Goblin Ambush", "Triboar Trail"),
+            ("Old Owl Well", "Wilderness"),
+            ("Goblin Den", "Cragmaw Hideout"),
+        ]
+    ):
+        (tmp_path / f"{i}.toml").write_text(
+            f'name = "{name}"\nlocation = "{location}"\n\n'
+            '[groups.goblins]\nmonster = "goblin"\ncount = "1d4"\n'
+        )
+    encounter_loader = EncounterLoader(
+        base_dir=str(tmp_path), monster_loader=None, combat=Combat()
+    )
+
+    summaries = encounter_loader.get_encounter_summaries("GOBLIN")
+    assert [x.name for x in summaries] == ["Goblin Ambush", "Goblin Den"]
+    assert summaries[0].groups == {"goblins": {"monster": "goblin", "count": "1d4"}}
+    assert summaries[0].count_range == (1, 4)
+    assert [x.name for x in encounter_loader.get_encounter_summaries("wild")] == [
+        "Old Owl Well"
+    ]
+    assert [x.name for x in encounter_loader.get_encounter_summaries("go*den")] == [
+        "Goblin Den"
+    ]
+    assert [x.name for x in encounter_loader.get_encounter_summaries("ow")] == [
+        "Old Owl Well"
+    ]
+
+    encounter = encounter_loader.get_encounter(summaries[1])
+    assert encounter.location == "Cragmaw Hideout"
+
+
+@pytest.fixture
+def orc_loader(tmp_path):
+    monsters = tmp_path / "monsters"
+    monsters.mkdir()
+    (monsters / "orc.toml").write_text(
+        'name = "orc"\nmax_hp = 15\nspecies = "orc"\n\n'
+        '[actions.greataxe]\nname = "Greataxe"\n\n[actions.javelin]\nname = "Javelin"\n'
+    )
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"), pattern=f"{monsters}/*.toml"
+    )
+    return MonsterLoader(
+        image_loader=None, index=index, cache=MonsterCache(), lazy=True
+    )
+
+
+def test_group_overrides_are_applied(orc_loader):
+    encounter = Encounter(
+        name="Orc Camp",
+        groups={
+            "orcs": {
+                "monster": "orc",
+                "count": 3,
+                "alias": ["Grug", "Thok"],
+                "max_hp": [20, 21, 22],
+                "race": "half-orc",
+                "ac": 15,
+                "traits": {"rage": {"name": "Rage"}},
+                "remove": ["actions.javelin"],
+            },
+            "chief": {"monster": "orc", "count": 1, "name": "Chief", "max_hp": 93},
+        },
+    )
+    encounter_loader = EncounterLoader(None, orc_loader, Combat())
+    grug, thok, third, chief = encounter_loader.load(encounter)
+
+    assert (grug.alias, thok.alias, third.alias) == ("Grug", "Thok", "Orc 3")
+    assert [x.max_hp for x in (grug, thok, third)] == [20, 21, 22]
+    assert (grug.species, grug.ac) == ("half-orc", 15)
+    assert list(grug.traits) == ["rage"]
+    assert list(grug.actions) == ["greataxe"]
+    assert (chief.name, chief.max_hp, chief.species) == ("Chief", 93, "orc")
+    assert list(chief.actions) == ["greataxe", "javelin"]
+
+
+def test_plans_are_compiled_once(tmp_path, orc_loader):
+    (tmp_path / "camp.toml").write_text(
+        'name = "Orc Camp"\n\n[groups.orcs]\nmonster = "orc"\ncount = 2\n'
+    )
+    encounter_loader = EncounterLoader(str(tmp_path), orc_loader, Combat())
+    summary = encounter_loader.get_encounter_summaries()[0]
+
+    encounter = encounter_loader.get_encounter(summary)
+    plan = encounter_loader.get_plan(encounter)
+    assert len(encounter_loader.load(encounter)) == 2
+
+    assert encounter_loader.get_encounter(summary) is encounter
+    assert encounter_loader.get_plan(encounter) is plan
+
+
+def test_prefetch_warms_encounters_and_monsters(tmp_path, orc_loader):
+    (tmp_path / "camp.toml").write_text(
+        'name = "Orc Camp"\n\n[groups.orcs]\nmonster = "orc"\ncount = 2\n'
+    )
+    encounter_loader = EncounterLoader(str(tmp_path), orc_loader, Combat())
+    summaries = encounter_loader.get_encounter_summaries()
+
+    prefetcher = encounter_loader.prefetch(summaries)
+    prefetcher.thread.join()
+    prefetcher.stop()
+    misses = orc_loader.cache.misses
+    assert misses == 1
+
+    encounter = encounter_loader.get_encounter(summaries[0])
+    assert encounter._plan is not None
+    assert len(encounter_loader.load(encounter)) == 2
+    assert orc_loader.cache.misses == misses
@@ -0,0 +1,83 @@
+import filecmp
+import re
+
+import pytoml as toml
+
+from dndme.counts import count_range, get_party_counts
+from dndme.generate_content import generate_campaign, generate_content_pack
+from dndme.loaders import (
+    EncounterLoader,
+    MonsterCache,
+    MonsterIndex,
+    MonsterLoader,
+    PartyLoader,
+)
+from dndme.models import Combat
+from dndme.schemas import validate_calendar, validate_party
+
+
+def test_generated_content_is_deterministic(tmp_path):
+    for run in ("a", "b"):
+        generate_content_pack(str(tmp_path / run / "gen"), 7, 30, 10)
+        generate_campaign(
+            str(tmp_path / run / "campaign"), str(tmp_path / run / "gen"), 7, 5, 20, 12
+        )
+
+    for directory in ("gen/monsters", "gen/encounters", "campaign"):
+        # Settings have the output's paths in them, so differ by design
+        comparison = filecmp.dircmp(
+            tmp_path / "a" / directory,
+            tmp_path / "b" / directory,
+            ignore=["settings.toml"],
+        )
+        assert comparison.left_list
+        assert not comparison.diff_files
+        assert not comparison.left_only and not comparison.right_only
+
+
+def test_generated_content_loads(tmp_path):
+    content_dir = tmp_path / "gen"
+    names = generate_content_pack(str(content_dir), 1, 50, 20)
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"),
+        pattern=f"{content_dir}/monsters/*.toml",
+    )
+    monster_loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+
+    # Every monster, variants included, loads
+    assert len(names) == 50
+    index.refresh()
+    assert any(index.get_chain(x)[:-1] for x in index.get_filenames())
+    for name in names:
+        assert monster_loader.load(name)[0].name == name
+
+    generate_campaign(str(tmp_path / "campaign"), str(content_dir), 1, 6, 1, 12)
+    combat = Combat()
+    PartyLoader(str(tmp_path / "campaign" / "party.toml")).load(combat)
+    party_counts = get_party_counts(combat.characters.values())
+
+    encounter_loader = EncounterLoader(
+        str(content_dir / "encounters"), monster_loader, combat
+    )
+    for summary in encounter_loader.get_encounter_summaries():
+        encounter = encounter_loader.get_encounter(summary)
+        low, high = count_range(encounter.groups, party_counts)
+        assert low <= len(encounter_loader.load(encounter)) <= high
+
+
+def test_generated_campaign(tmp_path):
+    campaign_dir = tmp_path / "campaign"
+    generate_campaign(str(campaign_dir), str(tmp_path / "gen"), 3, 25, 40, 30)
+
+    party = validate_party(toml.load(open(campaign_dir / "party.toml")))
+    assert len(party) == 25
+    calendar = validate_calendar(toml.load(open(campaign_dir / "calendar.toml")))
+    assert len(calendar["months"]) == 30
+
+    # The shell picks up where the log's last session ended
+    with open(campaign_dir / "log.md") as fin:
+        ended = [x for x in fin if "Session ended" in x]
+    assert len(ended) == 40
+    m = re.match(r".* (\d+ \w+ \d+) at (.+) at ([0-9\.\-]+)", ended[-1])
+    day, month, _ = m.group(1).split()
+    assert month.lower() in calendar["months"]
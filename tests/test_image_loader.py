@@ -0,0 +1,85 @@
+import pytest
+
+from dndme import content_path
+from dndme.loaders import AssetIndex, ImageLoader
+from dndme.models import Game
+
+
+@pytest.fixture
+def images(tmp_path):
+    for pack, names in [
+        ("pack1", ["Orc.png", "ogre.jpg", ".hidden.png"]),
+        ("pack2", ["orc.png", "owlbear.gif"]),
+    ]:
+        monsters = tmp_path / pack / "images" / "monsters"
+        monsters.mkdir(parents=True)
+        for name in names:
+            (monsters / name).write_text("")
+    return f"{tmp_path}/*/images/monsters"
+
+
+def test_resolve(images, tmp_path):
+    assets = AssetIndex()
+    assert assets.resolve(images, "orc.png") == (
+        f"/static/{str(tmp_path).lstrip('/')}/pack2/images/monsters/orc.png"
+    )
+    assert assets.resolve(images, ".hidden.png") == ""
+    assert assets.resolve(images, "beholder.png") == ""
+
+
+def test_complete(images):
+    assets = AssetIndex()
+    assert assets.complete(images, "o") == [
+        "ogre.jpg",
+        "Orc.png",
+        "orc.png",
+        "owlbear.gif",
+    ]
+    assert assets.complete(images, "OR") == ["Orc.png", "orc.png"]
+    assert assets.complete(images, "x") == []
+
+
+def test_refreshes_changed_directories(images, tmp_path):
+    assets = AssetIndex()
+    assert assets.complete(images, "gob") == []
+    (tmp_path / "pack2" / "images" / "monsters" / "goblin.png").write_text("")
+    assert assets.complete(images, "gob") == ["goblin.png"]
+
+
+def test_patterns_in_order_of_precedence(images, tmp_path):
+    (tmp_path / "pack2" / "images" / "monsters" / "ogre.jpg").write_text("")
+    assets = AssetIndex()
+    assert "/pack1/" in assets.resolve(images, "ogre.jpg")
+
+    patterns = [f"{tmp_path}/pack2/images/monsters", images]
+    assert "/pack2/" in assets.resolve(patterns, "ogre.jpg")
+    assert "/pack1/" in assets.resolve(patterns, "Orc.png")
+
+
+def test_monster_images_follow_content_path(images, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_path, "_current_content_path", (f"{tmp_path}/pack1",))
+    image_loader = ImageLoader(game=None, assets=AssetIndex())
+    assert image_loader.get_monster_image_path("ogre.jpg").endswith(
+        "/pack1/images/monsters/ogre.jpg"
+    )
+    assert image_loader.get_monster_image_path("owlbear.gif") == ""
+
+
+def test_monster_image_urls_are_relative_to_base_dir(images, tmp_path, monkeypatch):
+    # The shell puts the campaign's content path under its base dir
+    monkeypatch.setattr(content_path, "_current_content_path", (f"{tmp_path}/pack1",))
+    game = Game(
+        base_dir=str(tmp_path),
+        encounters_dir=None,
+        party_file=None,
+        log_file=None,
+        calendar=None,
+        clock=None,
+        almanac=None,
+        latitude=None,
+    )
+    image_loader = ImageLoader(game, assets=AssetIndex())
+    assert (
+        image_loader.get_monster_image_path("ogre.jpg")
+        == "/static/pack1/images/monsters/ogre.jpg"
+    )
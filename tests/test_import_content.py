@@ -0,0 +1,196 @@
+import io
+import json
+
+import pytest
+
+from dndme.bundle import ContentBundle, ContentBundles, bundle_filename
+from dndme.import_content import (
+    PackBundleWriter,
+    TomlWriter,
+    convert_record,
+    import_records,
+    read_csv_records,
+    read_json_records,
+)
+from dndme.loaders import MonsterCache, MonsterIndex, MonsterLoader
+
+srd_api_goblin = {
+    "index": "goblin",
+    "name": "Goblin",
+    "size": "Small",
+    "type": "humanoid",
+    "subtype": "goblinoid",
+    "alignment": "neutral evil",
+    "armor_class": [
+        {
+            "type": "armor",
+            "value": 15,
+            "armor": [{"name": "Leather Armor"}, {"name": "Shield"}],
+        }
+    ],
+    "hit_points": 7,
+    "hit_dice": "2d6",
+    "hit_points_roll": "2d6",
+    "speed": {"walk": "30 ft."},
+    "strength": 8,
+    "dexterity": 14,
+    "constitution": 10,
+    "intelligence": 10,
+    "wisdom": 8,
+    "charisma": 8,
+    "proficiencies": [
+        {
+            "value": 6,
+            "proficiency": {"index": "skill-stealth", "name": "Skill: Stealth"},
+        }
+    ],
+    "damage_vulnerabilities": [],
+    "damage_resistances": [],
+    "damage_immunities": [],
+    "condition_immunities": [],
+    "senses": {"darkvision": "60 ft.", "passive_perception": 9},
+    "languages": "Common, Goblin",
+    "challenge_rating": 0.25,
+    "proficiency_bonus": 2,
+    "xp": 50,
+    "special_abilities": [
+        {"name": "Nimble Escape", "desc": "The goblin can take the Disengage..."}
+    ],
+    "actions": [{"name": "Scimitar", "desc": "Melee Weapon Attack: +4 to hit..."}],
+}
+
+open5e_wolf = {
+    "slug": "wolf",
+    "name": "Wolf",
+    "size": "Medium",
+    "type": "beast",
+    "subtype": "",
+    "alignment": "unaligned",
+    "armor_class": 13,
+    "armor_desc": "natural armor",
+    "hit_points": 11,
+    "hit_dice": "2d8+2",
+    "speed": {"walk": 40},
+    "strength": 12,
+    "dexterity": 15,
+    "constitution": 12,
+    "intelligence": 3,
+    "wisdom": 12,
+    "charisma": 6,
+    "skills": {"perception": 3, "stealth": 4},
+    "senses": "passive Perception 13",
+    "languages": "",
+    "challenge_rating": "1/4",
+    "actions": [{"name": "Bite", "desc": "Melee Weapon Attack: +4 to hit..."}],
+}
+
+
+@pytest.mark.parametrize("jsonl", [False, True])
+def test_read_json_records_streams(jsonl):
+    records = [{"name": f"monster {i}", "notes": "x" * i} for i in range(50)]
+    if jsonl:
+        text = "\n".join(json.dumps(x) for x in records)
+    else:
+        text = json.dumps(records, indent=2)
+
+    # A tiny chunk size makes records span many reads
+    assert list(read_json_records(io.StringIO(text), chunk_size=7)) == records
+
+
+def test_read_json_records_rejects_truncated_file():
+    with pytest.raises(json.JSONDecodeError):
+        list(read_json_records(io.StringIO('[{"name": "orc"}, {"name": '), 4))
+
+
+def test_read_csv_records():
+    text = "name,hit_points,challenge_rating,languages\nOrc,15,1/2,\n"
+    assert list(read_csv_records(io.StringIO(text))) == [
+        {"name": "Orc", "hit_points": 15, "challenge_rating": "1/2"}
+    ]
+
+
+def test_convert_srd_api_record():
+    data = convert_record(srd_api_goblin)
+    assert data["name"] == "goblin"
+    assert data["size"] == "small"
+    assert data["mtype"] == "humanoid:goblinoid"
+    assert (data["ac"], data["armor"]) == (15, "Leather Armor, Shield")
+    assert (data["max_hp"], data["avg_hp"]) == ("2d6", 7)
+    assert data["speed"] == 30
+    assert data["dex"] == 14
+    assert data["skills"] == {"stealth": 6}
+    assert data["senses"] == {"darkvision": 60, "perception": 9}
+    assert (data["cr"], data["xp"], data["pb"]) == (0.25, 50, 2)
+    assert data["traits"]["nimble_escape"]["name"] == "Nimble Escape"
+    assert data["actions"]["scimitar"]["description"].startswith("Melee")
+    assert "immune" not in data
+
+
+def test_convert_open5e_record():
+    data = convert_record(open5e_wolf)
+    assert data["mtype"] == "beast"
+    assert (data["ac"], data["armor"]) == (13, "natural armor")
+    assert data["max_hp"] == "2d8+2"
+    assert data["speed"] == 40
+    assert data["skills"] == {"perception": 3, "stealth": 4}
+    assert data["senses"] == {"perception": 13}
+    # No xp in the record, so it comes from the CR
+    assert (data["cr"], data["xp"]) == (0.25, 50)
+
+
+def test_convert_record_requires_name():
+    with pytest.raises(ValueError):
+        convert_record({"hit_points": 5})
+
+
+def test_import_to_toml_files(tmp_path, capsys):
+    pack_dir = tmp_path / "content" / "imported"
+    records = [srd_api_goblin, open5e_wolf, {"size": "huge"}, open5e_wolf] * 20
+    records = [dict(x, name=f"{x.get('name')} {i}") for i, x in enumerate(records)]
+    records[2].pop("name")
+
+    counts = import_records(
+        iter(records), TomlWriter(str(pack_dir)), as_toml=True, jobs=2, batch_size=8
+    )
+
+    assert counts == {"imported": 79, "failed": 1}
+    assert "Record 3 (unnamed)" in capsys.readouterr().out
+
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"),
+        pattern=f"{pack_dir}/monsters/*.toml",
+    )
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+    wolf = loader.load("wolf_77")[0]
+    assert (wolf.ac, wolf.str, wolf.cr) == (13, 12, 0.25)
+
+
+def test_import_to_bundle(tmp_path):
+    pack_dir = tmp_path / "content" / "imported"
+    writer = PackBundleWriter(str(pack_dir))
+
+    counts = import_records(iter([srd_api_goblin, open5e_wolf]), writer, as_toml=True)
+    writer.close()
+
+    assert counts == {"imported": 2, "failed": 0}
+    assert (pack_dir / "monsters" / "wolf.toml").exists()
+    bundle = ContentBundle(str(pack_dir / bundle_filename))
+    assert bundle.is_fresh()
+    assert bundle.get_monster("wolf")["max_hp"] == "2d8+2"
+
+    # The TOML files are there for the index, and to fall back to once
+    # the bundle goes stale
+    (pack_dir / "encounters").mkdir()
+    (pack_dir / "encounters" / "den.toml").write_text('name = "Wolf Den"\n')
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"),
+        pattern=f"{tmp_path}/content/*/monsters/*.toml",
+    )
+    loader = MonsterLoader(
+        image_loader=None,
+        index=index,
+        cache=MonsterCache(),
+        bundles=ContentBundles(content_path=[f"{tmp_path}/content/*"]),
+    )
+    assert index.get_xp_table()["wolf"] == 50
+    assert loader.load("wolf")[0].ac == 13
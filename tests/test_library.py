@@ -0,0 +1,81 @@
+import pytest
+
+from dndme import content_path
+from dndme.library import ContentLibrary, parse_range
+
+
+@pytest.fixture
+def library(tmp_path):
+    library = ContentLibrary(
+        str(tmp_path / "library.sqlite"),
+        monster_files="content/example/monsters/*.toml",
+        encounter_files="content/example/encounters/*.toml",
+    )
+    library.sync()
+    yield library
+    library.close()
+
+
+def test_parse_range():
+    assert parse_range("2") == (2, 2)
+    assert parse_range("1/4-1") == (0.25, 1)
+    assert parse_range("-5") == (None, 5)
+    assert parse_range("8-") == (8, None)
+
+
+def test_find_monsters_by_stats(library):
+    assert [x["name"] for x in library.find_monsters(["cr:0-1"])] == [
+        "goblin",
+        "skeleton",
+        "evil_mage",
+    ]
+    assert [x["name"] for x in library.find_monsters(["type:undead"])] == ["skeleton"]
+    assert [x["name"] for x in library.find_monsters(["speed:fly", "cr:5-"])] == [
+        "young_green_dragon"
+    ]
+
+
+def test_find_monsters_by_text(library):
+    assert [x["name"] for x in library.find_monsters(["poison", "breath"])] == [
+        "young_green_dragon"
+    ]
+
+
+def test_find_encounters(library):
+    assert [x["name"] for x in library.find_encounters(["owl"])] == [
+        "LMoP 3.1.1: Old Owl Well"
+    ]
+    assert [x["name"] for x in library.find_encounters(["type:undead"])] == [
+        "Test Monster Counts"
+    ]
+
+
+def test_unknown_filter(library):
+    with pytest.raises(ValueError):
+        library.find_monsters(["colour:blue"])
+
+
+def test_defaults_to_content_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_path, "_current_content_path", ("content/example",))
+    library = ContentLibrary(str(tmp_path / "library.sqlite"))
+    assert library.monster_files == ["content/example/monsters/*.toml"]
+    library.sync()
+    assert [x["name"] for x in library.find_monsters(["cr:0-1"])] == [
+        "goblin",
+        "skeleton",
+        "evil_mage",
+    ]
+    library.close()
+
+
+def test_invalid_encounters_are_left_out(tmp_path):
+    (tmp_path / "good.toml").write_text('name = "Good Camp"\n')
+    (tmp_path / "bad.toml").write_text('name = "Bad Camp"\nmonsters = 3\n')
+    library = ContentLibrary(
+        str(tmp_path / "library.sqlite"),
+        monster_files=f"{tmp_path}/none/*.toml",
+        encounter_files=f"{tmp_path}/*.toml",
+    )
+    library.sync()
+    assert [x["name"] for x in library.find_encounters(["camp"])] == ["Good Camp"]
+    library.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from dndme.commands.load import Load
+from dndme.models import Combat, Game
+
+
+@pytest.fixture
+def load(tmp_path):
+    game = Game(
+        base_dir=".",
+        encounters_dir="content/example/encounters",
+        party_file=None,
+        log_file=None,
+        calendar=None,
+        clock=None,
+        almanac=None,
+        latitude=None,
+        content_library=str(tmp_path / "library.sqlite"),
+    )
+    game.combat = Combat()
+    return Load(game, session=None, player_view=None)
+
+
+def test_words_that_arent_monsters_are_searched_for(load, monkeypatch):
+    calls = []
+    monkeypatch.setattr(load, "load_monster", lambda name: calls.append(("load", name)))
+    monkeypatch.setattr(
+        load, "find_monster", lambda terms: calls.append(("find", terms))
+    )
+
+    load.do_command("monster", "goblin")
+    load.do_command("monster", "breath")
+    load.do_command("monster", "type:undead")
+    assert calls == [
+        ("load", "goblin"),
+        ("find", ("breath",)),
+        ("find", ("type:undead",)),
+    ]
+
+
+def test_library_syncs_once_per_command(load, monkeypatch):
+    syncs = []
+    library = load.library
+    monkeypatch.setattr(library, "sync", lambda: syncs.append(1))
+    monkeypatch.setattr(load, "find_monster", lambda terms: load.library)
+
+    load.do_command("monster", "breath")
+    assert len(syncs) == 1
+    load.do_command("monster", "type:undead")
+    assert len(syncs) == 2
+
+
+def test_library_includes_campaign_encounters(load, tmp_path, monkeypatch, capsys):
+    encounters_dir = tmp_path / "campaign" / "encounters"
+    encounters_dir.mkdir(parents=True)
+    (encounters_dir / "ambush.toml").write_text(
+        'name = "Roadside Ambush"\nlocation = "Triboar Trail"\n\n'
+        '[groups.goblins]\nmonster = "goblin"\ncount = 4\n'
+    )
+    load.game.encounters_dir = str(encounters_dir)
+    monkeypatch.setattr(load, "safe_input", lambda *args, **kwargs: 0)
+
+    load.do_command("encounter")
+    out = capsys.readouterr().out
+    assert "1: Roadside Ambush (Triboar Trail)" in out
+    assert "No available encounters found." not in out
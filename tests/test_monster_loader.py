@@ -0,0 +1,220 @@
+import os
+
+import pytest
+
+from dndme.loaders import MonsterCache, MonsterIndex, MonsterLoader, load_toml_files
+from dndme.variants import VariantError
+
+
+def write_monster(path, name, hp=7):
+    path.write_text(f'name = "{name}"\nmax_hp = {hp}\n')
+
+
+@pytest.fixture
+def monster_dir(tmp_path):
+    monsters = tmp_path / "pack" / "monsters"
+    monsters.mkdir(parents=True)
+    write_monster(monsters / "goblin.toml", "goblin")
+    write_monster(monsters / "orc.toml", "orc", hp=15)
+    return monsters
+
+
+@pytest.fixture
+def index(tmp_path, monster_dir):
+    return MonsterIndex(
+        index_file=str(tmp_path / "index.json"), pattern=f"{monster_dir}/*.toml"
+    )
+
+
+def test_index_lookup(index, monster_dir):
+    assert index.lookup("orc") == f"{monster_dir}/orc.toml"
+    assert index.lookup("owlbear") is None
+
+
+def test_index_persists(index, tmp_path, monster_dir):
+    index.refresh()
+    reloaded = MonsterIndex(index_file=index.index_file, pattern=index.pattern)
+    reloaded.load()
+    assert reloaded.names == {
+        "goblin": f"{monster_dir}/goblin.toml",
+        "orc": f"{monster_dir}/orc.toml",
+    }
+
+
+def test_index_only_reparses_changed_files(index, monster_dir, monkeypatch):
+    index.refresh()
+    parsed = []
+    original = index.summarize
+    monkeypatch.setattr(
+        index, "summarize", lambda data: parsed.append(data["name"]) or original(data)
+    )
+
+    write_monster(monster_dir / "orc.toml", "orc_chieftain", hp=93)
+    index.refresh()
+
+    assert parsed == ["orc_chieftain"]
+    assert index.lookup("orc") is None
+    assert index.lookup("orc_chieftain") == f"{monster_dir}/orc.toml"
+
+
+def test_loader_uses_index(index):
+    loader = MonsterLoader(image_loader=None, index=index)
+    monsters = loader.load("orc", count=2)
+    assert [m.max_hp for m in monsters] == [15, 15]
+
+
+def test_cache_hits_and_invalidation(tmp_path):
+    cache = MonsterCache(maxsize=2)
+    monster_file = tmp_path / "orc.toml"
+    write_monster(monster_file, "orc", hp=15)
+
+    assert cache.get(str(monster_file))["max_hp"] == 15
+    assert cache.get(str(monster_file))["max_hp"] == 15
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    write_monster(monster_file, "orc", hp=150)
+    assert cache.get(str(monster_file))["max_hp"] == 150
+    assert cache.misses == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = MonsterCache(maxsize=2)
+    for name in ("goblin", "orc", "ogre"):
+        write_monster(tmp_path / f"{name}.toml", name)
+        cache.get(str(tmp_path / f"{name}.toml"))
+
+    assert list(cache.entries) == [
+        str(tmp_path / "orc.toml"),
+        str(tmp_path / "ogre.toml"),
+    ]
+
+
+def test_loaded_monsters_do_not_share_sections(index, tmp_path):
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+    first, second = loader.load("goblin", count=2)
+    first.traits["nimble"] = {"name": "Nimble Escape"}
+    assert second.traits == {}
+    assert loader.load("goblin")[0].traits == {}
+
+
+def test_lazy_monsters_load_sections_on_first_access(index, monster_dir):
+    (monster_dir / "orc.toml").write_text(
+        'name = "orc"\nmax_hp = 15\nnotes = "Grr."\n\n'
+        '[actions.greataxe]\nname = "Greataxe"\ndescription = "Chop."\n'
+    )
+    loader = MonsterLoader(image_loader=None, index=index, lazy=True)
+    orc, other_orc = loader.load("orc", count=2)
+
+    assert orc.max_hp == 15
+    assert "actions" not in orc.__dict__
+
+    assert orc.actions["greataxe"]["name"] == "Greataxe"
+    assert orc.notes == "Grr."
+    assert orc.traits == {}
+
+    orc.actions.pop("greataxe")
+    assert "greataxe" in other_orc.actions
+
+
+def test_load_toml_files_in_parallel(monster_dir):
+    for i in range(10):
+        write_monster(monster_dir / f"kobold{i}.toml", f"kobold{i}")
+    (monster_dir / "broken.toml").write_text("name = ")
+    filenames = sorted(str(x) for x in monster_dir.iterdir())
+
+    results = load_toml_files(
+        filenames, transform=MonsterIndex.summarize, jobs=2, chunk_size=4
+    )
+
+    assert [x[0] for x in results] == filenames
+    assert results[-1][1] == {"name": "orc", "inherits": None, "cr": None, "xp": None}
+    errors = [error for _, _, error in results if error]
+    assert [x.filename for x in errors] == [f"{monster_dir}/broken.toml"]
+    assert (errors[0].kind, errors[0].line) == ("TomlError", 1)
+
+
+def write_goblin_variants(monster_dir):
+    (monster_dir / "goblin.toml").write_text(
+        'name = "goblin"\nmax_hp = 7\ngear = "Scimitar"\n\n'
+        '[traits.nimble]\nname = "Nimble Escape"\n\n'
+        '[actions.scimitar]\nname = "Scimitar"\n'
+    )
+    (monster_dir / "goblin_boss.toml").write_text(
+        'name = "goblin boss"\ninherits = "goblin"\nmax_hp = 21\n'
+        'remove = ["gear", "actions.scimitar"]\n\n'
+        '[actions.redirect]\nname = "Redirect Attack"\n'
+    )
+    (monster_dir / "goblin_warlord.toml").write_text(
+        'name = "goblin warlord"\ninherits = "goblin boss"\nac = 17\n'
+    )
+
+
+def test_variants_inherit_and_override(index, monster_dir):
+    write_goblin_variants(monster_dir)
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+    warlord = loader.load("goblin warlord")[0]
+
+    assert (warlord.name, warlord.max_hp, warlord.ac) == ("goblin warlord", 21, 17)
+    assert list(warlord.traits) == ["nimble"]
+    assert list(warlord.actions) == ["redirect"]
+    assert warlord.gear == ""
+    assert index.get_chain(index.lookup("goblin warlord")) == [
+        f"{monster_dir}/goblin.toml",
+        f"{monster_dir}/goblin_boss.toml",
+        f"{monster_dir}/goblin_warlord.toml",
+    ]
+
+
+def test_variants_reload_when_an_ancestor_changes(index, monster_dir):
+    write_goblin_variants(monster_dir)
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+    assert loader.load("goblin warlord")[0].traits["nimble"]["name"] == "Nimble Escape"
+    assert loader.cache.get_flattened(index.get_chain(index.lookup("goblin boss")))
+
+    (monster_dir / "goblin.toml").write_text(
+        'name = "goblin"\n\n[traits.nimble]\nname = "Nimbler Escape"\n'
+    )
+    assert loader.load("goblin warlord")[0].traits["nimble"]["name"] == "Nimbler Escape"
+
+
+def test_variant_loops_are_reported(index, monster_dir):
+    (monster_dir / "orc.toml").write_text('name = "orc"\ninherits = "half-orc"\n')
+    (monster_dir / "half_orc.toml").write_text('name = "half-orc"\ninherits = "orc"\n')
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+    with pytest.raises(VariantError, match="loop"):
+        loader.load("orc")
+
+
+def test_index_keeps_xp_for_variants(index, monster_dir):
+    write_goblin_variants(monster_dir)
+    (monster_dir / "goblin.toml").write_text('name = "goblin"\nxp = 50\n')
+    (monster_dir / "goblin_warlord.toml").write_text(
+        'name = "goblin warlord"\ninherits = "goblin boss"\nxp = 450\n'
+    )
+    xp = index.get_xp_table()
+    assert (xp["goblin"], xp["goblin boss"], xp["goblin warlord"]) == (50, 50, 450)
+    assert xp["orc"] == 0
+
+
+def test_content_path_precedence_and_shadowing(tmp_path):
+    for pack, hp in (("core", 7), ("homebrew", 70)):
+        (tmp_path / pack / "monsters").mkdir(parents=True)
+        write_monster(tmp_path / pack / "monsters" / "goblin.toml", "goblin", hp=hp)
+    write_monster(tmp_path / "core" / "monsters" / "orc.toml", "orc", hp=15)
+
+    index = MonsterIndex(index_file=str(tmp_path / "index.json"))
+    index.set_content_path([f"{tmp_path}/homebrew", f"{tmp_path}/*"])
+    loader = MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+
+    assert loader.load("goblin")[0].max_hp == 70
+    assert loader.load("orc")[0].max_hp == 15
+    assert index.get_shadowed() == [
+        (
+            "goblin",
+            f"{tmp_path}/homebrew/monsters/goblin.toml",
+            [f"{tmp_path}/core/monsters/goblin.toml"],
+        )
+    ]
+
+    index.set_content_path([f"{tmp_path}/core", f"{tmp_path}/homebrew"])
+    assert loader.load("goblin")[0].max_hp == 7
@@ -0,0 +1,84 @@
+from itertools import product
+
+import pytest
+
+from dndme import probability
+from dndme.probability import get_attack_odds, get_distribution
+
+
+def brute_force(sides, times, total=sum):
+    outcomes = [total(x) for x in product(range(1, sides + 1), repeat=times)]
+    return {x: outcomes.count(x) / len(outcomes) for x in set(outcomes)}
+
+
+@pytest.mark.parametrize(
+    "expr, expected",
+    [
+        ("3d6", brute_force(6, 3)),
+        ("4d6kh3", brute_force(6, 4, lambda x: sum(sorted(x)[1:]))),
+        ("4d6dl1", brute_force(6, 4, lambda x: sum(sorted(x)[1:]))),
+        ("3d4kl2", brute_force(4, 3, lambda x: sum(sorted(x)[:2]))),
+        ("2d20kh1", brute_force(20, 2, max)),
+    ],
+)
+def test_distributions_match_brute_force(expr, expected):
+    distribution = get_distribution(expr)
+    assert (distribution.min, distribution.max) == (min(expected), max(expected))
+    for value, p in expected.items():
+        assert distribution.probability(value) == pytest.approx(p)
+
+
+@pytest.mark.parametrize(
+    "expr, mean",
+    [
+        ("1d20+5", 15.5),
+        ("2d6+1d4+3", 12.5),
+        ("-1d4+5", 2.5),
+        ("100d6", 350),
+        ("2d6ro<3", 8 + 1 / 3),
+        ("2d6r1", 8),
+        ("1d6!", 4.2),
+        ("1d10!>=9", 6.875),
+    ],
+)
+def test_distribution_means(expr, mean):
+    distribution = get_distribution(expr)
+    assert sum(distribution.probabilities) == pytest.approx(1)
+    assert distribution.mean == pytest.approx(mean)
+
+
+def test_distribution_queries():
+    distribution = get_distribution("1d20+5")
+    assert distribution.at_least(15) == pytest.approx(0.55)
+    assert distribution.at_least(6) == pytest.approx(1)
+    assert distribution.at_least(26) == 0
+    assert distribution.at_most(5) == 0
+    assert distribution.percentile(50) == 15
+    assert get_distribution("8d6").percentile(50) == 28
+    assert get_distribution("1d20").rank(11) == pytest.approx(52.5)
+
+
+def test_rerolled_faces_are_impossible():
+    distribution = get_distribution("2d6r1")
+    assert distribution.min == 4
+    assert distribution.probability(3) == 0
+
+
+def test_attack_odds():
+    assert get_attack_odds(5, 15) == pytest.approx((0.55, 0.05))
+    # Advantage and disadvantage
+    assert get_attack_odds(5, 15, "2d20kh1") == pytest.approx((0.7975, 0.0975))
+    assert get_attack_odds(5, 15, "2d20kl1") == pytest.approx((0.3025, 0.0025))
+    # Natural 20s always hit and natural 1s always miss
+    assert get_attack_odds(0, 30) == pytest.approx((0.05, 0.05))
+    assert get_attack_odds(20, 5) == pytest.approx((0.95, 0.05))
+    # Expanded crit range
+    assert get_attack_odds(5, 15, crit=19) == pytest.approx((0.55, 0.1))
+
+
+def test_distributions_are_memoized(monkeypatch):
+    get_distribution("7d8+3")
+    monkeypatch.setattr(
+        probability, "convolve", lambda a, b: pytest.fail("not memoized")
+    )
+    assert get_distribution("7d8+3").mean == pytest.approx(34.5)
@@ -0,0 +1,120 @@
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from dndme.dice import roll_dice_expr, roll_dice_expr_many, roll_dice_many
+from dndme.loaders import (
+    EncounterLoader,
+    MonsterCache,
+    MonsterIndex,
+    MonsterLoader,
+    load_toml_files,
+)
+from dndme.models import Combat, Encounter
+from dndme.rng import (
+    RandomStream,
+    current_stream,
+    get_seed,
+    get_stream,
+    set_seed,
+    use_stream,
+)
+
+
+def roll_in_worker(stream):
+    return roll_dice_expr_many("4d6kh3", 20, stream=stream)
+
+
+def test_streams_are_reproducible():
+    a = RandomStream(42).child("combat", 1)
+    b = RandomStream(42).child("combat", 1)
+    assert roll_dice_expr_many("3d6", 50, stream=a) == roll_dice_expr_many(
+        "3d6", 50, stream=b
+    )
+    assert roll_dice_many(1, 20, 50, stream=RandomStream(42)) != roll_dice_many(
+        1, 20, 50, stream=RandomStream(43)
+    )
+
+
+def test_child_streams_are_independent():
+    root = RandomStream(7)
+    first = roll_dice_many(1, 20, 20, stream=root.child("goblins"))
+
+    # Using other streams, including the parent, first doesn't matter
+    root = RandomStream(7)
+    roll_dice_many(1, 20, 100, stream=root)
+    roll_dice_many(1, 20, 100, stream=root.child("orcs"))
+    assert roll_dice_many(1, 20, 20, stream=root.child("goblins")) == first
+    assert roll_dice_many(1, 20, 20, stream=root.child("orcs")) != first
+
+    # The same name gives the same stream, which carries on where it left off
+    assert root.child("goblins") is root.child("goblins")
+    assert root.spawn("combat").path == ("combat", 1)
+    assert root.spawn("combat").path == ("combat", 2)
+    assert root.spawn("encounter").path == ("encounter", 1)
+    assert root.spawn("combat").path == ("combat", 3)
+
+
+def test_loading_content_does_not_move_combat_streams(tmp_path):
+    filename = tmp_path / "goblin.toml"
+    filename.write_text('name = "goblin"\n')
+
+    set_seed(7)
+    load_toml_files([filename] * 3)
+    load_toml_files([filename])
+    assert Combat().rng.path == ("combat", 1)
+
+
+def test_use_stream():
+    set_seed(99)
+    assert get_seed() == 99
+    assert current_stream() is get_stream()
+
+    with use_stream(get_stream("replay")):
+        assert current_stream() is get_stream("replay")
+        expected = [roll_dice_expr("1d100") for _ in range(10)]
+    assert current_stream() is get_stream()
+
+    set_seed(99)
+    with use_stream(get_stream("replay")):
+        assert [roll_dice_expr("1d100") for _ in range(10)] == expected
+
+
+def test_streams_in_worker_processes():
+    streams = [RandomStream(5).child("worker", i) for i in range(2)]
+    expected = [roll_in_worker(pickle.loads(pickle.dumps(x))) for x in streams]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=2, mp_context=context) as pool:
+        assert list(pool.map(roll_in_worker, streams)) == expected
+    assert expected[0] != expected[1]
+
+
+@pytest.fixture
+def monster_loader(tmp_path):
+    monsters = tmp_path / "monsters"
+    monsters.mkdir()
+    (monsters / "orc.toml").write_text('name = "orc"\nmax_hp = "2d8+6"\n')
+    index = MonsterIndex(
+        index_file=str(tmp_path / "index.json"), pattern=f"{monsters}/*.toml"
+    )
+    return MonsterLoader(image_loader=None, index=index, cache=MonsterCache())
+
+
+def test_encounters_replay_with_the_same_seed(monster_loader):
+    encounter = Encounter(
+        name="Orc Camp",
+        groups={
+            "orcs": {"monster": "orc", "count": "2d4"},
+            "chiefs": {"monster": "orc", "count": 1, "max_hp": "8d8+20"},
+        },
+    )
+
+    def load():
+        set_seed(1234)
+        loader = EncounterLoader(None, monster_loader, Combat())
+        return [(x.name, x.max_hp) for x in loader.load(encounter)]
+
+    assert load() == load()
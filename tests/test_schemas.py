@@ -0,0 +1,44 @@
+import pytest
+
+from dndme.schemas import (
+    SchemaError,
+    validate_encounter,
+    validate_monster,
+    validate_party,
+)
+
+
+def test_valid_monster_passes_through_unchanged():
+    data = {"name": "orc", "ac": 13, "actions": {"axe": {"name": "Greataxe"}}}
+    assert validate_monster(data) is data
+
+
+def test_legacy_keys_are_renamed():
+    data = {"name": "orc", "race": "orc", "features": {"x": {"name": "Aggressive"}}}
+    validated = validate_monster(data)
+    assert validated == {
+        "name": "orc",
+        "species": "orc",
+        "traits": {"x": {"name": "Aggressive"}},
+    }
+    assert "race" in data
+
+
+def test_nested_renames_are_kept():
+    party = {"sariel": {"name": "Sariel", "race": "Elf", "level": 3}}
+    assert validate_party(party)["sariel"]["species"] == "Elf"
+
+
+def test_all_problems_are_reported():
+    with pytest.raises(SchemaError) as e:
+        validate_monster({"ac": "12", "wings": 2, "actions": {"bite": {"name": 3}}})
+    message = str(e.value)
+    assert "monster is missing 'name'" in message
+    assert "monster.ac should be int, not str" in message
+    assert "unknown key 'wings'" in message
+    assert "monster.actions.bite.name should be str, not int" in message
+
+
+def test_encounter_groups_need_a_monster_and_count():
+    with pytest.raises(SchemaError, match="groups.orcs is missing 'count'"):
+        validate_encounter({"name": "Camp", "groups": {"orcs": {"monster": "orc"}}})
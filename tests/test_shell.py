@@ -0,0 +1,45 @@
+from prompt_toolkit.document import Document
+
+from dndme.shell import DnDCompleter
+
+
+class FakeCommand:
+    def __init__(self, suggestions):
+        self.suggestions = suggestions
+        self.calls = 0
+
+    def get_suggestions(self, words):
+        self.calls += 1
+        if len(words) == 2:
+            return self.suggestions
+
+
+class FakeGame:
+    state_version = 0
+
+
+def complete(completer, text):
+    return [x.text for x in completer.get_completions(Document(text), None)]
+
+
+def test_completes_commands_and_arguments():
+    load = FakeCommand(["party", "monster", "encounter"])
+    completer = DnDCompleter({"load": load, "list": load}, ignore_case=True)
+    assert complete(completer, "l") == ["list", "load"]
+    assert complete(completer, "load M") == ["monster"]
+    assert complete(completer, "load ") == ["encounter", "monster", "party"]
+
+
+def test_candidates_are_cached_until_state_changes():
+    game = FakeGame()
+    load = FakeCommand(["goblin", "gnoll", "orc"])
+    completer = DnDCompleter({"load": load}, ignore_case=True, game=game)
+
+    assert complete(completer, "load g") == ["gnoll", "goblin"]
+    assert complete(completer, "load go") == ["goblin"]
+    assert load.calls == 1
+
+    load.suggestions = ["goblin", "goblin_boss"]
+    game.state_version += 1
+    assert complete(completer, "load go") == ["goblin", "goblin_boss"]
+    assert load.calls == 2